@@ -4,6 +4,9 @@
 # run flask db upgrade (or equivalent). All auth logic is ORM-abstracted
 # and requires no changes beyond the connection string.
 
+import sqlite3
+from contextlib import contextmanager
+
 from peewee import DatabaseProxy
 from playhouse.sqliteq import SqliteQueueDatabase
 
@@ -47,4 +50,95 @@ def init_database(database_path: str | None = None, database_url: str | None = N
 
     # Bind the concrete database instance to the proxy used by models.
     db.initialize(database)
-    return database
\ No newline at end of file
+    return database
+
+@contextmanager
+def write_transaction():
+    """
+    Yield a DB-API cursor whose statements commit (or roll back) together.
+    For SqliteQueueDatabase this is a direct sqlite3 connection, like executemany_chunked.
+    """
+    database = db.obj
+    if isinstance(database, SqliteQueueDatabase):
+        conn = sqlite3.connect(database.database, timeout=10.0)
+        try:
+            with conn:
+                yield conn.cursor()
+        finally:
+            conn.close()
+        return
+    with database.atomic():
+        yield database.cursor()
+
+
+def executemany_chunked(sql: str, rows, chunk_size: int = 500) -> int:
+    """
+    Run one parameterised write statement over many rows, committing one
+    transaction per chunk. Returns the number of rows changed.
+
+    SqliteQueueDatabase funnels writes through its queue one statement at a time
+    and does not support transactions, so for SQLite we use a short-lived direct
+    sqlite3 connection (same approach as app.migrate). WAL + busy timeout let it
+    coexist with the queue writer thread.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    database = db.obj
+    chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    changed = 0
+
+    if isinstance(database, SqliteQueueDatabase):
+        conn = sqlite3.connect(database.database, timeout=10.0)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for chunk in chunks:
+                with conn:
+                    cur = conn.executemany(sql, chunk)
+                    changed += max(0, cur.rowcount)
+        finally:
+            conn.close()
+        return changed
+
+    for chunk in chunks:
+        with database.atomic():
+            cur = database.cursor()
+            cur.executemany(sql, chunk)
+            changed += max(0, cur.rowcount)
+    return changed
+
+
+def delete_ids_chunked(table: str, ids, chunk_size: int = 500) -> int:
+    """
+    DELETE rows of *table* by primary key: one `DELETE … WHERE id IN (…)` statement and
+    one transaction per chunk. Returns rows removed.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    # SQLite before 3.32 allows at most 999 bound parameters per statement.
+    chunk_size = max(1, min(chunk_size, 999))
+    chunks = [ids[i : i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    database = db.obj
+    removed = 0
+
+    def sql(n):
+        return "DELETE FROM %s WHERE id IN (%s)" % (table, ",".join("?" * n))
+
+    if isinstance(database, SqliteQueueDatabase):
+        conn = sqlite3.connect(database.database, timeout=10.0)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for chunk in chunks:
+                with conn:
+                    removed += max(0, conn.execute(sql(len(chunk)), chunk).rowcount)
+        finally:
+            conn.close()
+        return removed
+
+    for chunk in chunks:
+        with database.atomic():
+            cur = database.cursor()
+            cur.execute(sql(len(chunk)), chunk)
+            removed += max(0, cur.rowcount)
+    return removed
@@ -55,6 +55,12 @@ def _paths_that_decode_frames():
     det = raw.strip().lower()
     if det in ("stub", "none", "off"):
         return ([], "MOTION_DETECTOR is off or stub — no frame decode for motion.")
+    from app.processing.frame_sources import resolve_source_name
+
+    src = resolve_source_name(os.environ.get("MOTION_FRAME_SOURCE") or "auto")
+    if src in ("ffmpeg", "ffmpeg_pipe", "rawvideo"):
+        # Frames are decoded by an ffmpeg child, so FFMPEG_HWACCEL applies to motion too.
+        return (["motion_frames_ffmpeg_pipe"], None)
     if det in ("opencv", "diff"):
         return (["motion_detection_opencv"], None)
     if det in ("opencv_mog2", "mog2"):
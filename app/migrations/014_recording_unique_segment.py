@@ -0,0 +1,20 @@
+"""
+Unique (camera_name, filename) on recording so segment registration can use
+INSERT OR IGNORE instead of diffing against every row in Python.
+
+Drops duplicate rows first (keeps the lowest id) — older scanners could insert
+the same file twice when two scans overlapped.
+"""
+
+
+def migrate(conn):
+    conn.execute("""
+        DELETE FROM recording
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM recording GROUP BY camera_name, filename
+        )
+    """)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_recording_cam_file
+        ON recording (camera_name, filename)
+    """)
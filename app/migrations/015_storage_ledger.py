@@ -0,0 +1,101 @@
+"""
+Per-camera storage ledger: segment/clip byte totals, counts, oldest/newest filename.
+
+Kept current by triggers on `recording` and `recording_event`, so every writer
+(scanner, inotify watcher, retention, API deletes, processor clips) updates it
+without extra code. Replaces directory walks for retention's max-storage check,
+recorder /status and GET /api/recordings/storage. Oldest/newest are recomputed
+only when the deleted row was the current boundary, via the (camera_name, filename)
+indexes.
+"""
+
+
+def _triggers(conn, table: str, prefix: str):
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT OR IGNORE INTO storage_ledger (camera_name) VALUES (NEW.camera_name);
+            UPDATE storage_ledger SET
+                {prefix}_count = {prefix}_count + 1,
+                {prefix}_bytes = {prefix}_bytes + COALESCE(NEW.file_size, 0),
+                {prefix}_oldest = CASE
+                    WHEN {prefix}_oldest IS NULL OR NEW.filename < {prefix}_oldest
+                    THEN NEW.filename ELSE {prefix}_oldest END,
+                {prefix}_newest = CASE
+                    WHEN {prefix}_newest IS NULL OR NEW.filename > {prefix}_newest
+                    THEN NEW.filename ELSE {prefix}_newest END
+            WHERE camera_name = NEW.camera_name;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE storage_ledger SET
+                {prefix}_count = MAX(0, {prefix}_count - 1),
+                {prefix}_bytes = MAX(0, {prefix}_bytes - COALESCE(OLD.file_size, 0)),
+                {prefix}_oldest = CASE WHEN OLD.filename = {prefix}_oldest
+                    THEN (SELECT MIN(filename) FROM {table} WHERE camera_name = OLD.camera_name)
+                    ELSE {prefix}_oldest END,
+                {prefix}_newest = CASE WHEN OLD.filename = {prefix}_newest
+                    THEN (SELECT MAX(filename) FROM {table} WHERE camera_name = OLD.camera_name)
+                    ELSE {prefix}_newest END
+            WHERE camera_name = OLD.camera_name;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_{table}_resize
+        AFTER UPDATE OF file_size ON {table}
+        BEGIN
+            UPDATE storage_ledger SET
+                {prefix}_bytes = MAX(0, {prefix}_bytes
+                    - COALESCE(OLD.file_size, 0) + COALESCE(NEW.file_size, 0))
+            WHERE camera_name = NEW.camera_name;
+        END
+    """)
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS storage_ledger (
+            camera_name    VARCHAR(50) PRIMARY KEY,
+            segment_count  INTEGER NOT NULL DEFAULT 0,
+            segment_bytes  BIGINT  NOT NULL DEFAULT 0,
+            segment_oldest VARCHAR(255),
+            segment_newest VARCHAR(255),
+            clip_count     INTEGER NOT NULL DEFAULT 0,
+            clip_bytes     BIGINT  NOT NULL DEFAULT 0,
+            clip_oldest    VARCHAR(255),
+            clip_newest    VARCHAR(255)
+        )
+    """)
+    # MIN/MAX(filename) per camera for the delete triggers.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_recording_event_cam_file "
+        "ON recording_event (camera_name, filename)"
+    )
+    _triggers(conn, "recording", "segment")
+    _triggers(conn, "recording_event", "clip")
+
+    # Seed from existing rows.
+    conn.execute("DELETE FROM storage_ledger")
+    conn.execute("""
+        INSERT INTO storage_ledger
+            (camera_name, segment_count, segment_bytes, segment_oldest, segment_newest)
+        SELECT camera_name, COUNT(*), COALESCE(SUM(file_size), 0), MIN(filename), MAX(filename)
+        FROM recording GROUP BY camera_name
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO storage_ledger (camera_name)
+        SELECT DISTINCT camera_name FROM recording_event
+    """)
+    conn.execute("""
+        UPDATE storage_ledger SET
+            clip_count  = (SELECT COUNT(*) FROM recording_event e
+                           WHERE e.camera_name = storage_ledger.camera_name),
+            clip_bytes  = (SELECT COALESCE(SUM(file_size), 0) FROM recording_event e
+                           WHERE e.camera_name = storage_ledger.camera_name),
+            clip_oldest = (SELECT MIN(filename) FROM recording_event e
+                           WHERE e.camera_name = storage_ledger.camera_name),
+            clip_newest = (SELECT MAX(filename) FROM recording_event e
+                           WHERE e.camera_name = storage_ledger.camera_name)
+    """)
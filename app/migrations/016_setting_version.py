@@ -0,0 +1,32 @@
+"""
+Version counter for the `setting` table.
+
+recording_settings caches the whole table in each process and re-reads it only
+when setting_version.version changes. Triggers bump the counter on any insert,
+update or delete, so writes from other processes (API → recorder/processor) and
+manual sqlite edits are all picked up.
+"""
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS setting (
+            key   VARCHAR(100) PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS setting_version (
+            id      INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO setting_version (id, version) VALUES (1, 0)")
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_setting_version_{op.lower()}
+            AFTER {op} ON setting
+            BEGIN
+                UPDATE setting_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
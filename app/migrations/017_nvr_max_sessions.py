@@ -0,0 +1,14 @@
+"""
+Per-NVR RTSP session budget.
+
+NULL = fall back to NVR_MAX_SESSIONS (0 = unlimited). Recorder writers, motion probes,
+clip grabs and diagnostics all take a slot from this budget before opening the stream
+(app/services/connection_budget.py).
+"""
+
+
+def migrate(conn):
+    # Always check before ALTER TABLE — SQLite has no IF NOT EXISTS for columns
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(nvr)")}
+    if "max_sessions" not in cols:
+        conn.execute("ALTER TABLE nvr ADD COLUMN max_sessions INTEGER")
@@ -0,0 +1,50 @@
+"""
+Per-camera motion masks and named zones.
+
+kind = mask: polygon ignored by motion scoring (trees, timestamp overlay, street).
+kind = zone: named polygon; when a camera has zones only motion inside them counts.
+points is JSON [[x, y], ...] normalized to 0..1 so one polygon fits main and sub
+streams at any analysis width.
+
+motion_zone_version is bumped by triggers so the processor re-rasterizes its cached
+bitmaps only when something changed (same scheme as setting_version, migration 016).
+"""
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS camera_motion_zone (
+            id        INTEGER PRIMARY KEY AUTOINCREMENT,
+            camera_id INTEGER NOT NULL,
+            name      VARCHAR(50) NOT NULL DEFAULT '',
+            kind      VARCHAR(10) NOT NULL DEFAULT 'mask',
+            points    TEXT NOT NULL,
+            enabled   INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_camera_motion_zone_camera ON camera_motion_zone(camera_id)"
+    )
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS motion_zone_version (
+            id      INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO motion_zone_version (id, version) VALUES (1, 0)")
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_motion_zone_version_{op.lower()}
+            AFTER {op} ON camera_motion_zone
+            BEGIN
+                UPDATE motion_zone_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+    # Camera renames change the name -> bitmap mapping too.
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_motion_zone_version_camera_rename
+        AFTER UPDATE OF name ON camera
+        BEGIN
+            UPDATE motion_zone_version SET version = version + 1 WHERE id = 1;
+        END
+    """)
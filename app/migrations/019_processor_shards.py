@@ -0,0 +1,32 @@
+"""
+Processor sharding: shard heartbeats and per-camera leases (PROCESSOR_SHARDING).
+
+Each processor instance upserts its processor_shard row every heartbeat; a shard
+whose heartbeat is older than the lease time is dead. A camera is processed by the
+shard holding its processor_camera_lease row — renewed every heartbeat, taken over by
+the camera's new owner once it expires or is released (app/processing/sharding.py).
+Times are unix seconds.
+"""
+
+
+def migrate(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS processor_shard (
+            shard_id     VARCHAR(100) PRIMARY KEY,
+            status_url   VARCHAR(255),
+            started_at   REAL,
+            heartbeat_at REAL NOT NULL,
+            cameras      INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS processor_camera_lease (
+            camera_name VARCHAR(50) PRIMARY KEY,
+            shard_id    VARCHAR(100) NOT NULL,
+            expires_at  REAL NOT NULL
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_processor_lease_shard "
+        "ON processor_camera_lease (shard_id)"
+    )
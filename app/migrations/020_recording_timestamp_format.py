@@ -0,0 +1,18 @@
+"""
+One text format for recording timestamps: 'YYYY-MM-DD HH:MM:SS'.
+
+The recorder registered segments with datetime.isoformat() ('…T…') while peewee and
+sqlite3 bind datetimes with a space. SQLite compares the text, so on the same day a
+'T' row sorts after every space-separated bound: range and seek queries missed
+segments and retention cutoffs were off by up to a day. Writers now use the space
+form; this rewrites existing rows.
+"""
+
+
+def migrate(conn):
+    for table in ("recording", "recording_event"):
+        for col in ("started_at", "ended_at"):
+            conn.execute(
+                "UPDATE %s SET %s = replace(%s, 'T', ' ') WHERE %s LIKE '____-__-__T%%'"
+                % (table, col, col, col)
+            )
@@ -6,6 +6,7 @@ from peewee import (
     IntegerField,
     BigIntegerField,
     DateTimeField,
+    TextField,
     CompositeKey,
 )
 from flask_login import UserMixin
@@ -91,6 +92,8 @@ class NVR(BaseModel):
     username     = CharField(max_length=100, null=True)
     password     = CharField(max_length=100, null=True)
     max_channels = IntegerField(default=50)
+    # Concurrent RTSP sessions this NVR accepts; NULL = NVR_MAX_SESSIONS (migration 017)
+    max_sessions = IntegerField(null=True)
     active       = BooleanField(default=True)
 
     class Meta:
@@ -121,6 +124,21 @@ class Camera(BaseModel):
     class Meta:
         table_name = "camera"
 
+
+class CameraMotionZone(BaseModel):
+    """Motion mask / named zone polygon for a camera (migration 018, see processing.motion_masks)."""
+
+    id        = AutoField()
+    camera_id = IntegerField(index=True)
+    name      = CharField(max_length=50, default="")
+    kind      = CharField(max_length=10, default="mask")   # mask | zone
+    points    = TextField()                                 # JSON [[x, y], ...] in 0..1
+    enabled   = BooleanField(default=True)
+
+    class Meta:
+        table_name = "camera_motion_zone"
+
+
 class UserNVR(BaseModel):
     id      = AutoField()
     user_id = IntegerField()
@@ -161,7 +179,7 @@ class Recording(BaseModel):
     started_at       = DateTimeField(index=True)                 # parsed from filename
     ended_at         = DateTimeField(null=True)                  # started_at + duration
     duration_seconds = IntegerField(null=True)                   # from ffprobe
-    status           = CharField(max_length=20, default="complete")  # complete | failed
+    status           = CharField(max_length=20, default="complete")  # complete | failed | writing (open fMP4 segment)
 
     class Meta:
         table_name = "recording"
@@ -169,6 +187,8 @@ class Recording(BaseModel):
             # Composite index for the most common query pattern:
             # "show me recordings for camera X between time A and B"
             (("camera_name", "started_at"), False),
+            # One row per file; segment registration relies on INSERT OR IGNORE (migration 014).
+            (("camera_name", "filename"), True),
         )
 
 
@@ -1,5 +1,6 @@
 """
-FFmpeg helpers for motion-triggered clip capture (segment tail, concat, RTSP grab).
+FFmpeg helpers for motion-triggered clip capture (segment tail, concat, segment range
+cut, RTSP grab).
 
 Used by ProcessingEngine; keeps subprocess argument lists out of the engine loop.
 """
@@ -11,8 +12,11 @@ import os
 import subprocess
 import tempfile
 import time as time_module
+from datetime import datetime
 
 from app.ffmpeg_config import hwaccel_input_args, rtsp_input_queue_args
+from app.recorder_segments import parse_segment_filename_ts
+from app.services import connection_budget, keyframe_index
 
 logger = logging.getLogger("opus.processing.clip_ffmpeg")
 
@@ -28,7 +32,11 @@ def concat_pre_enabled() -> bool:
 
 
 def latest_stable_segment(recordings_dir: str, cam_name: str) -> str | None:
-    """Most recent completed MP4 segment under recordings_dir/cam_name (for pre-roll tail)."""
+    """
+    Most recent readable MP4 segment under recordings_dir/cam_name (for pre-roll tail):
+    the segment still being written when it is fragmented and live-indexed (it has a
+    keyframe sidecar), else the newest completed one.
+    """
     cam_dir = os.path.join(recordings_dir, cam_name)
     if not os.path.isdir(cam_dir):
         return None
@@ -38,32 +46,97 @@ def latest_stable_segment(recordings_dir: str, cam_name: str) -> str | None:
         return None
     if not names:
         return None
+    newest = os.path.join(cam_dir, max(names))
+    if os.path.exists(keyframe_index.sidecar_path(newest)):
+        return newest
     paths = [os.path.join(cam_dir, n) for n in names]
     paths.sort(key=lambda p: os.path.getmtime(p), reverse=True)
     now = time_module.time()
     for p in paths:
-        try:
-            if now - os.path.getmtime(p) < 3.0:
-                continue
-            if os.path.getsize(p) > 10240:
-                return p
-        except OSError:
-            continue
+        if _closed(p, now):
+            return p
     return None
 
 
-def ffmpeg_extract_tail(segment_path: str, pre_seconds: int, out_path: str) -> bool:
-    """Last N seconds of a seekable MP4 (segment file from recorder)."""
+def _closed(path: str, now: float) -> bool:
+    """Not written to for 3 s and large enough to hold a playable MP4."""
+    try:
+        return now - os.path.getmtime(path) >= 3.0 and os.path.getsize(path) > 10240
+    except OSError:
+        return False
+
+
+def _previous_closed_segment(segment_path: str) -> str | None:
+    """Newest closed segment named (started) before segment_path in the same folder."""
+    cam_dir, name = os.path.split(segment_path)
+    try:
+        names = sorted((f for f in os.listdir(cam_dir) if f.endswith(".mp4") and f < name), reverse=True)
+    except OSError:
+        return None
+    now = time_module.time()
+    for n in names:
+        p = os.path.join(cam_dir, n)
+        if _closed(p, now):
+            return p
+    return None
+
+
+def _indexed_window(segment_path: str, pre_seconds: int, end_at: datetime | None):
+    """
+    (-ss, -t) for the pre_seconds before end_at (default: the indexed end) from the
+    segment's keyframe sidecar, starting on a keyframe; None without a usable sidecar.
+    """
+    kfi = keyframe_index.read_sidecar(segment_path)
+    if kfi is None or not len(kfi):
+        return None
+    end = kfi.seconds
+    if end_at is not None:
+        seg_start = parse_segment_filename_ts(os.path.basename(segment_path))
+        if seg_start is not None:
+            end = min(end, (end_at - seg_start).total_seconds())
+    if end <= 0:
+        return None
+    k = kfi.at_or_before(max(0.0, end - pre_seconds))
+    start = kfi.times[k]
+    if end - start < 0.5:
+        return None
+    return start, end - start
+
+
+def ffmpeg_extract_tail(
+    segment_path: str, pre_seconds: int, out_path: str, end_at: datetime | None = None
+) -> bool:
+    """
+    Last N seconds of a segment file from the recorder. A live-indexed (fragmented)
+    segment — possibly still being written — is cut from its keyframe sidecar, ending
+    at end_at (wall clock) when given; a completed MP4 is cut with -sseof.
+
+    When the segment is still growing and has no usable window yet (trigger in its
+    first second, or under 0.5 s indexed), the tail of the previous closed segment is
+    used instead: -sseof on a file being written cuts at an arbitrary point.
+    """
+    window = _indexed_window(segment_path, pre_seconds, end_at)
+    if window is None and not _closed(segment_path, time_module.time()):
+        prev = _previous_closed_segment(segment_path)
+        if prev is None:
+            return False
+        logger.debug("pre-roll: %s has no indexed window yet — using %s", segment_path, prev)
+        segment_path = prev
+        window = _indexed_window(segment_path, pre_seconds, end_at)
+    if window is not None:
+        seek = ["-ss", "%.3f" % window[0], "-t", "%.3f" % window[1]]
+    else:
+        seek = ["-sseof", "-%d" % pre_seconds]
     cmd = [
         "ffmpeg",
         "-hide_banner",
         "-loglevel",
         "error",
         "-y",
-        "-sseof",
-        "-%d" % pre_seconds,
+        *seek[:2],
         "-i",
         segment_path,
+        *seek[2:],
         "-c",
         "copy",
         "-movflags",
@@ -114,8 +187,78 @@ def ffmpeg_concat_copy(paths: list[str], out_path: str) -> bool:
             pass
 
 
-def capture_rtsp_clip(src: str, out_path: str, duration_sec: int, *, camera_name: str) -> bool:
-    """Record duration_sec of RTSP into out_path (-c:v copy)."""
+def extract_segment_range(pieces: list[tuple[str, float, float | None]], out_path: str) -> bool:
+    """
+    Stream-copy a time range spanning recorder segments into one MP4.
+
+    pieces: (segment path, inpoint seconds, outpoint seconds or None = to the end) in
+    order; the concat demuxer trims each file, so no intermediate files are written.
+    With -c copy the cut starts at the keyframe at or before the first inpoint.
+    """
+    if not pieces:
+        return False
+    fd, list_path = tempfile.mkstemp(suffix=".txt", text=True)
+    try:
+        with os.fdopen(fd, "w") as f:
+            for path, inpoint, outpoint in pieces:
+                ap = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+                f.write("file '%s'\n" % ap)
+                if inpoint > 0:
+                    f.write("inpoint %.3f\n" % inpoint)
+                if outpoint is not None:
+                    f.write("outpoint %.3f\n" % outpoint)
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            list_path,
+            "-map",
+            "0:v",
+            "-c",
+            "copy",
+            "-avoid_negative_ts",
+            "make_zero",
+            "-movflags",
+            "+faststart",
+            out_path,
+        ]
+        r = subprocess.run(cmd, capture_output=True, timeout=600)
+        if r.returncode != 0:
+            err = (r.stderr or b"").decode(errors="replace")[-200:]
+            logger.warning("segment range extract rc=%s %s", r.returncode, err)
+            return False
+        return os.path.getsize(out_path) > 10240
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    finally:
+        try:
+            os.remove(list_path)
+        except OSError:
+            pass
+
+
+def capture_rtsp_clip(
+    src: str,
+    out_path: str,
+    duration_sec: int,
+    *,
+    camera_name: str,
+    until=None,
+) -> bool:
+    """
+    Record RTSP into out_path (-c:v copy) under the camera's NVR session budget.
+
+    Without until: exactly duration_sec. With until (callable -> time.monotonic()
+    deadline, may move later while recording): record until the deadline, then stop
+    ffmpeg with "q" so the MP4 is finalized; duration_sec is the hard cap.
+    """
     cmd = [
         "ffmpeg",
         "-hide_banner",
@@ -145,15 +288,57 @@ def capture_rtsp_clip(src: str, out_path: str, duration_sec: int, *, camera_name
         "-y",
         out_path,
     ]
-    try:
-        r = subprocess.run(cmd, capture_output=True, timeout=duration_sec + 90)
-    except (subprocess.TimeoutExpired, OSError):
-        return False
-    if r.returncode != 0:
-        err = (r.stderr or b"").decode(errors="replace")[-200:]
-        logger.warning("clip capture %s rc=%s %s", camera_name, r.returncode, err)
+    with connection_budget.session(camera_name=camera_name, url=src, purpose="clip " + camera_name) as lease:
+        if lease is None:
+            return False
+        try:
+            if until is None:
+                r = subprocess.run(cmd, capture_output=True, timeout=duration_sec + 90)
+                rc, err = r.returncode, r.stderr
+            else:
+                rc, err = _run_until(cmd, until, duration_sec + 90)
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+    if rc != 0:
+        err = (err or b"").decode(errors="replace")[-200:]
+        logger.warning("clip capture %s rc=%s %s", camera_name, rc, err)
         return False
     try:
         return os.path.getsize(out_path) > 10240
     except OSError:
         return False
+
+
+def _run_until(cmd: list[str], until, hard_timeout: float):
+    """Run ffmpeg until until() passes, then quit it gracefully. Returns (rc, stderr bytes)."""
+    err_file = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err_file)
+    killed_at = time_module.monotonic() + hard_timeout
+    try:
+        while proc.poll() is None:
+            now = time_module.monotonic()
+            if now >= killed_at:
+                proc.kill()
+                raise subprocess.TimeoutExpired(cmd, hard_timeout)
+            remaining = until() - now
+            if remaining > 0:
+                time_module.sleep(min(remaining, 0.5))
+                continue
+            try:
+                proc.stdin.write(b"q")
+                proc.stdin.close()
+            except (BrokenPipeError, OSError, ValueError):
+                pass
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        rc = proc.returncode
+        err_file.seek(0)
+        return rc, err_file.read()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        err_file.close()
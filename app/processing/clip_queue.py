@@ -0,0 +1,175 @@
+"""
+Bounded worker pool for live RTSP motion clips (processor).
+
+The tick only submits; CLIP_WRITER_WORKERS threads run the captures. One clip per
+camera at a time: motion on a camera whose clip is still queued or recording extends
+that clip's deadline (up to CLIP_MAX_SECONDS) instead of starting a second capture.
+When CLIP_QUEUE_MAX clips are already waiting, new ones are rejected and counted —
+queue depth, wait times and rejections are the backpressure signal on /status.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from app.processing.detectors import _env_int
+
+logger = logging.getLogger("opus.processing.clip_queue")
+
+WORKERS = max(1, _env_int("CLIP_WRITER_WORKERS", 2))
+QUEUE_MAX = max(1, _env_int("CLIP_QUEUE_MAX", 16))
+MAX_CLIP_SECONDS = max(30, _env_int("CLIP_MAX_SECONDS", 300))
+
+
+class ClipJob:
+    """A queued or recording clip. deadline is time.monotonic() at which capture stops."""
+
+    def __init__(self, cam, started_at, seconds: float):
+        self.cam = cam
+        self.started_at = started_at
+        self.seconds = seconds
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + seconds
+        self.capture_started = None
+        self.state = "queued"  # queued | recording | done | failed
+        self.event_id = None
+        self.ended_at = None  # motion end (continuous mode), applied to the event row
+        self.extensions = 0
+
+    def deadline_at(self) -> float:
+        """Capture deadline, capped at MAX_CLIP_SECONDS of recording."""
+        if self.capture_started is None:
+            return self.deadline
+        return min(self.deadline, self.capture_started + MAX_CLIP_SECONDS)
+
+
+class ClipWriterPool:
+    """
+    write_clip(job) records job.cam until job.deadline_at() and returns the new
+    RecordingEvent id (or None). on_ended(job) writes job.ended_at — a motion end that
+    may arrive before the row exists — to the event row.
+    """
+
+    def __init__(self, write_clip: Callable, on_ended: Callable, workers: int = WORKERS, max_queue: int = QUEUE_MAX):
+        self._write_clip = write_clip
+        self._on_ended = on_ended
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: deque[ClipJob] = deque()
+        self._by_cam: dict[str, ClipJob] = {}
+        self._cv = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._running = False
+        self.submitted = 0
+        self.extended = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def start(self):
+        self._running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, daemon=True, name="clip-writer-%d" % i)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        with self._cv:
+            self._running = False
+            self._cv.notify_all()
+
+    def submit(self, cam, started_at, seconds: float) -> str:
+        """Queue a clip of `seconds`, or extend the camera's open one. Returns queued | extended | rejected."""
+        with self._cv:
+            job = self._by_cam.get(cam.name)
+            if job is not None:
+                job.deadline = max(job.deadline, time.monotonic() + seconds)
+                job.extensions += 1
+                self.extended += 1
+                return "extended"
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                logger.warning("Clip queue full (%d) — motion clip for %s dropped", self.max_queue, cam.name)
+                return "rejected"
+            job = ClipJob(cam, started_at, seconds)
+            self._queue.append(job)
+            self._by_cam[cam.name] = job
+            self.submitted += 1
+            self._cv.notify()
+            return "queued"
+
+    def job_for(self, cam_name: str) -> ClipJob | None:
+        with self._cv:
+            return self._by_cam.get(cam_name)
+
+    def motion_ended(self, job: ClipJob, ended_at, post_seconds: float):
+        """
+        Continuous mode: keep recording until post_seconds after the motion end (still
+        capped), and record the end on the event row once it exists.
+        """
+        with self._cv:
+            job.ended_at = ended_at
+            lag = max(0.0, time.time() - ended_at.timestamp())
+            job.deadline = max(job.deadline, time.monotonic() + post_seconds - lag)
+            written = job.state == "done"
+        if written:
+            self._on_ended(job)
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                while self._running and not self._queue:
+                    self._cv.wait()
+                if not self._running:
+                    return
+                job = self._queue.popleft()
+                job.state = "recording"
+                job.capture_started = time.monotonic()
+                # Time spent queued does not eat into the clip.
+                job.deadline = max(job.deadline, job.capture_started + job.seconds)
+                waited = job.capture_started - job.submitted
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            event_id = None
+            try:
+                event_id = self._write_clip(job)
+            except Exception:
+                logger.exception("clip writer failed: %s", job.cam.name)
+            with self._cv:
+                job.event_id = event_id
+                job.state = "done" if event_id else "failed"
+                if event_id:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                if self._by_cam.get(job.cam.name) is job:
+                    del self._by_cam[job.cam.name]
+                ended = job.ended_at is not None
+            if event_id and ended:
+                self._on_ended(job)
+
+    def status(self) -> dict:
+        with self._cv:
+            now = time.monotonic()
+            recording = [j for j in self._by_cam.values() if j.state == "recording"]
+            started = self.written + self.failed + len(recording)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queued": len(self._queue),
+                "recording": [j.cam.name for j in recording],
+                "oldest_queued_seconds": round(now - self._queue[0].submitted, 1) if self._queue else 0.0,
+                "submitted": self.submitted,
+                "extended": self.extended,
+                "rejected": self.rejected,
+                "written": self.written,
+                "failed": self.failed,
+                "wait_seconds_avg": round(self.wait_seconds_total / started, 2) if started else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 2),
+            }
@@ -7,6 +7,12 @@ Tune via env (processor service):
   MOTION_DIFF_THRESHOLD    — mean pixel diff for opencv mode (default 5)
   MOTION_GAUSSIAN_KSIZE    — odd kernel e.g. 5 for pre-diff blur; 0 = off
 
+Per-camera masks / zones (camera_motion_zone, see motion_masks) restrict both
+detectors' scores to the pixels that matter.
+
+Frames come from a frame source (see frame_sources; MOTION_FRAME_SOURCE on the
+processor): persistent per-camera readers by default, or probe = open-read-close.
+
 MOG2 mode (MOTION_DETECTOR=opencv_mog2):
   MOTION_MOG2_FG_RATIO     — min fraction of foreground pixels (default 0.002)
   MOTION_MOG2_HISTORY      — MOG2 history length (default 300)
@@ -17,7 +23,6 @@ from __future__ import annotations
 
 import logging
 import os
-import threading
 import time
 from abc import ABC, abstractmethod
 
@@ -39,11 +44,28 @@ def _env_float(name: str, default: float) -> float:
         return default
 
 
-def capture_skipped_frame_pair(rtsp_url: str, skip_frames: int):
+def capture_skipped_frame_pair(rtsp_url: str, skip_frames: int, *, camera_name: str | None = None):
     """
     Open RTSP, read first frame, skip `skip_frames` reads, read second frame.
     Returns (f0, f1) BGR numpy arrays or (None, None).
 
+    Holds a session slot from the camera's NVR budget while the stream is open;
+    (None, None) when no slot frees up within NVR_SESSION_WAIT_SECONDS.
+    """
+    from app.services import connection_budget
+
+    with connection_budget.session(
+        camera_name=camera_name, url=rtsp_url, purpose="motion " + (camera_name or "probe")
+    ) as lease:
+        if lease is None:
+            return None, None
+        return _read_skipped_frame_pair(rtsp_url, skip_frames)
+
+
+def open_capture(rtsp_url: str):
+    """
+    cv2.VideoCapture on rtsp_url with open/read timeouts, or None if it cannot open.
+
     Without timeouts, FFmpeg can block ~60s per dead RTSP URL (DESCRIBE 404), which
     stalls the motion worker pool and floods logs (OpenCV cap.cpp + libav rtsp warnings).
     """
@@ -56,7 +78,7 @@ def capture_skipped_frame_pair(rtsp_url: str, skip_frames: int):
         import cv2
     except ImportError:
         logger.warning("opencv not installed — motion detection disabled")
-        return None, None
+        return None
 
     cap = cv2.VideoCapture()
     try:
@@ -73,11 +95,18 @@ def capture_skipped_frame_pair(rtsp_url: str, skip_frames: int):
             cap.release()
         except Exception:
             pass
-        return None, None
+        return None
     try:
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
     except Exception:
         pass
+    return cap
+
+
+def _read_skipped_frame_pair(rtsp_url: str, skip_frames: int):
+    cap = open_capture(rtsp_url)
+    if cap is None:
+        return None, None
     try:
         # Brief retries: go2rtc may still be publishing the path right after API registration.
         ok, f0 = False, None
@@ -111,16 +140,67 @@ def _resize_for_analysis(bgr, max_w: int):
     return cv2.resize(bgr, (max_w, int(h * scale)), interpolation=cv2.INTER_AREA)
 
 
+def _to_gray(frame):
+    """BGR -> gray; frames from the ffmpeg source are already single-channel."""
+    import cv2
+
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
 class BaseDetector(ABC):
+    frame_source = None
+    # Score at/above which a frame counts as motion (units depend on the detector).
+    threshold = 0.0
+    skip_frames = 0
+    # False when score() only looks at the newest frame (MOG2).
+    needs_prev = True
+
+    def _frame_pair(self, rtsp_url: str, stream_key: str | None, skip_frames: int):
+        if self.frame_source is None:
+            return capture_skipped_frame_pair(rtsp_url, skip_frames, camera_name=stream_key)
+        return self.frame_source.frame_pair(rtsp_url, stream_key, skip_frames)
+
     @abstractmethod
     def detect_motion(self, rtsp_url: str, stream_key: str | None = None) -> bool:
         pass
 
+    def score(self, prev, frame, stream_key: str) -> float:
+        """Motion score of frame (prev = the frame before it, may be ignored). Continuous analysis."""
+        return 0.0
+
+    def sample(self, rtsp_url: str, stream_key: str | None = None):
+        """(prev, frame) for one poll, or None when there is nothing to score yet."""
+        f0, f1 = self._frame_pair(rtsp_url, stream_key, self.skip_frames)
+        if f1 is None or (f0 is None and self.needs_prev):
+            return None
+        return f0, f1
+
+    def score_batch(self, items: list[tuple]) -> list[float]:
+        """
+        Scores for [(stream_key, prev, frame), ...] in order. Items for the same stream
+        must be in frame order (MOG2 learns from each one).
+        """
+        return [self.score(prev, frame, key) for key, prev, frame in items]
+
+    def retain(self, stream_keys):
+        """Drop per-stream state for streams no longer analyzed."""
+
+    def close(self):
+        """Processor shutdown."""
+
+    def status(self) -> dict | None:
+        return None
+
 
 class StubDetector(BaseDetector):
     def detect_motion(self, rtsp_url: str, stream_key: str | None = None) -> bool:
         return False
 
+    def sample(self, rtsp_url: str, stream_key: str | None = None):
+        return None
+
 
 class OpenCvMotionDetector(BaseDetector):
     """
@@ -128,36 +208,55 @@ class OpenCvMotionDetector(BaseDetector):
     Downscales and optional Gaussian blur to cut CPU while keeping sensitivity tunable.
     """
 
-    def __init__(self):
+    def __init__(self, frame_source=None):
+        self.frame_source = frame_source
         self.analysis_max_w = _env_int("MOTION_ANALYSIS_MAX_WIDTH", 320)
         self.skip_frames = _env_int("MOTION_SKIP_FRAMES", 8)
         self.mean_threshold = _env_float("MOTION_DIFF_THRESHOLD", 5.0)
+        self.threshold = self.mean_threshold
         self.gaussian_ksize = _env_int("MOTION_GAUSSIAN_KSIZE", 0)
 
+    def _prepare(self, frame):
+        import cv2
+
+        g = _to_gray(_resize_for_analysis(frame, self.analysis_max_w))
+        k = self.gaussian_ksize
+        if k >= 3 and k % 2 == 1:
+            g = cv2.GaussianBlur(g, (k, k), 0)
+        return g
+
+    def score(self, prev, frame, stream_key: str) -> float:
+        """Mean absolute gray-level difference between prev and frame (within masks/zones)."""
+        import cv2
+
+        from app.processing.motion_batch import region_mean
+        from app.processing.motion_masks import regions_for
+
+        diff = cv2.absdiff(self._prepare(prev), self._prepare(frame))
+        return region_mean(diff, regions_for(stream_key, diff.shape))
+
+    def score_batch(self, items: list[tuple]) -> list[float]:
+        """All cameras' diffs in one stacked pass (motion_batch.diff_scores)."""
+        from app.processing.motion_batch import diff_scores
+        from app.processing.motion_masks import regions_for
+
+        w = self.analysis_max_w
+        prevs = [None if p is None else _resize_for_analysis(p, w) for _k, p, _f in items]
+        frames = [_resize_for_analysis(f, w) for _k, _p, f in items]
+        regions = [regions_for(k, f.shape) for (k, _p, _f), f in zip(items, frames)]
+        return diff_scores(prevs, frames, blur_ksize=self.gaussian_ksize, regions=regions)
+
     def detect_motion(self, rtsp_url: str, stream_key: str | None = None) -> bool:
         try:
-            import cv2
+            import cv2  # noqa: F401
         except ImportError:
             logger.warning("opencv not installed — motion detection disabled")
             return False
 
-        f0, f1 = capture_skipped_frame_pair(rtsp_url, self.skip_frames)
+        f0, f1 = self._frame_pair(rtsp_url, stream_key, self.skip_frames)
         if f0 is None or f1 is None:
             return False
-
-        f0 = _resize_for_analysis(f0, self.analysis_max_w)
-        f1 = _resize_for_analysis(f1, self.analysis_max_w)
-
-        g0 = cv2.cvtColor(f0, cv2.COLOR_BGR2GRAY)
-        g1 = cv2.cvtColor(f1, cv2.COLOR_BGR2GRAY)
-
-        k = self.gaussian_ksize
-        if k >= 3 and k % 2 == 1:
-            g0 = cv2.GaussianBlur(g0, (k, k), 0)
-            g1 = cv2.GaussianBlur(g1, (k, k), 0)
-
-        diff = cv2.absdiff(g0, g1)
-        return float(diff.mean()) >= self.mean_threshold
+        return self.score(f0, f1, stream_key or rtsp_url) >= self.mean_threshold
 
 
 class Mog2MotionDetector(BaseDetector):
@@ -166,46 +265,71 @@ class Mog2MotionDetector(BaseDetector):
     than raw frame diff when tuned. Higher baseline CPU per poll than diff mode.
     """
 
-    def __init__(self):
+    def __init__(self, frame_source=None):
+        self.frame_source = frame_source
         self.analysis_max_w = _env_int("MOTION_ANALYSIS_MAX_WIDTH", 320)
         self.skip_frames = _env_int("MOTION_SKIP_FRAMES", 8)
         self.fg_ratio_threshold = _env_float("MOTION_MOG2_FG_RATIO", 0.002)
+        self.threshold = self.fg_ratio_threshold
+        self.needs_prev = False
         self.history = _env_int("MOTION_MOG2_HISTORY", 300)
         self.var_threshold = _env_float("MOTION_MOG2_VAR_THRESHOLD", 24)
-        self._subs: dict[str, object] = {}
-        self._lock = threading.Lock()
+        from app.processing.mog2_models import SubtractorRegistry
+
+        self.models = SubtractorRegistry(self.history, self.var_threshold)
 
-    def _get_sub(self, key: str):
+    def score(self, prev, frame, stream_key: str) -> float:
+        """Foreground pixel ratio (within masks/zones) after feeding frame to the stream's subtractor (prev unused)."""
         import cv2
 
-        with self._lock:
-            if key not in self._subs:
-                self._subs[key] = cv2.createBackgroundSubtractorMOG2(
-                    history=self.history,
-                    varThreshold=float(self.var_threshold),
-                    detectShadows=False,
-                )
-            return self._subs[key]
+        from app.processing.motion_batch import region_mean
+        from app.processing.motion_masks import regions_for
+
+        frame = _resize_for_analysis(frame, self.analysis_max_w)
+        fg = self.models.apply(stream_key, frame)
+        if fg is None or fg.size <= 0:
+            return 0.0  # model still warming up
+        _, binary = cv2.threshold(fg, 200, 1, cv2.THRESH_BINARY)
+        return region_mean(binary, regions_for(stream_key, binary.shape))
+
+    def score_batch(self, items: list[tuple]) -> list[float]:
+        """Subtractors are stateful per stream; the foreground ratios are one stacked pass."""
+        from app.processing.motion_batch import foreground_ratios
+        from app.processing.motion_masks import regions_for
+
+        fgs = [
+            self.models.apply(key, _resize_for_analysis(frame, self.analysis_max_w))
+            for key, _prev, frame in items
+        ]
+        ready = [i for i, fg in enumerate(fgs) if fg is not None]  # warming-up models score 0
+        scores = [0.0] * len(items)
+        if ready:
+            ratios = foreground_ratios(
+                [fgs[i] for i in ready],
+                regions=[regions_for(items[i][0], fgs[i].shape) for i in ready],
+            )
+            for i, r in zip(ready, ratios):
+                scores[i] = r
+        return scores
+
+    def retain(self, stream_keys):
+        self.models.retain(stream_keys)
+
+    def close(self):
+        self.models.snapshot_all()
+
+    def status(self) -> dict | None:
+        return self.models.status()
 
     def detect_motion(self, rtsp_url: str, stream_key: str | None = None) -> bool:
         try:
-            import cv2
+            import cv2  # noqa: F401
         except ImportError:
             logger.warning("opencv not installed — motion detection disabled")
             return False
 
         key = stream_key or rtsp_url
-        _prev, f1 = capture_skipped_frame_pair(rtsp_url, self.skip_frames)
+        _prev, f1 = self._frame_pair(rtsp_url, stream_key, self.skip_frames)
         if f1 is None:
             return False
-
-        frame = _resize_for_analysis(f1, self.analysis_max_w)
-        sub = self._get_sub(key)
-        fg = sub.apply(frame, learningRate=-1)
-        _, binary = cv2.threshold(fg, 200, 255, cv2.THRESH_BINARY)
-        nz = cv2.countNonZero(binary)
-        total = binary.shape[0] * binary.shape[1]
-        if total <= 0:
-            return False
-        ratio = nz / float(total)
-        return ratio >= self.fg_ratio_threshold
+        return self.score(None, f1, key) >= self.fg_ratio_threshold
@@ -7,16 +7,20 @@ from __future__ import annotations
 
 import logging
 import os
+import queue
 import tempfile
 import threading
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from app.config import get_recordings_dir
-from app.processing import clip_ffmpeg
+from app.processing import clip_ffmpeg, clip_queue, motion_masks, preroll, segment_clips, sharding
 from app.processing import motion_rtsp as motion_rtsp_mod
+from app.processing.motion_schedule import MotionSchedule
+from app.routes.api.utils import env_bool
+from app.services import connection_budget
 
 logger = logging.getLogger("opus.processing")
 
@@ -41,6 +45,12 @@ elif _MOTION_MODE_RAW in ("sub", "substream"):
 else:
     MOTION_RTSP_MODE = "auto"
 
+# auto = ffmpeg keyframe-only readers when ffmpeg is installed, else persistent (OpenCV
+# readers); probe = open-read-close every poll.
+MOTION_FRAME_SOURCE = (os.environ.get("MOTION_FRAME_SOURCE") or "auto").strip().lower()
+# Score every reader frame with start/end hysteresis (needs a persistent/ffmpeg frame source).
+MOTION_CONTINUOUS = env_bool("MOTION_CONTINUOUS", True)
+
 
 class ProcessingEngine:
     def __init__(self, app):
@@ -50,41 +60,84 @@ class ProcessingEngine:
         self._thread = None
         self._last_clip_at = {}
         self._last_tick_ts = 0.0
+        self._frame_source = None
         self._detector = self._make_detector()
+        self._analyzer = None
+        self._motion_events = queue.Queue()
+        # camera name -> ClipJob (live clip) or SegmentClipJob awaiting its motion end
+        self._open_events = {}
+        self._wake = threading.Event()
+        self._segment_clips = segment_clips.SegmentClipWriter(self.recordings_dir)
+        self._clips = clip_queue.ClipWriterPool(self._write_queued_clip, self._finish_clip_job)
+        self._preroll = preroll.PrerollBuffers() if preroll.ENABLED else None
+        self._schedule = MotionSchedule()
+        self._shard = sharding.ShardMembership() if sharding.ENABLED else None
+        if MOTION_CONTINUOUS and hasattr(self._frame_source, "reader"):
+            from app.processing.motion_schedule import CONTINUOUS_IDLE_MAX_SECONDS
+            from app.processing.motion_stream import MotionAnalyzer
+
+            self._schedule = MotionSchedule(CONTINUOUS_IDLE_MAX_SECONDS)
+            self._analyzer = MotionAnalyzer(
+                self._detector, self._frame_source, self._on_motion_event, self._schedule
+            )
 
-    @staticmethod
-    def _make_detector():
+    def _make_detector(self):
         from app.processing.detectors import (
             Mog2MotionDetector,
             OpenCvMotionDetector,
             StubDetector,
+            _env_int,
         )
+        from app.processing.frame_sources import make_frame_source
 
         if DETECTOR in ("stub", "none", "off"):
             return StubDetector()
+        self._frame_source = make_frame_source(
+            MOTION_FRAME_SOURCE, _env_int("MOTION_ANALYSIS_MAX_WIDTH", 320)
+        )
         if DETECTOR in ("opencv_mog2", "mog2"):
-            return Mog2MotionDetector()
-        return OpenCvMotionDetector()
+            return Mog2MotionDetector(self._frame_source)
+        return OpenCvMotionDetector(self._frame_source)
 
     def start(self):
         if self._running:
             return
         self._running = True
+        self._segment_clips.start()
+        self._clips.start()
+        if self._shard:
+            self._shard.start()
+        if self._analyzer:
+            self._analyzer.start()
         self._thread = threading.Thread(target=self._loop, daemon=True, name="processing")
         self._thread.start()
         logger.info(
-            "Processing engine started (poll=%ss, clip=%ss, detector=%s, motion_rtsp_mode=%s, motion_max_concurrent=%s)",
+            "Processing engine started (poll=%ss, clip=%ss, detector=%s, frames=%s%s, motion_rtsp_mode=%s, motion_max_concurrent=%s)",
             POLL_SECONDS,
             CLIP_SECONDS,
             DETECTOR,
+            self._frame_source.name if self._frame_source else "none",
+            ", continuous" if self._analyzer else "",
             MOTION_RTSP_MODE,
             MOTION_MAX_CONCURRENT,
         )
 
     def stop(self):
         self._running = False
+        self._wake.set()
+        if self._analyzer:
+            self._analyzer.stop()
+        self._segment_clips.stop()
+        self._clips.stop()
+        if self._preroll:
+            self._preroll.close()
+        if self._frame_source:
+            self._frame_source.close()
         if self._thread:
             self._thread.join(timeout=15)
+        if self._shard:
+            self._shard.stop()
+        self._detector.close()
 
     def _loop(self):
         time.sleep(2)
@@ -92,13 +145,25 @@ class ProcessingEngine:
             try:
                 with self.app.app_context():
                     from app.processing.motion_settings import read_motion_clip_settings
+                    from app.routes.api.recording_settings import refresh_settings_cache
 
+                    refresh_settings_cache()
                     poll = read_motion_clip_settings().poll_seconds
                     self._tick()
+                    if self._analyzer is None:
+                        # Wake when the next camera is due (the schedule spreads them out).
+                        poll = min(poll, max(0.25, self._schedule.next_wake()))
             except Exception:
                 logger.exception("processing tick failed")
                 poll = POLL_SECONDS
-            time.sleep(poll)
+            # Continuous mode: a motion start/end wakes the tick immediately.
+            self._wake.wait(poll)
+            self._wake.clear()
+
+    def _on_motion_event(self, ev):
+        """MotionAnalyzer thread callback."""
+        self._motion_events.put(ev)
+        self._wake.set()
 
     def _tick(self):
         from app.models import Camera
@@ -112,7 +177,8 @@ class ProcessingEngine:
 
         from app.processing.motion_settings import read_motion_clip_settings
 
-        cooldown_s = read_motion_clip_settings().cooldown_seconds
+        ms = read_motion_clip_settings()
+        cooldown_s = ms.cooldown_seconds
 
         qs = list(
             Camera.select().where(
@@ -122,23 +188,38 @@ class ProcessingEngine:
             )
         )
         cams = [c for c in qs if c.name.endswith("-main")]
+        if self._shard is not None:
+            cams = self._shard.owned(cams)
+        self._detector.retain(c.name for c in cams)
         now = time.time()
-        eligible = [
-            c
-            for c in cams
-            if now - self._last_clip_at.get(c.name, 0) >= cooldown_s
-        ]
-        if not eligible:
-            return
+        if self._preroll is not None:
+            self._preroll.set_cameras(
+                {
+                    c.name: motion_rtsp_mod.main_rtsp(c, GO2RTC_RTSP_URL)
+                    for c in cams
+                    if not segment_clips.use_segments(c)
+                }
+            )
+        if self._analyzer is not None:
+            from app.processing.frame_sources import READER_FPS
+
+            # Continuous analysis watches every camera at its scheduled rate (the reader
+            # rate while active); cooldown only gates clip starts.
+            self._schedule.sync([c.name for c in cams], 1.0 / READER_FPS)
+            candidates = cams
+        else:
+            self._schedule.sync([c.name for c in cams], ms.poll_seconds)
+            due = set(self._schedule.due())
+            candidates = [c for c in cams if c.name in due]
 
         health: dict[str, bool] | None = None
-        if GO2RTC_RTSP_URL:
+        if GO2RTC_RTSP_URL and candidates:
             from app.services.camera_stream_health import fetch_stream_online_map
 
             health = fetch_stream_online_map(GO2RTC_HTTP_URL, timeout=2.0)
 
         prepped: list[tuple] = []
-        for cam in eligible:
+        for cam in candidates:
             src_motion = motion_rtsp_mod.motion_rtsp(cam, GO2RTC_RTSP_URL, MOTION_RTSP_MODE)
             has_prod = motion_rtsp_mod.motion_stream_has_go2rtc_producers(
                 src_motion, health, GO2RTC_RTSP_URL
@@ -149,36 +230,150 @@ class ProcessingEngine:
                     cam.name,
                     motion_rtsp_mod.go2rtc_stream_key_from_motion_rtsp(src_motion, GO2RTC_RTSP_URL),
                 )
+                self._schedule.offline(cam.name)
                 continue
             prepped.append((cam, src_motion))
 
+        if self._analyzer is not None:
+            self._analyzer.set_cameras({cam.name: src for cam, src in prepped})
+            self._handle_motion_events({c.name: c for c in cams}, cooldown_s)
+            return
+
         if not prepped:
             return
 
-        def run_motion(item):
+        def sample(item):
             cam, src_motion = item
+            t0 = time.thread_time()
             try:
-                return cam, self._detector.detect_motion(src_motion, stream_key=cam.name)
+                pair = self._detector.sample(src_motion, stream_key=cam.name)
             except Exception:
-                logger.exception("detector failed: %s", cam.name)
-                return cam, False
-
-        workers = min(MOTION_MAX_CONCURRENT, len(prepped))
+                logger.exception("motion sample failed: %s", cam.name)
+                pair = None
+            return cam, pair, time.thread_time() - t0
+
+        # Probe sources block on RTSP per camera, so fetch those in parallel; persistent
+        # readers hand back buffered frames. Scoring is one batched call either way.
+        if hasattr(self._frame_source, "reader"):
+            samples = [sample(item) for item in prepped]
+        else:
+            with ThreadPoolExecutor(max_workers=min(MOTION_MAX_CONCURRENT, len(prepped))) as pool:
+                samples = list(pool.map(sample, prepped))
+        for cam, pair, _cpu in samples:
+            if pair is None:
+                self._schedule.offline(cam.name)
+        samples = [s for s in samples if s[1] is not None]
+        if not samples:
+            return
+        t0 = time.thread_time()
+        try:
+            scores = self._detector.score_batch([(cam.name, p[0], p[1]) for cam, p, _c in samples])
+        except ImportError:
+            logger.warning("opencv not installed — motion detection disabled")
+            return
+        score_cpu = (time.thread_time() - t0) / len(samples)
         fired = []
-        with ThreadPoolExecutor(max_workers=workers) as pool:
-            futures = {pool.submit(run_motion, item): item[0] for item in prepped}
-            for fut in as_completed(futures):
-                cam, motion = fut.result()
-                if motion:
-                    fired.append(cam)
+        for (cam, _p, cpu), sc in zip(samples, scores):
+            motion = sc >= self._detector.threshold
+            self._schedule.sampled(cam.name, motion, cpu + score_cpu)
+            if motion:
+                fired.append(cam)
 
         for cam in fired:
+            if segment_clips.use_segments(cam):
+                logger.info("Motion: %s — clip queued from segments", cam.name)
+                self._segment_job(cam, datetime.fromtimestamp(now)).finish(None)
+                self._schedule.hold(cam.name, cooldown_s)
+                continue
+            if self._queue_clip(cam, datetime.fromtimestamp(now)):
+                self._schedule.hold(cam.name, cooldown_s)
+
+    def _handle_motion_events(self, cams: dict, cooldown_s: int):
+        """
+        Continuous mode: a motion start captures a clip and opens a RecordingEvent at the
+        real start time; the matching end fills in ended_at / duration_seconds. With
+        segment clips the start opens a SegmentClipJob and the end closes its window.
+        """
+        while True:
+            try:
+                ev = self._motion_events.get_nowait()
+            except queue.Empty:
+                return
+            if ev.kind == "end":
+                job = self._open_events.pop(ev.camera, None)
+                if isinstance(job, segment_clips.SegmentClipJob):
+                    job.finish(datetime.fromtimestamp(ev.ended_at))
+                elif job is not None:
+                    from app.processing.motion_settings import read_motion_clip_settings
+
+                    self._clips.motion_ended(
+                        job, datetime.fromtimestamp(ev.ended_at), read_motion_clip_settings().post_seconds
+                    )
+                continue
+            cam = cams.get(ev.camera)
+            if cam is None:
+                continue
+            started_at = datetime.fromtimestamp(ev.started_at)
+            open_clip = self._clips.job_for(cam.name)
+            if open_clip is not None:
+                # Clip still queued/recording: extend it rather than start a second one.
+                self._queue_clip(cam, started_at)
+                self._open_events[cam.name] = open_clip
+                continue
+            if time.time() - self._last_clip_at.get(cam.name, 0) < cooldown_s:
+                logger.debug("Motion start on %s within cooldown — no clip", cam.name)
+                continue
+            if segment_clips.use_segments(cam):
+                # Cut from segments once the event has ended; the tick never waits on it.
+                logger.info("Motion: %s — clip queued from segments", cam.name)
+                self._open_events[cam.name] = self._segment_job(cam, started_at)
+                self._last_clip_at[cam.name] = time.time()
+                continue
+            if self._queue_clip(cam, started_at):
+                self._last_clip_at[cam.name] = time.time()
+                self._open_events[cam.name] = self._clips.job_for(cam.name)
+
+    def _queue_clip(self, cam, started_at) -> bool:
+        """Hand a live clip to the writer pool (or extend the camera's open one)."""
+        from app.processing.motion_settings import read_motion_clip_settings
+
+        ms = read_motion_clip_settings()
+        result = self._clips.submit(cam, started_at, ms.clip_seconds + ms.post_seconds)
+        if result == "queued":
             logger.info("Motion: %s — capturing clip", cam.name)
-            ev = self._write_clip(cam)
-            if ev:
-                self._last_clip_at[cam.name] = now
+        elif result == "extended":
+            logger.debug("Motion: %s — extending the clip in progress", cam.name)
+        return result != "rejected"
+
+    def _segment_job(self, cam, started_at):
+        from app.processing.motion_settings import read_motion_clip_settings
+
+        ms = read_motion_clip_settings()
+        return self._segment_clips.submit(
+            segment_clips.SegmentClipJob(
+                cam, started_at, ms.pre_seconds, ms.post_seconds, ms.clip_seconds
+            )
+        )
 
-    def _write_clip(self, cam):
+    @staticmethod
+    def _finish_clip_job(job):
+        """ClipWriterPool callback: motion end for a written clip."""
+        from app.models import RecordingEvent
+
+        RecordingEvent.update(
+            ended_at=job.ended_at,
+            duration_seconds=max(1, int(round((job.ended_at - job.started_at).total_seconds()))),
+        ).where(RecordingEvent.id == job.event_id).execute()
+
+    def _write_queued_clip(self, job):
+        """ClipWriterPool worker: record until the job's (movable) deadline."""
+        return self._write_clip(job.cam, started_at=job.started_at, until=job.deadline_at)
+
+    def _write_clip(self, cam, started_at=None, until=None):
+        """
+        Capture a motion clip; returns the new RecordingEvent id, or None.
+        until: callable -> monotonic deadline (ClipWriterPool); else clip + post seconds.
+        """
         from app.models import RecordingEvent
         from app.processing.motion_settings import read_motion_clip_settings
 
@@ -202,46 +397,71 @@ class ProcessingEngine:
         tmp_main.close()
         tmp_pre_path = None
         concat_pre = clip_ffmpeg.concat_pre_enabled()
+        t0 = time.monotonic()
+        capture_from = datetime.now()
+        ring = self._preroll.ring(cam.name) if self._preroll else None
+        ring_secs = 0.0
         try:
-            if not clip_ffmpeg.capture_rtsp_clip(
-                src, tmp_main.name, capture_sec, camera_name=cam.name
-            ):
-                return None
-
-            if pre > 0 and concat_pre:
-                seg = clip_ffmpeg.latest_stable_segment(self.recordings_dir, cam.name)
-                if seg:
-                    tmp_pre = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False, dir=clips_dir)
-                    tmp_pre.close()
-                    tmp_pre_path = tmp_pre.name
-                    if clip_ffmpeg.ffmpeg_extract_tail(seg, pre, tmp_pre_path):
-                        if clip_ffmpeg.ffmpeg_concat_copy([tmp_pre_path, tmp_main.name], fp):
-                            pass
+            if ring is not None:
+                # Pre-roll + live pieces straight from the camera's ring buffer, one remux.
+                ring_secs = preroll.write_clip_from_ring(
+                    ring,
+                    pre,
+                    until or (lambda: t0 + capture_sec),
+                    tmp_main.name,
+                    clip_queue.MAX_CLIP_SECONDS,
+                )
+                if ring_secs:
+                    approx_duration = int(round(ring_secs))
+                    os.replace(tmp_main.name, fp)
+                else:
+                    logger.info("pre-roll buffer for %s produced no clip — capturing live", cam.name)
+            if not ring_secs:
+                if not clip_ffmpeg.capture_rtsp_clip(
+                    src,
+                    tmp_main.name,
+                    capture_sec if until is None else clip_queue.MAX_CLIP_SECONDS,
+                    camera_name=cam.name,
+                    until=until,
+                ):
+                    return None
+                if until is not None:
+                    approx_duration = pre + int(round(time.monotonic() - t0))
+
+                if pre > 0 and concat_pre:
+                    seg = clip_ffmpeg.latest_stable_segment(self.recordings_dir, cam.name)
+                    if seg:
+                        tmp_pre = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False, dir=clips_dir)
+                        tmp_pre.close()
+                        tmp_pre_path = tmp_pre.name
+                        if clip_ffmpeg.ffmpeg_extract_tail(seg, pre, tmp_pre_path, end_at=capture_from):
+                            if clip_ffmpeg.ffmpeg_concat_copy([tmp_pre_path, tmp_main.name], fp):
+                                pass
+                            else:
+                                logger.warning(
+                                    "concat pre+main failed for %s — saving core clip only",
+                                    cam.name,
+                                )
+                                os.replace(tmp_main.name, fp)
                         else:
-                            logger.warning(
-                                "concat pre+main failed for %s — saving core clip only",
+                            logger.info(
+                                "pre-roll extract skipped for %s (segment too short or unreadable)",
                                 cam.name,
                             )
                             os.replace(tmp_main.name, fp)
                     else:
-                        logger.info(
-                            "pre-roll extract skipped for %s (segment too short or unreadable)",
+                        logger.debug(
+                            "no segment file for pre-roll on %s — enable rolling segments or continuous",
                             cam.name,
                         )
                         os.replace(tmp_main.name, fp)
                 else:
-                    logger.debug(
-                        "no segment file for pre-roll on %s — enable rolling segments or continuous",
-                        cam.name,
-                    )
+                    if pre > 0 and not concat_pre:
+                        logger.debug(
+                            "CLIP_CONCAT_PRE disabled — skipping pre-roll concat for %s",
+                            cam.name,
+                        )
                     os.replace(tmp_main.name, fp)
-            else:
-                if pre > 0 and not concat_pre:
-                    logger.debug(
-                        "CLIP_CONCAT_PRE disabled — skipping pre-roll concat for %s",
-                        cam.name,
-                    )
-                os.replace(tmp_main.name, fp)
         finally:
             for p in (tmp_main.name, tmp_pre_path):
                 if p and os.path.exists(p):
@@ -260,8 +480,8 @@ class ProcessingEngine:
             except OSError:
                 pass
             return None
-        started = datetime.now()
-        RecordingEvent.create(
+        started = started_at or datetime.now()
+        ev = RecordingEvent.create(
             camera=cam.id,
             camera_name=cam.name,
             filename=fn,
@@ -274,7 +494,7 @@ class ProcessingEngine:
             recording_id=None,
             status="complete",
         )
-        return True
+        return ev.id
 
     def get_status(self):
         from app.processing.motion_settings import read_motion_clip_settings
@@ -283,6 +503,7 @@ class ProcessingEngine:
         return {
             "engine_running": self._running,
             "detector": DETECTOR,
+            "detector_models": self._detector.status(),
             "poll_seconds": ms.poll_seconds,
             "clip_seconds": ms.clip_seconds,
             "clip_pre_seconds": ms.pre_seconds,
@@ -290,7 +511,16 @@ class ProcessingEngine:
             "cooldown_seconds": ms.cooldown_seconds,
             "motion_rtsp_mode": MOTION_RTSP_MODE,
             "motion_max_concurrent": MOTION_MAX_CONCURRENT,
+            "frames": self._frame_source.status() if self._frame_source else None,
+            "motion": self._analyzer.status() if self._analyzer else None,
+            "motion_schedule": self._schedule.status(),
+            "motion_zones": motion_masks.status(),
+            "segment_clips": self._segment_clips.status(),
+            "clip_queue": self._clips.status(),
+            "preroll": self._preroll.status() if self._preroll else None,
             "last_tick_unix": self._last_tick_ts,
+            "connection_budget": connection_budget.budget_status(),
+            "shard": self._shard.status() if self._shard else None,
         }
 
 
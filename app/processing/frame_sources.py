@@ -0,0 +1,388 @@
+"""
+Where motion detectors get their frames from (MOTION_FRAME_SOURCE on the processor).
+
+  auto (default)       — ffmpeg when an ffmpeg binary is installed, else persistent.
+  ffmpeg               — persistent readers backed by an ffmpeg child: keyframe-only
+                         decode (-skip_frame nokey, optional), FFMPEG_HWACCEL decode,
+                         fps/scale/gray done in the filter graph; fixed-size gray frames
+                         are read from the rawvideo pipe straight into NumPy buffers.
+                         Decodes one frame per GOP instead of every frame.
+  persistent           — one long-lived OpenCV reader thread per camera keeps the
+                         motion stream open and converts/downscales only MOTION_READER_FPS
+                         frames per second into a small ring buffer. OpenCV cannot skip
+                         decoding (grab() decodes every frame, as inter frames need their
+                         references), so this costs continuous decode at the stream's
+                         full fps: ~0.9% of an x86 core per camera at 640x360 and ~8% at
+                         1080p, 15 fps (scripts/bench_motion_reader.py on recorded
+                         files). On files the probe measures far less (~0.2% / ~1.8%)
+                         because it pays no RTSP handshake or keyframe wait there; on live
+                         streams measure both with the script. Without ffmpeg, use sub
+                         streams (MOTION_RTSP_MODE) with this source.
+  probe                — legacy: open, read a frame pair, close, every poll
+                         (detectors.capture_skipped_frame_pair).
+
+Readers hold an NVR session slot (services.connection_budget) while connected,
+reconnect with exponential backoff when the stream drops, and exit after
+MOTION_READER_IDLE_SECONDS without a poll (camera left events_only / was removed).
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+
+from app.processing.detectors import _env_float, _env_int
+from app.routes.api.utils import env_bool
+
+logger = logging.getLogger("opus.processing.frames")
+
+READER_FPS = max(0.2, _env_float("MOTION_READER_FPS", 2.0))
+READER_RING = max(2, _env_int("MOTION_READER_RING", 8))
+READER_IDLE_SECONDS = max(30, _env_int("MOTION_READER_IDLE_SECONDS", 300))
+READER_MAX_BACKOFF = 60.0
+# Consecutive failed grabs before the session is torn down and reopened.
+_GRAB_FAILURES = 5
+# ffmpeg source: decode I-frames only (GOP-rate sampling, far less CPU); output height
+# (0 = width * 9/16 — frames are a fixed size so the pipe can be read in whole frames).
+FFMPEG_KEYFRAMES_ONLY = env_bool("MOTION_FFMPEG_KEYFRAMES_ONLY", True)
+FFMPEG_HEIGHT = max(0, _env_int("MOTION_FFMPEG_HEIGHT", 0))
+
+
+class ProbeFrameSource:
+    """Open-read-close per poll (pre-reader behaviour)."""
+
+    name = "probe"
+
+    def frame_pair(self, rtsp_url: str, stream_key: str | None, skip_frames: int):
+        from app.processing.detectors import capture_skipped_frame_pair
+
+        return capture_skipped_frame_pair(rtsp_url, skip_frames, camera_name=stream_key)
+
+    def status(self) -> dict:
+        return {"source": self.name}
+
+    def close(self):
+        pass
+
+
+class FrameReader:
+    """Background thread holding one camera's motion stream open."""
+
+    def __init__(self, key: str, rtsp_url: str, *, fps: float, max_width: int, ring_size: int):
+        self.key = key
+        self.rtsp_url = rtsp_url
+        self.fps = fps
+        self.rate = fps  # frames/s actually converted; pace() lowers it for idle cameras
+        self.max_backoff = READER_MAX_BACKOFF
+        self.max_width = max_width
+        self._ring: deque = deque(maxlen=ring_size)  # (monotonic ts, frame)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_access = time.monotonic()
+        self.state = "starting"
+        self.connects = 0
+        self.frames = 0
+        self.last_error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="motion-reader")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def pace(self, interval: float):
+        """
+        Continuous analysis: the camera's schedule interval (motion_schedule). Convert at
+        most one frame per interval, and reconnect a dropped stream no faster.
+        """
+        self.rate = min(self.fps, 1.0 / max(interval, 1e-3))
+        self.max_backoff = max(READER_MAX_BACKOFF, interval)
+
+    def latest(self, n: int = 2) -> list:
+        """Newest n (ts, frame) entries, oldest first; marks the reader as in use."""
+        self.last_access = time.monotonic()
+        with self._lock:
+            return list(self._ring)[-n:]
+
+    def since(self, ts: float) -> list:
+        """(ts, frame) entries newer than ts, oldest first (continuous analysis)."""
+        self.last_access = time.monotonic()
+        with self._lock:
+            return [e for e in self._ring if e[0] > ts]
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self.last_access > READER_IDLE_SECONDS
+
+    @property
+    def stale_after(self) -> float:
+        """Newest frame older than this = stream not delivering."""
+        return max(5.0, 3.0 / self.fps)
+
+    def _push(self, ts: float, frame):
+        with self._lock:
+            self._ring.append((ts, frame))
+        self.frames += 1
+
+    def _run(self):
+        from app.services import connection_budget
+
+        backoff = 1.0
+        while not self._stop.is_set() and not self._idle():
+            with connection_budget.session(
+                camera_name=self.key, url=self.rtsp_url, purpose="motion reader " + self.key
+            ) as lease:
+                if lease is not None and self._session():
+                    backoff = 1.0
+            if self._stop.is_set() or self._idle():
+                break
+            self.state = "backoff"
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        self.state = "stopped"
+
+    def _session(self) -> bool:
+        """One connected session. True when at least one frame was delivered."""
+        from app.processing.detectors import _resize_for_analysis, open_capture
+
+        self.state = "connecting"
+        cap = open_capture(self.rtsp_url)
+        if cap is None:
+            self.last_error = "open failed"
+            return False
+        self.connects += 1
+        self.state = "streaming"
+        delivered = False
+        failures = 0
+        next_at = 0.0
+        try:
+            while not self._stop.is_set() and not self._idle():
+                # grab() demuxes and decodes every frame (OpenCV has no keyframe-only
+                # mode; skipping grabs would let the RTSP stream fall behind), so decode
+                # runs at the stream fps. Only retrieve() — the BGR conversion — and the
+                # resize run at the reader rate. The ffmpeg source avoids the decode.
+                if not cap.grab():
+                    failures += 1
+                    if failures >= _GRAB_FAILURES:
+                        self.last_error = "stream stalled"
+                        break
+                    continue
+                failures = 0
+                now = time.monotonic()
+                if now < next_at:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    continue
+                self._push(now, _resize_for_analysis(frame, self.max_width))
+                delivered = True
+                next_at = now + 1.0 / self.rate
+        except Exception as exc:
+            self.last_error = str(exc)[:200]
+            logger.debug("motion reader %s failed", self.key, exc_info=True)
+        finally:
+            try:
+                cap.release()
+            except Exception:
+                pass
+            with self._lock:
+                self._ring.clear()
+        return delivered
+
+    def status(self) -> dict:
+        with self._lock:
+            newest = self._ring[-1][0] if self._ring else None
+        return {
+            "state": self.state,
+            "connects": self.connects,
+            "frames": self.frames,
+            "frame_age_seconds": round(time.monotonic() - newest, 1) if newest else None,
+            "last_error": self.last_error,
+        }
+
+
+def ffmpeg_gray_frames_cmd(rtsp_url: str, width: int, height: int, fps: float, keyframes_only: bool):
+    """ffmpeg argv writing width x height gray rawvideo frames to stdout."""
+    from app.ffmpeg_config import hwaccel_input_args, rtsp_input_queue_args
+
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-nostdin",
+        *hwaccel_input_args(),
+        *rtsp_input_queue_args(),
+        *(["-skip_frame", "nokey"] if keyframes_only else []),
+        "-rtsp_transport", "tcp",
+        "-timeout", "10000000",
+        "-i", rtsp_url,
+        "-an", "-sn",
+        "-vf", "fps=%g,scale=%d:%d,format=gray" % (fps, width, height),
+        "-f", "rawvideo",
+        "-pix_fmt", "gray",
+        "pipe:1",
+    ]
+
+
+class FfmpegFrameReader(FrameReader):
+    """
+    FrameReader fed by an ffmpeg rawvideo pipe (2-D uint8 gray frames). The fps filter
+    is fixed per session, so pace() only stretches the reconnect backoff here; the
+    analyzer still scores idle cameras at their scheduled rate.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.width = self.max_width if self.max_width > 0 else 320
+        self.height = FFMPEG_HEIGHT or max(2, round(self.width * 9 / 16) // 2 * 2)
+        self._proc = None
+
+    @property
+    def stale_after(self) -> float:
+        # Keyframe-only sampling delivers one new frame per GOP (often 1-4 s).
+        return max(15.0 if FFMPEG_KEYFRAMES_ONLY else 5.0, 3.0 / self.fps)
+
+    def stop(self):
+        super().stop()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()  # unblocks a reader waiting on the pipe
+
+    def _session(self) -> bool:
+        import numpy as np
+
+        self.state = "connecting"
+        cmd = ffmpeg_gray_frames_cmd(
+            self.rtsp_url, self.width, self.height, self.fps, FFMPEG_KEYFRAMES_ONLY
+        )
+        try:
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except OSError as exc:
+            self.last_error = str(exc)[:200]
+            return False
+        self._proc = proc
+        self.connects += 1
+        delivered = False
+        prev = None
+        try:
+            while not self._stop.is_set() and not self._idle():
+                frame = np.empty((self.height, self.width), dtype=np.uint8)
+                if not _read_exact(proc.stdout, memoryview(frame).cast("B")):
+                    self.last_error = "ffmpeg exited rc=%s" % proc.poll()
+                    break
+                self.state = "streaming"
+                # The fps filter repeats the last keyframe to hold its rate; keep distinct frames only.
+                if prev is not None and np.array_equal(frame, prev):
+                    continue
+                prev = frame
+                self._push(time.monotonic(), frame)
+                delivered = True
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            try:
+                proc.wait(timeout=5)
+            except Exception:
+                pass
+            proc.stdout.close()
+            self._proc = None
+            with self._lock:
+                self._ring.clear()
+        return delivered
+
+
+def _read_exact(stream, view) -> bool:
+    """Fill view from stream; False on EOF before a whole frame arrived."""
+    got, n = 0, len(view)
+    while got < n:
+        r = stream.readinto(view[got:])
+        if not r:
+            return False
+        got += r
+    return True
+
+
+class PersistentFrameSource:
+    """Per-camera FrameReader pool; frame_pair() never blocks on the network."""
+
+    name = "persistent"
+
+    def __init__(self, max_width: int, reader_cls=FrameReader, name: str | None = None):
+        self.max_width = max_width
+        self.reader_cls = reader_cls
+        if name:
+            self.name = name
+        self._readers: dict[str, FrameReader] = {}
+        self._lock = threading.Lock()
+
+    def reader(self, key: str, rtsp_url: str) -> FrameReader:
+        """Running reader for key (started, or restarted when the URL changed / it idled out)."""
+        with self._lock:
+            r = self._readers.get(key)
+            if r is not None and (r.rtsp_url != rtsp_url or not r.alive):
+                r.stop()  # motion URL changed (sub/main switch) or reader idled out
+                r = None
+            if r is None:
+                r = self.reader_cls(
+                    key, rtsp_url, fps=READER_FPS, max_width=self.max_width, ring_size=READER_RING
+                )
+                self._readers[key] = r
+                r.start()
+            return r
+
+    def frame_pair(self, rtsp_url: str, stream_key: str | None, skip_frames: int):
+        """
+        (previous, newest) frames from the ring, READER_FPS apart. (None, None) while
+        the reader is still connecting or its newest frame is stale.
+        skip_frames is ignored — the reader rate sets the spacing.
+        """
+        r = self.reader(stream_key or rtsp_url, rtsp_url)
+        frames = r.latest(2)
+        if len(frames) < 2:
+            return None, None
+        if time.monotonic() - frames[-1][0] > r.stale_after:
+            return None, None
+        return frames[0][1], frames[1][1]
+
+    def status(self) -> dict:
+        with self._lock:
+            readers = dict(self._readers)
+        return {
+            "source": self.name,
+            "reader_fps": READER_FPS,
+            "readers": {k: r.status() for k, r in readers.items() if r.alive},
+        }
+
+    def close(self):
+        with self._lock:
+            for r in self._readers.values():
+                r.stop()
+            self._readers.clear()
+
+
+def resolve_source_name(name: str) -> str:
+    """MOTION_FRAME_SOURCE with auto resolved: ffmpeg when the binary is installed."""
+    name = (name or "auto").strip().lower()
+    if name == "auto":
+        return "ffmpeg" if shutil.which("ffmpeg") else "persistent"
+    return name
+
+
+def make_frame_source(name: str, max_width: int):
+    name = resolve_source_name(name)
+    if name in ("probe", "legacy"):
+        return ProbeFrameSource()
+    if name in ("ffmpeg", "ffmpeg_pipe", "rawvideo"):
+        return PersistentFrameSource(max_width, FfmpegFrameReader, name="ffmpeg")
+    return PersistentFrameSource(max_width)
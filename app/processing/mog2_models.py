@@ -0,0 +1,223 @@
+"""
+MOG2 background subtractor registry for Mog2MotionDetector (processor).
+
+  eviction  — models of cameras that left events_only are dropped on the next tick;
+              past MOTION_MOG2_MAX_MB (estimated model size) only models of streams no
+              longer retained are snapshotted and dropped. Active cameras' models are
+              never evicted (a re-created model scores 0 while it warms up, so LRU
+              churn would switch motion off): the cap then grows to cameras x model
+              size and a warning says so
+  snapshots — every MOTION_MOG2_SNAPSHOT_SECONDS each learned model's background image
+              is written to RECORDINGS_DIR/.mog2/<camera>_<w>x<h>.png (and on shutdown)
+  restore   — a new model is seeded from its camera's snapshot when one exists for the
+              same analysis size and is younger than MOTION_MOG2_SNAPSHOT_MAX_AGE_HOURS
+  warm-up   — a model scores 0 for its first MOTION_MOG2_WARMUP_FRAMES frames (only a
+              few when restored), so a restart or re-add does not flood clips while the
+              background is learned
+
+OpenCV cannot serialize MOG2's per-pixel mixtures, so the background image is the
+persisted state: seeding with it means the scene is known, only its variances re-learn.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.processing.detectors import _env_float, _env_int
+
+logger = logging.getLogger("opus.processing.mog2_models")
+
+MAX_MB = max(16, _env_int("MOTION_MOG2_MAX_MB", 256))
+SNAPSHOT_SECONDS = _env_int("MOTION_MOG2_SNAPSHOT_SECONDS", 300)  # 0 = never persist
+SNAPSHOT_MAX_AGE_HOURS = _env_float("MOTION_MOG2_SNAPSHOT_MAX_AGE_HOURS", 12)
+WARMUP_FRAMES = max(0, _env_int("MOTION_MOG2_WARMUP_FRAMES", 25))
+_RESTORED_WARMUP_FRAMES = 3
+
+
+def _model_bytes(sub, frame) -> int:
+    """Approximate MOG2 state size: per pixel, nmixtures x (weight, variance, mean[c]) float32 + mode count."""
+    h, w = frame.shape[:2]
+    c = frame.shape[2] if frame.ndim == 3 else 1
+    return h * w * (sub.getNMixtures() * (2 + c) * 4 + 1)
+
+
+class _Model:
+    __slots__ = ("sub", "shape", "bytes", "frames", "warmup", "last_snapshot")
+
+    def __init__(self, sub, frame, warmup: int):
+        self.sub = sub
+        self.shape = frame.shape
+        self.bytes = _model_bytes(sub, frame)
+        self.frames = 0
+        self.warmup = warmup
+        self.last_snapshot = time.monotonic()
+
+
+class SubtractorRegistry:
+    """Thread-safe stream key -> MOG2 model map, most recently used last."""
+
+    def __init__(self, history: int, var_threshold: float, snapshot_dir: str | None = None, max_mb: int = MAX_MB):
+        self.history = history
+        self.var_threshold = var_threshold
+        self.max_bytes = max_mb * 1024 * 1024
+        self._snapshot_dir = snapshot_dir
+        self._models: OrderedDict[str, _Model] = OrderedDict()
+        self._retained: set[str] | None = None  # None until the first retain(): nothing is stale yet
+        self._over_cap = False
+        self._lock = threading.Lock()
+        self.created = 0
+        self.restored = 0
+        self.evicted = 0
+        self.snapshots = 0
+
+    @property
+    def snapshot_dir(self) -> str | None:
+        if SNAPSHOT_SECONDS <= 0:
+            return None
+        if self._snapshot_dir is None:
+            from app.config import get_recordings_dir
+
+            self._snapshot_dir = os.path.join(get_recordings_dir(), ".mog2")
+        return self._snapshot_dir
+
+    def _snapshot_path(self, key: str, shape) -> str | None:
+        d = self.snapshot_dir
+        if not d:
+            return None
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", key)
+        return os.path.join(d, "%s_%dx%d.png" % (safe, shape[1], shape[0]))
+
+    def _create(self, key: str, frame) -> _Model:
+        import cv2
+
+        sub = cv2.createBackgroundSubtractorMOG2(
+            history=self.history,
+            varThreshold=float(self.var_threshold),
+            detectShadows=False,
+        )
+        warmup = WARMUP_FRAMES
+        bg = self._load_snapshot(key, frame)
+        if bg is not None:
+            sub.apply(bg, learningRate=1.0)
+            warmup = min(warmup, _RESTORED_WARMUP_FRAMES)
+            self.restored += 1
+        self.created += 1
+        return _Model(sub, frame, warmup)
+
+    def _load_snapshot(self, key: str, frame):
+        path = self._snapshot_path(key, frame.shape)
+        if not path:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > SNAPSHOT_MAX_AGE_HOURS * 3600:
+                return None
+        except OSError:
+            return None
+        import cv2
+
+        bg = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if bg is None or bg.shape != frame.shape:
+            return None
+        return bg
+
+    def apply(self, key: str, frame):
+        """Feed frame to the stream's model. Foreground mask, or None while the model warms up."""
+        with self._lock:
+            m = self._models.get(key)
+            if m is not None and m.shape != frame.shape:
+                m = None  # analysis size changed: the old model no longer fits
+            if m is None:
+                m = self._create(key, frame)
+                self._models[key] = m
+                self._enforce_cap(keep=key)
+            else:
+                self._models.move_to_end(key)
+        # Subtractors are per stream and a stream is fed by one thread at a time.
+        fg = m.sub.apply(frame, learningRate=-1)
+        m.frames += 1
+        if SNAPSHOT_SECONDS > 0 and time.monotonic() - m.last_snapshot >= SNAPSHOT_SECONDS:
+            self._snapshot(key, m)
+        return None if m.frames <= m.warmup else fg
+
+    def _enforce_cap(self, keep: str):
+        total = sum(m.bytes for m in self._models.values())
+        if total <= self.max_bytes:
+            self._over_cap = False
+            return
+        if self._retained is not None:
+            for key in [k for k in self._models if k != keep and k not in self._retained]:
+                m = self._models.pop(key)
+                total -= m.bytes
+                self.evicted += 1
+                self._snapshot(key, m)
+                logger.info("MOG2 model for %s evicted (stream no longer analyzed)", key)
+                if total <= self.max_bytes:
+                    return
+        if not self._over_cap:
+            self._over_cap = True
+            logger.warning(
+                "MOG2 models of %d analyzed cameras need ~%d MB, over MOTION_MOG2_MAX_MB=%d — keeping them all; raise the cap",
+                len(self._models),
+                total // (1024 * 1024),
+                self.max_bytes // (1024 * 1024),
+            )
+
+    def _snapshot(self, key: str, m: _Model):
+        m.last_snapshot = time.monotonic()
+        if m.frames < m.warmup:
+            return
+        path = self._snapshot_path(key, m.shape)
+        if not path:
+            return
+        import cv2
+
+        try:
+            bg = m.sub.getBackgroundImage()
+            if bg is None:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path[:-4] + ".tmp.png"
+            if cv2.imwrite(tmp, bg):
+                os.replace(tmp, path)
+                self.snapshots += 1
+        except (OSError, cv2.error):
+            logger.debug("MOG2 snapshot failed: %s", key, exc_info=True)
+
+    def retain(self, keys):
+        """Drop models for streams no longer analyzed (camera left events_only, removed, renamed)."""
+        keys = set(keys)
+        with self._lock:
+            self._retained = keys
+            gone = [k for k in self._models if k not in keys]
+            for k in gone:
+                del self._models[k]
+            self.evicted += len(gone)
+
+    def snapshot_all(self):
+        with self._lock:
+            models = list(self._models.items())
+        for key, m in models:
+            self._snapshot(key, m)
+
+    def status(self) -> dict:
+        with self._lock:
+            total = sum(m.bytes for m in self._models.values())
+            warming = sum(1 for m in self._models.values() if m.frames <= m.warmup)
+            count = len(self._models)
+        return {
+            "models": count,
+            "warming_up": warming,
+            "estimated_mb": round(total / (1024 * 1024), 1),
+            "max_mb": self.max_bytes // (1024 * 1024),
+            "over_cap": total > self.max_bytes,
+            "created": self.created,
+            "restored": self.restored,
+            "evicted": self.evicted,
+            "snapshots": self.snapshots,
+            "snapshot_dir": self.snapshot_dir,
+        }
@@ -0,0 +1,158 @@
+"""
+Per-camera motion masks and zones (camera_motion_zone, migration 018) as cached pixel runs.
+
+A camera's polygons are rasterized once per analysis frame size into Regions:
+  no masks, no zones — None: score the whole frame (no per-pixel masking at all)
+  masks only         — one Region "" = frame minus masks
+  zones              — one Region per zone = zone minus masks; the camera's score is
+                       the highest zone score, so motion outside every zone is ignored
+A Region keeps only its pixel runs in row-major order (start/end flat indices, two
+int32 per run — a polygon spans one or two runs per row) and the pixel count; scoring
+sums the runs with np.add.reduceat, so no per-pixel mask is kept or multiplied.
+Definitions are re-read only when motion_zone_version changes (checked every
+ZONES_CHECK_SECONDS).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger("opus.processing.motion_masks")
+
+ZONES_CHECK_SECONDS = 5.0
+
+_lock = threading.Lock()
+_defs: dict[str, dict] = {}  # camera name -> {"masks": [polygon], "zones": [(name, polygon)]}
+_bitmaps: dict[tuple, list | None] = {}  # (camera name, h, w) -> Regions
+_version = None
+_checked = 0.0
+_loaded = False
+
+
+class Region:
+    """One scoring region: the runs of pixels that count, as flat [start, end) bounds."""
+
+    __slots__ = ("name", "shape", "bounds", "count")
+
+    def __init__(self, name: str, bitmap):
+        import numpy as np
+
+        self.name = name
+        self.shape = bitmap.shape
+        edges = np.diff(np.concatenate(([0], bitmap.reshape(-1).astype(np.int8), [0])))
+        # Interleaved start0, end0, start1, end1, ...: np.add.reduceat over these sums
+        # each run at the even positions.
+        runs = np.column_stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+        self.bounds = runs.reshape(-1).astype(np.int32)
+        self.count = int(np.count_nonzero(bitmap))
+
+
+def parse_points(raw) -> list[tuple[float, float]] | None:
+    """Normalized polygon from JSON text or a list; None when invalid (< 3 points, out of 0..1)."""
+    try:
+        pts = json.loads(raw) if isinstance(raw, str) else raw
+        out = [(float(x), float(y)) for x, y in pts]
+    except (TypeError, ValueError):
+        return None
+    if len(out) < 3 or any(not (0.0 <= v <= 1.0) for p in out for v in p):
+        return None
+    return out
+
+
+def rasterize(polygons, height: int, width: int):
+    """0/1 uint8 (height, width) bitmap, 1 inside any of the normalized polygons."""
+    import cv2
+    import numpy as np
+
+    bm = np.zeros((height, width), dtype=np.uint8)
+    if polygons:
+        scaled = [
+            np.array([[round(x * (width - 1)), round(y * (height - 1))] for x, y in poly], dtype=np.int32)
+            for poly in polygons
+        ]
+        cv2.fillPoly(bm, scaled, 1)
+    return bm
+
+
+def _zone_version():
+    from app.database import db
+
+    try:
+        row = db.execute_sql("SELECT version FROM motion_zone_version WHERE id = 1").fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+
+def _load_defs() -> dict[str, dict]:
+    from app.models import Camera, CameraMotionZone
+
+    names = {c.id: c.name for c in Camera.select(Camera.id, Camera.name)}
+    defs: dict[str, dict] = {}
+    for z in CameraMotionZone.select().where(CameraMotionZone.enabled == True):
+        cam = names.get(z.camera_id)
+        poly = parse_points(z.points)
+        if cam is None or poly is None:
+            continue
+        d = defs.setdefault(cam, {"masks": [], "zones": []})
+        if z.kind == "zone":
+            d["zones"].append((z.name or "zone-%d" % z.id, poly))
+        else:
+            d["masks"].append(poly)
+    return defs
+
+
+def refresh(force: bool = False):
+    """Reload definitions (and drop cached bitmaps) when motion_zone_version changed."""
+    global _version, _checked, _loaded, _defs
+    with _lock:
+        now = time.monotonic()
+        if not force and _loaded and now - _checked < ZONES_CHECK_SECONDS:
+            return
+        _checked = now
+        version = _zone_version()
+        # Without the version table (pre-018 DB) there is nothing to load.
+        if not force and _loaded and version == _version:
+            return
+        try:
+            defs = _load_defs() if version is not None else {}
+        except Exception:
+            logger.debug("motion zone load failed", exc_info=True)
+            return
+        _defs, _version, _loaded = defs, version, True
+        _bitmaps.clear()
+
+
+def regions_for(camera_name: str | None, shape) -> list[Region] | None:
+    """Cached Regions for a camera at frame shape (H, W[, C]); None = whole frame."""
+    refresh()
+    d = _defs.get(camera_name or "")
+    if not d:
+        return None
+    h, w = shape[:2]
+    key = (camera_name, h, w)
+    regions = _bitmaps.get(key)
+    if regions is None and key not in _bitmaps:
+        masked_out = rasterize(d["masks"], h, w)
+        keep = 1 - masked_out
+        if d["zones"]:
+            regions = [Region(name, rasterize([poly], h, w) & keep) for name, poly in d["zones"]]
+        else:
+            regions = [Region("", keep)]
+        with _lock:
+            _bitmaps[key] = regions
+    return regions
+
+
+def status() -> dict:
+    return {
+        "version": _version,
+        "cameras": {
+            cam: {"masks": len(d["masks"]), "zones": [n for n, _p in d["zones"]]}
+            for cam, d in list(_defs.items())
+        },
+        "cached_bitmaps": len(_bitmaps),
+    }
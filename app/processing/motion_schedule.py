@@ -0,0 +1,182 @@
+"""
+Per-camera motion sampling schedule for the processor.
+
+Each camera has its own interval around a base — motion_poll_seconds when polling,
+the reader interval (1 / MOTION_READER_FPS) under MOTION_CONTINUOUS, where it paces
+how often the analyzer scores a camera and how fast its reader converts frames:
+  active   — motion seen (or a continuous event still open): MOTION_POLL_MIN_SECONDS,
+             or the base when that is shorter (continuous: every reader frame);
+             relaxes back to the base once the scene is quiet
+  idle     — no motion for MOTION_POLL_ACTIVE_SECONDS: grows 25% per quiet sample up to
+             MOTION_POLL_IDLE_MAX_SECONDS (MOTION_CONTINUOUS_IDLE_MAX_SECONDS when
+             continuous)
+  offline  — go2rtc has no producer or no frame came back twice in a row: doubles up to
+             MOTION_POLL_OFFLINE_MAX_SECONDS; the first good sample resets to the base
+  cooldown — polling only: after a clip the camera is not sampled again for
+             motion_cooldown_seconds (continuous analysis must keep watching for the end)
+Cameras start at a stable per-name phase within the base interval and keep their phase,
+so the tick samples a few due cameras at a time instead of every camera at once.
+Per-camera interval, samples/min and CPU cost (sampling thread CPU + share of the batch
+score) are on the processor /status as "motion_schedule".
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+from collections import deque
+
+from app.processing.detectors import _env_float
+
+MIN_SECONDS = max(0.5, _env_float("MOTION_POLL_MIN_SECONDS", 2))
+ACTIVE_SECONDS = _env_float("MOTION_POLL_ACTIVE_SECONDS", 120)
+IDLE_MAX_SECONDS = _env_float("MOTION_POLL_IDLE_MAX_SECONDS", 20)
+CONTINUOUS_IDLE_MAX_SECONDS = _env_float("MOTION_CONTINUOUS_IDLE_MAX_SECONDS", 2)
+OFFLINE_MAX_SECONDS = _env_float("MOTION_POLL_OFFLINE_MAX_SECONDS", 120)
+_RATE_WINDOW = 60.0
+_CPU_ALPHA = 0.2
+
+
+class _CamSchedule:
+    __slots__ = (
+        "interval", "next_due", "state", "last_motion", "misses",
+        "samples", "motion_samples", "recent", "cpu_ewma",
+    )
+
+    def __init__(self, interval: float, next_due: float):
+        self.interval = interval
+        self.next_due = next_due
+        self.state = "new"
+        self.last_motion = 0.0
+        self.misses = 0
+        self.samples = 0
+        self.motion_samples = 0
+        self.recent: deque[float] = deque()
+        self.cpu_ewma = None
+
+
+class MotionSchedule:
+    def __init__(self, idle_max_seconds: float = IDLE_MAX_SECONDS):
+        self._cams: dict[str, _CamSchedule] = {}
+        self._lock = threading.Lock()
+        self.base = 6.0
+        self.idle_max = idle_max_seconds
+        self.last_due = 0
+
+    def sync(self, names, base_seconds: float):
+        """Track exactly these cameras; new ones get a stable phase within the base interval."""
+        now = time.monotonic()
+        names = set(names)
+        with self._lock:
+            self.base = float(base_seconds)
+            for n in [n for n in self._cams if n not in names]:
+                del self._cams[n]
+            for n in names:
+                if n not in self._cams:
+                    phase = (zlib.crc32(n.encode()) % 1000) / 1000.0
+                    self._cams[n] = _CamSchedule(self.base, now + phase * self.base)
+
+    def due(self) -> list[str]:
+        now = time.monotonic()
+        with self._lock:
+            out = [n for n, c in self._cams.items() if c.next_due <= now]
+        self.last_due = len(out)
+        return out
+
+    def next_wake(self) -> float:
+        """Seconds until the next camera is due (the base interval when none are tracked)."""
+        with self._lock:
+            if not self._cams:
+                return self.base
+            return max(0.0, min(c.next_due for c in self._cams.values()) - time.monotonic())
+
+    def interval(self, name: str) -> float:
+        with self._lock:
+            c = self._cams.get(name)
+            return c.interval if c is not None else self.base
+
+    def _reschedule(self, c: _CamSchedule, now: float):
+        # Keep the camera's phase; a camera that fell behind restarts from now.
+        nd = c.next_due + c.interval
+        c.next_due = nd if nd > now else now + c.interval
+
+    def offline(self, name: str):
+        """No producer / no frame: back off."""
+        now = time.monotonic()
+        with self._lock:
+            c = self._cams.get(name)
+            if c is None:
+                return
+            c.misses += 1
+            if c.misses > 1:  # one miss is often a reader still connecting
+                c.state = "offline"
+                c.interval = min(OFFLINE_MAX_SECONDS, max(self.base, c.interval * 2))
+            self._reschedule(c, now)
+
+    def sampled(self, name: str, motion: bool, cpu_seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            c = self._cams.get(name)
+            if c is None:
+                return
+            c.samples += 1
+            c.recent.append(now)
+            while c.recent and now - c.recent[0] > _RATE_WINDOW:
+                c.recent.popleft()
+            c.cpu_ewma = cpu_seconds if c.cpu_ewma is None else (
+                _CPU_ALPHA * cpu_seconds + (1 - _CPU_ALPHA) * c.cpu_ewma
+            )
+            low = min(MIN_SECONDS, self.base)
+            if c.misses:
+                c.misses = 0
+                c.interval = self.base
+            if motion:
+                c.motion_samples += 1
+                c.last_motion = now
+                c.state = "active"
+                c.interval = low
+            elif c.last_motion and now - c.last_motion < ACTIVE_SECONDS:
+                c.state = "active"
+                c.interval = min(self.base, max(low, c.interval * 1.5))
+            else:
+                c.state = "idle"
+                c.interval = min(max(self.base, self.idle_max), max(self.base, c.interval * 1.25))
+            self._reschedule(c, now)
+
+    def hold(self, name: str, seconds: float):
+        """Clip started: skip the camera for the cooldown."""
+        with self._lock:
+            c = self._cams.get(name)
+            if c is not None:
+                c.state = "cooldown"
+                c.next_due = max(c.next_due, time.monotonic() + seconds)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        cams = {}
+        total_cpu = 0.0
+        total_rate = 0.0
+        with self._lock:
+            for n, c in sorted(self._cams.items()):
+                rate = sum(1 for t in c.recent if now - t <= _RATE_WINDOW) * 60.0 / _RATE_WINDOW
+                cpu_pct = (c.cpu_ewma or 0.0) / c.interval * 100.0
+                total_rate += rate
+                total_cpu += cpu_pct
+                cams[n] = {
+                    "state": c.state,
+                    "interval_seconds": round(c.interval, 1),
+                    "next_in_seconds": round(max(0.0, c.next_due - now), 1),
+                    "samples_per_min": round(rate, 1),
+                    "samples": c.samples,
+                    "motion_samples": c.motion_samples,
+                    "cpu_ms_per_sample": round((c.cpu_ewma or 0.0) * 1000, 1),
+                    "cpu_percent": round(cpu_pct, 2),
+                }
+        return {
+            "base_seconds": self.base,
+            "due_last_tick": self.last_due,
+            "samples_per_min": round(total_rate, 1),
+            "cpu_percent": round(total_cpu, 2),
+            "cameras": cams,
+        }
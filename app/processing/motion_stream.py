@@ -0,0 +1,211 @@
+"""
+Continuous motion analysis on persistent frame readers (MOTION_CONTINUOUS, processor).
+
+Every frame a reader delivers is scored against the previous one (detector.score_batch:
+all cameras' new frames in one vectorized call per pass, see motion_batch) and
+fed to a per-camera MotionTracker with start/end hysteresis, so motion between polls is
+not missed and events carry real boundaries instead of "motion seen at poll time +
+configured clip length".
+
+With a MotionSchedule (the engine always passes one) a camera is only scored when it
+is due: every reader frame while active, backing off to MOTION_CONTINUOUS_IDLE_MAX_SECONDS
+when quiet and further while its reader delivers nothing. Only the newest frame is
+scored per due camera, and the reader is paced to the same interval (FrameReader.pace).
+
+Hysteresis (env):
+  MOTION_START_FRAMES      — consecutive frames >= detector threshold to open an event (default 2)
+  MOTION_END_RATIO         — event stays open while score >= threshold * ratio (default 0.6)
+  MOTION_END_SECONDS       — quiet time below that before the event ends (default 6)
+  MOTION_MAX_EVENT_SECONDS — long activity is split into events of at most this length (default 600)
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app.processing.detectors import _env_float, _env_int
+
+logger = logging.getLogger("opus.processing.motion_stream")
+
+START_FRAMES = max(1, _env_int("MOTION_START_FRAMES", 2))
+END_RATIO = min(1.0, max(0.0, _env_float("MOTION_END_RATIO", 0.6)))
+END_SECONDS = max(0.5, _env_float("MOTION_END_SECONDS", 6.0))
+MAX_EVENT_SECONDS = max(10.0, _env_float("MOTION_MAX_EVENT_SECONDS", 600.0))
+
+
+@dataclass
+class MotionEvent:
+    camera: str
+    kind: str  # "start" | "end"
+    started_at: float  # wall clock (time.time())
+    ended_at: float | None = None
+    peak_score: float = 0.0
+
+
+class MotionTracker:
+    """Start/end hysteresis over a stream of (wall ts, score) for one camera."""
+
+    def __init__(self, camera: str, threshold: float):
+        self.camera = camera
+        self.start_threshold = threshold
+        self.end_threshold = threshold * END_RATIO
+        self.active = False
+        self.last_score = 0.0
+        self.events = 0
+        self._above = 0
+        self._first_above = None
+        self._started = 0.0
+        self._last_motion = 0.0
+        self._peak = 0.0
+
+    def update(self, ts: float, score: float) -> MotionEvent | None:
+        self.last_score = score
+        if not self.active:
+            if score < self.start_threshold:
+                self._above, self._first_above = 0, None
+                return None
+            self._above += 1
+            if self._first_above is None:
+                self._first_above = ts
+            if self._above < START_FRAMES:
+                return None
+            self.active = True
+            self.events += 1
+            self._started, self._last_motion, self._peak = self._first_above, ts, score
+            return MotionEvent(self.camera, "start", self._started, peak_score=score)
+
+        if score >= self.end_threshold:
+            self._last_motion = ts
+            self._peak = max(self._peak, score)
+        if ts - self._last_motion >= END_SECONDS:
+            return self.close(self._last_motion)
+        if ts - self._started >= MAX_EVENT_SECONDS:
+            return self.close(ts)
+        return None
+
+    def close(self, ended_at: float | None = None) -> MotionEvent | None:
+        """End an open event (quiet period, max length, or camera dropped from analysis)."""
+        if not self.active:
+            return None
+        self.active = False
+        self._above, self._first_above = 0, None
+        return MotionEvent(
+            self.camera, "end", self._started, ended_at or self._last_motion, self._peak
+        )
+
+
+class MotionAnalyzer:
+    """
+    Background thread: pulls new frames from every analysed camera's reader at the
+    reader rate, scores them, and calls on_event(MotionEvent) for starts and ends.
+    """
+
+    def __init__(self, detector, frame_source, on_event: Callable[[MotionEvent], None], schedule=None):
+        self.detector = detector
+        self.frame_source = frame_source
+        self.schedule = schedule
+        self._on_event = on_event
+        self._cams: dict[str, str] = {}
+        self._trackers: dict[str, MotionTracker] = {}
+        self._prev: dict[str, tuple] = {}  # name -> (reader connects, ts, frame)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.frames_scored = 0
+        self.last_batch = 0
+        self.last_score_ms = 0.0
+
+    def set_cameras(self, cams: dict[str, str]):
+        """Cameras to analyse: name -> motion RTSP URL. Cameras dropped here end their events."""
+        with self._lock:
+            self._cams = dict(cams)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="motion-analysis")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        from app.processing.frame_sources import READER_FPS
+
+        interval = 1.0 / READER_FPS
+        while not self._stop.wait(interval):
+            try:
+                self._pass()
+            except Exception:
+                logger.exception("motion analysis pass failed")
+
+    def _pass(self):
+        with self._lock:
+            cams = dict(self._cams)
+        for name in [n for n in self._trackers if n not in cams]:
+            ev = self._trackers.pop(name).close()
+            self._prev.pop(name, None)
+            if ev:
+                self._on_event(ev)
+        offset = time.time() - time.monotonic()
+        due = set(self.schedule.due()) if self.schedule is not None else None
+        # Gather every due camera's new frames first, score them in one batched call, then
+        # feed the trackers in frame order.
+        items, pending, readers = [], [], {}
+        for name, url in cams.items():
+            if due is not None and name not in due:
+                continue
+            reader = readers[name] = self.frame_source.reader(name, url)
+            prev = self._prev.get(name)
+            if prev is not None and prev[0] != reader.connects:
+                prev = None  # reconnected: don't diff across the gap
+            frames = reader.since(prev[1] if prev else 0.0)
+            if not frames:
+                if due is not None and reader.state != "streaming":
+                    self.schedule.offline(name)
+                    reader.pace(self.schedule.interval(name))
+                continue  # else stays due until the reader's next frame
+            if due is not None:
+                frames = frames[-1:]  # one score per scheduled slot
+            for ts, frame in frames:
+                if prev is not None:
+                    items.append((name, prev[2], frame))
+                    pending.append((name, ts))
+                prev = (reader.connects, ts, frame)
+            self._prev[name] = prev
+        if not items:
+            return
+        t0 = time.perf_counter()
+        scores = self.detector.score_batch(items)
+        self.last_batch = len(items)
+        self.last_score_ms = (time.perf_counter() - t0) * 1000.0
+        self.frames_scored += len(items)
+        for (name, ts), score in zip(pending, scores):
+            tracker = self._trackers.get(name)
+            if tracker is None:
+                tracker = self._trackers[name] = MotionTracker(name, self.detector.threshold)
+            ev = tracker.update(ts + offset, score)
+            if ev:
+                self._on_event(ev)
+            if due is not None:
+                # An open event keeps the camera at the full reader rate until it ends.
+                motion = tracker.active or score >= tracker.start_threshold
+                self.schedule.sampled(name, motion, self.last_score_ms / 1000.0 / len(items))
+                readers[name].pace(self.schedule.interval(name))
+
+    def status(self) -> dict:
+        return {
+            "frames_scored": self.frames_scored,
+            "last_batch": self.last_batch,
+            "last_score_ms": round(self.last_score_ms, 2),
+            "start_frames": START_FRAMES,
+            "end_seconds": END_SECONDS,
+            "cameras": {
+                n: {"active": t.active, "last_score": round(t.last_score, 4), "events": t.events}
+                for n, t in list(self._trackers.items())
+            },
+        }
@@ -0,0 +1,382 @@
+"""
+In-memory pre-roll ring buffer for live motion clips (CLIP_PREROLL_BUFFER, processor).
+
+One ffmpeg per buffered camera stream-copies the main stream into ~1 s MPEG-TS pieces
+under CLIP_PREROLL_DIR (tmpfs: /dev/shm when present). The segment muxer only cuts at
+keyframes, so every piece starts on a GOP boundary. Pieces older than
+CLIP_PREROLL_SECONDS are deleted.
+
+When motion fires, the pieces covering the pre-roll are appended to the clip, and later
+pieces are appended as they close until the clip's deadline. One remux to MP4 finishes
+the clip: no scan of the recordings directory, no tail extract, no concat, no second
+RTSP session. A piece is complete once the next one appears; its end time is its mtime.
+
+Costs one always-open main-stream session per buffered camera (taken from the NVR
+session budget) and about bitrate x CLIP_PREROLL_SECONDS of memory. Used for cameras
+whose clips are recorded live (not CLIP_SOURCE segments).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from app.processing.detectors import _env_int
+from app.routes.api.utils import env_bool
+
+logger = logging.getLogger("opus.processing.preroll")
+
+ENABLED = env_bool("CLIP_PREROLL_BUFFER", False)
+BUFFER_SECONDS = max(5, _env_int("CLIP_PREROLL_SECONDS", 20))
+PIECE_SECONDS = 1
+_MAX_BACKOFF = 60.0
+_PIECE_RE = re.compile(r"^p(\d{9})\.ts$")
+# Docker gives /dev/shm 64 MB unless the service sets shm_size; below this much free
+# space ffmpeg fails with ENOSPC and every clip falls back to an RTSP grab.
+_LOW_FREE_BYTES = 16 * 1024 * 1024
+_SPACE_WARN_SECONDS = 600
+_last_space_warning = 0.0
+
+
+def _default_dir() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "opus-preroll")
+
+
+BUFFER_DIR = os.environ.get("CLIP_PREROLL_DIR") or _default_dir()
+
+
+def _space(path: str) -> tuple[int, int] | None:
+    """(free, total) bytes of the filesystem holding path (or its nearest existing parent)."""
+    while path and not os.path.exists(path):
+        path = os.path.dirname(path)
+    try:
+        du = shutil.disk_usage(path or "/")
+    except OSError:
+        return None
+    return du.free, du.total
+
+
+def _warn_if_low_space(path: str, err: str = "") -> None:
+    """Log (at most every _SPACE_WARN_SECONDS) when the buffer filesystem is full or nearly so."""
+    global _last_space_warning
+
+    space = _space(path)
+    low = space is not None and space[0] < _LOW_FREE_BYTES
+    if not (low or "No space left" in err):
+        return
+    now = time.monotonic()
+    if now - _last_space_warning < _SPACE_WARN_SECONDS:
+        return
+    _last_space_warning = now
+    logger.warning(
+        "Pre-roll buffer %s is out of space (%s free) — raise the processor's shm_size "
+        "(about Mbit/s / 8 x CLIP_PREROLL_SECONDS x 1.5 MB per camera) or point "
+        "CLIP_PREROLL_DIR at a larger tmpfs",
+        path,
+        "%.0f MB of %.0f MB" % (space[0] / 1024**2, space[1] / 1024**2) if space else "unknown",
+    )
+
+
+def ring_cmd(rtsp_url: str, out_dir: str) -> list[str]:
+    from app.ffmpeg_config import rtsp_input_queue_args
+
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-nostdin",
+        *rtsp_input_queue_args(),
+        "-fflags", "+genpts+discardcorrupt",
+        "-rtsp_transport", "tcp",
+        "-timeout", "10000000",
+        "-i", rtsp_url,
+        "-map", "0:v",
+        "-c", "copy",
+        "-f", "segment",
+        "-segment_time", str(PIECE_SECONDS),
+        "-segment_format", "mpegts",
+        os.path.join(out_dir, "p%09d.ts"),
+    ]
+
+
+class PrerollRing:
+    """Supervised ffmpeg writing one camera's ring of TS pieces."""
+
+    def __init__(self, key: str, rtsp_url: str, root: str):
+        self.key = key
+        self.rtsp_url = rtsp_url
+        self.root = os.path.join(root, re.sub(r"[^A-Za-z0-9._-]", "_", key))
+        self.session_dir = None  # current ffmpeg's pieces; replaced on every reconnect
+        self._proc = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.state = "starting"
+        self.connects = 0
+        self.last_error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="preroll-ring")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def pieces(self, session_dir: str | None = None) -> list[tuple[int, str, float]]:
+        """Completed (index, path, end time) pieces of a session, oldest first."""
+        d = session_dir or self.session_dir
+        if not d:
+            return []
+        try:
+            names = os.listdir(d)
+        except OSError:
+            return []
+        found = []
+        for n in names:
+            m = _PIECE_RE.match(n)
+            if m:
+                found.append((int(m.group(1)), os.path.join(d, n)))
+        found.sort()
+        out = []
+        for idx, path in found[:-1]:  # the newest piece is still being written
+            try:
+                out.append((idx, path, os.path.getmtime(path)))
+            except OSError:
+                continue
+        return out
+
+    def _prune(self):
+        cutoff = time.time() - BUFFER_SECONDS
+        for _idx, path, end in self.pieces():
+            if end >= cutoff:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _run(self):
+        from app.services import connection_budget
+
+        shutil.rmtree(self.root, ignore_errors=True)  # leftovers from a previous run
+        backoff = 1.0
+        while not self._stop.is_set():
+            with connection_budget.session(
+                camera_name=self.key, url=self.rtsp_url, purpose="preroll " + self.key
+            ) as lease:
+                if lease is not None and self._session():
+                    backoff = 1.0
+            if self._stop.is_set():
+                break
+            self.state = "backoff"
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+        self.state = "stopped"
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _session(self) -> bool:
+        """One ffmpeg run. True when it produced pieces."""
+        self.connects += 1
+        session_dir = os.path.join(self.root, "s%d" % self.connects)
+        os.makedirs(session_dir, exist_ok=True)
+        # stderr to a file: a pipe nobody drains for hours would eventually block ffmpeg.
+        err_path = os.path.join(self.root, "ffmpeg.err")
+        try:
+            with open(err_path, "wb") as err_file:
+                proc = subprocess.Popen(
+                    ring_cmd(self.rtsp_url, session_dir),
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=err_file,
+                )
+        except OSError as exc:
+            self.last_error = str(exc)[:200]
+            return False
+        self._proc = proc
+        old, self.session_dir = self.session_dir, session_dir
+        if old:
+            shutil.rmtree(old, ignore_errors=True)  # open clips see their session vanish and finish
+        self.state = "buffering"
+        delivered = False
+        try:
+            while proc.poll() is None and not self._stop.is_set():
+                self._stop.wait(1.0)
+                self._prune()
+                delivered = delivered or bool(self.pieces())
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            try:
+                proc.wait(timeout=5)
+                with open(err_path, "rb") as f:
+                    err = f.read()[-400:].decode(errors="replace").strip()
+                if err:
+                    self.last_error = err[-200:]
+                _warn_if_low_space(self.root, err)
+            except Exception:
+                pass
+            self._proc = None
+        return delivered
+
+    def seconds_buffered(self) -> float:
+        p = self.pieces()
+        if len(p) < 2:
+            return 0.0
+        return p[-1][2] - p[0][2]
+
+    def status(self) -> dict:
+        p = self.pieces()
+        size = 0
+        for _i, path, _e in p:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return {
+            "state": self.state,
+            "connects": self.connects,
+            "pieces": len(p),
+            "seconds": round(self.seconds_buffered(), 1),
+            "bytes": size,
+            "last_error": self.last_error,
+        }
+
+
+def write_clip_from_ring(ring: PrerollRing, pre_seconds: int, until, out_path: str, max_seconds: float) -> float:
+    """
+    Flush the pre-roll pieces into out_path's TS staging file, keep appending pieces
+    until until() (monotonic deadline), then remux to MP4. Returns seconds of video
+    written (0.0 on failure).
+    """
+    session = ring.session_dir
+    pieces = ring.pieces(session)
+    if not session or not pieces:
+        return 0.0
+    now = time.time()
+    start_idx = pieces[-1][0] + 1
+    for idx, _path, end in pieces:
+        # First piece ending inside the window starts at or before now - pre (GOP-aligned).
+        if end > now - pre_seconds:
+            start_idx = idx
+            break
+    staging = out_path + ".ts"
+    next_idx = start_idx
+    last_end = None
+    t_cap = time.monotonic() + max_seconds
+    try:
+        with open(staging, "wb") as out:
+            broken = False
+            while not broken:
+                wrote = False
+                for idx, path, end in ring.pieces(session):
+                    if idx < next_idx:
+                        continue
+                    if idx != next_idx:
+                        broken = True  # gap (pruned under us): don't splice across it
+                        break
+                    try:
+                        with open(path, "rb") as f:
+                            shutil.copyfileobj(f, out)
+                    except OSError:
+                        broken = True
+                        break
+                    last_end = end
+                    next_idx += 1
+                    wrote = True
+                mono = time.monotonic()
+                deadline = min(until(), t_cap)
+                if last_end is not None and last_end >= time.time() + (deadline - mono):
+                    break  # covered up to the deadline
+                if mono >= deadline + 10 or not os.path.isdir(session):
+                    break  # piece never closed / ffmpeg reconnected and its session is gone
+                if not wrote:
+                    time.sleep(0.25)
+        if last_end is None:
+            return 0.0
+        r = subprocess.run(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", staging,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                out_path,
+            ],
+            capture_output=True,
+            timeout=120,
+        )
+        if r.returncode != 0:
+            logger.warning(
+                "preroll remux %s rc=%s %s", ring.key, r.returncode,
+                (r.stderr or b"").decode(errors="replace")[-200:],
+            )
+            return 0.0
+        return max(1.0, last_end - (now - pre_seconds))
+    except (OSError, subprocess.TimeoutExpired):
+        return 0.0
+    finally:
+        try:
+            os.remove(staging)
+        except OSError:
+            pass
+
+
+class PrerollBuffers:
+    """Per-camera PrerollRing pool driven by the processor tick."""
+
+    def __init__(self, root: str = BUFFER_DIR):
+        self.root = root
+        self._rings: dict[str, PrerollRing] = {}
+        self._lock = threading.Lock()
+
+    def set_cameras(self, cams: dict[str, str]):
+        """Buffer exactly these cameras: name -> main RTSP URL."""
+        with self._lock:
+            for name in [n for n, r in self._rings.items() if n not in cams or r.rtsp_url != cams[n]]:
+                self._rings.pop(name).stop()
+            for name, url in cams.items():
+                r = self._rings.get(name)
+                if r is None or not r.alive:
+                    r = self._rings[name] = PrerollRing(name, url, self.root)
+                    r.start()
+
+    def ring(self, name: str) -> PrerollRing | None:
+        """The camera's ring when it is buffering and has pieces."""
+        with self._lock:
+            r = self._rings.get(name)
+        if r is None or r.state != "buffering" or not r.pieces():
+            return None
+        return r
+
+    def status(self) -> dict:
+        with self._lock:
+            rings = dict(self._rings)
+        space = _space(self.root)
+        if rings:
+            _warn_if_low_space(self.root)
+        return {
+            "dir": self.root,
+            "free_mb": round(space[0] / 1024**2, 1) if space else None,
+            "total_mb": round(space[1] / 1024**2, 1) if space else None,
+            "low_space": space is not None and space[0] < _LOW_FREE_BYTES,
+            "buffer_seconds": BUFFER_SECONDS,
+            "cameras": {n: r.status() for n, r in rings.items()},
+        }
+
+    def close(self):
+        with self._lock:
+            for r in self._rings.values():
+                r.stop()
+            self._rings.clear()
@@ -0,0 +1,257 @@
+"""
+Motion clips cut from the recorder's segments after the fact (CLIP_SOURCE, processor).
+
+  rtsp     — legacy: a second live RTSP session records each clip in real time
+  segments — the clip window [start - pre, end + post] is stream-copied out of the
+             `recording` segments covering it, across segment boundaries; a motion
+             event costs no extra RTSP session and no duplicate capture
+  auto     — segments for cameras that have segment recording (events_only with
+             events_only_record_segments on), rtsp otherwise (default)
+
+Segments are only registered once the recorder closes them, so a clip is written up to
+one segment length after its window ends. Jobs wait in memory on a background thread —
+the processor tick only submits them. A job whose window is still not covered
+SEGMENT_WAIT_GRACE_SECONDS past one segment length is cut from what exists, or dropped.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from app.processing import clip_ffmpeg
+from app.services import keyframe_index
+
+logger = logging.getLogger("opus.processing.segment_clips")
+
+CLIP_SOURCE = (os.environ.get("CLIP_SOURCE") or "auto").strip().lower()
+SEGMENT_WAIT_GRACE_SECONDS = 120
+_CHECK_SECONDS = 2.0
+
+
+def camera_records_segments(cam) -> bool:
+    """Whether the recorder keeps segments for cam (mirrors recorder._camera_should_record_segments)."""
+    from app.routes.api.recording_settings import get_setting
+
+    pol = (getattr(cam, "recording_policy", None) or "continuous").strip().lower()
+    if pol == "off":
+        return False
+    if pol == "events_only":
+        return str(get_setting("events_only_record_segments", "false")).lower() in ("true", "1", "yes")
+    return True
+
+
+def use_segments(cam) -> bool:
+    if CLIP_SOURCE in ("segments", "segment", "recorded"):
+        return True
+    if CLIP_SOURCE == "auto":
+        return camera_records_segments(cam)
+    return False
+
+
+def _segment_minutes() -> int:
+    from app.routes.api.recording_settings import get_setting
+
+    try:
+        return max(1, min(60, int(get_setting("segment_minutes", "5") or 5)))
+    except (TypeError, ValueError):
+        return 5
+
+
+def segments_in_range(cam_name: str, start: datetime, end: datetime, segment_minutes: int):
+    """[(path, seg_start, seg_end)] overlapping [start, end), oldest first."""
+    from app.models import Recording
+    from app.recorder_segments import parse_segment_filename_ts
+
+    # Filenames sort by start time: range-scan the (camera_name, filename) index.
+    lo = (start - timedelta(minutes=segment_minutes * 2)).strftime("%Y-%m-%d_%H-%M-%S")
+    hi = end.strftime("%Y-%m-%d_%H-%M-%S") + ".mp4"
+    rows = (
+        Recording.select(Recording.filename, Recording.file_path, Recording.duration_seconds)
+        .where(
+            (Recording.camera_name == cam_name)
+            & (Recording.filename >= lo)
+            & (Recording.filename <= hi)
+        )
+        .order_by(Recording.filename)
+    )
+    out = []
+    for r in rows:
+        sa = parse_segment_filename_ts(r.filename)
+        if sa is None:
+            continue
+        ea = sa + timedelta(seconds=r.duration_seconds or segment_minutes * 60)
+        if ea > start and sa < end:
+            out.append((r.file_path, sa, ea))
+    return out
+
+
+def plan_pieces(segments, start: datetime, end: datetime):
+    """
+    concat-demuxer (path, inpoint, outpoint) list trimming segments to [start, end).
+    The first inpoint is moved back to the keyframe at or before it (segment keyframe
+    index): a stream copy starts there anyway, and the clip's timestamps then match.
+    """
+    pieces = []
+    for path, sa, ea in segments:
+        inpoint = max(0.0, (start - sa).total_seconds())
+        if inpoint > 0 and not pieces:
+            kfi = keyframe_index.load(path)
+            k = kfi.at_or_before(inpoint) if kfi is not None else None
+            if k is not None:
+                inpoint = kfi.times[k]
+        outpoint = (end - sa).total_seconds() if end < ea else None
+        pieces.append((path, inpoint, outpoint))
+    return pieces
+
+
+class SegmentClipJob:
+    """One pending clip. end is None while the motion event is still open."""
+
+    def __init__(self, cam, started_at: datetime, pre: int, post: int, min_seconds: int):
+        self.cam = cam
+        self.started_at = started_at
+        self.ended_at = None
+        self.pre = pre
+        self.post = post
+        self.min_seconds = min_seconds
+        self.end = None
+
+    def finish(self, ended_at: datetime | None = None):
+        """
+        Close the window: the clip covers at least min_seconds from the start, and the
+        whole event when its end is known (None = poll-mode trigger, end unknown).
+        """
+        self.ended_at = ended_at
+        core_end = self.started_at + timedelta(seconds=self.min_seconds)
+        if ended_at is not None:
+            core_end = max(core_end, ended_at)
+        self.end = core_end + timedelta(seconds=self.post)
+
+    @property
+    def start(self) -> datetime:
+        return self.started_at - timedelta(seconds=self.pre)
+
+
+class SegmentClipWriter:
+    """Background thread turning SegmentClipJobs into clip files + RecordingEvent rows."""
+
+    def __init__(self, recordings_dir: str):
+        self.recordings_dir = recordings_dir
+        self._jobs: list[SegmentClipJob] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.partial = 0
+        self.dropped = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="segment-clips")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def submit(self, job: SegmentClipJob) -> SegmentClipJob:
+        with self._lock:
+            self._jobs.append(job)
+        return job
+
+    def _loop(self):
+        while not self._stop.wait(_CHECK_SECONDS):
+            with self._lock:
+                jobs = [j for j in self._jobs if j.end is not None]
+            if not jobs:
+                continue
+            seg_min = _segment_minutes()
+            for job in jobs:
+                if self._stop.is_set():
+                    return
+                try:
+                    done = self._try_write(job, seg_min)
+                except Exception:
+                    logger.exception("segment clip failed: %s", job.cam.name)
+                    done = True
+                    self.dropped += 1
+                if done:
+                    with self._lock:
+                        self._jobs.remove(job)
+
+    def _try_write(self, job: SegmentClipJob, segment_minutes: int) -> bool:
+        """True when the job is finished (written or given up)."""
+        segs = segments_in_range(job.cam.name, job.start, job.end, segment_minutes)
+        covered = bool(segs) and segs[-1][2] >= job.end
+        overdue = datetime.now() > job.end + timedelta(
+            seconds=segment_minutes * 60 + SEGMENT_WAIT_GRACE_SECONDS
+        )
+        if not covered and not overdue:
+            return False
+        if not segs:
+            logger.warning("No segments for %s clip %s — dropped", job.cam.name, job.started_at)
+            self.dropped += 1
+            return True
+        if not covered:
+            self.partial += 1
+        self._write(job, plan_pieces(segs, job.start, job.end))
+        return True
+
+    def _write(self, job: SegmentClipJob, pieces):
+        from app.models import RecordingEvent
+
+        cam = job.cam
+        clips_dir = os.path.join(self.recordings_dir, "clips", cam.name)
+        os.makedirs(clips_dir, exist_ok=True)
+        fn = "%s_%s.mp4" % (job.started_at.strftime("%Y-%m-%d_%H-%M-%S"), uuid.uuid4().hex[:8])
+        fp = os.path.join(clips_dir, fn)
+        tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False, dir=clips_dir)
+        tmp.close()
+        try:
+            if not clip_ffmpeg.extract_segment_range(pieces, tmp.name):
+                self.dropped += 1
+                return
+            os.replace(tmp.name, fp)
+        finally:
+            if os.path.exists(tmp.name):
+                try:
+                    os.remove(tmp.name)
+                except OSError:
+                    pass
+        if job.ended_at is not None:
+            duration = (job.ended_at - job.started_at).total_seconds()
+        else:
+            duration = (job.end - job.start).total_seconds()
+        RecordingEvent.create(
+            camera=cam.id,
+            camera_name=cam.name,
+            filename=fn,
+            file_path=fp,
+            file_size=os.path.getsize(fp),
+            started_at=job.started_at,
+            ended_at=job.ended_at,
+            duration_seconds=max(1, int(round(duration))),
+            reason="motion",
+            recording_id=None,
+            status="complete",
+        )
+        self.written += 1
+        logger.info("Motion clip for %s cut from %d segment(s)", cam.name, len(pieces))
+
+    def status(self) -> dict:
+        with self._lock:
+            open_events = sum(1 for j in self._jobs if j.end is None)
+            pending = len(self._jobs) - open_events
+        return {
+            "clip_source": CLIP_SOURCE,
+            "open_events": open_events,
+            "pending": pending,
+            "written": self.written,
+            "partial": self.partial,
+            "dropped": self.dropped,
+        }
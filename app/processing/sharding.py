@@ -0,0 +1,286 @@
+"""
+Processor sharding across instances/hosts sharing the Opus database (PROCESSOR_SHARDING).
+
+Every instance has a PROCESSOR_SHARD_ID (default: hostname) and a heartbeat row in
+processor_shard (migration 019). Each heartbeat it:
+  1. lists live shards (heartbeat within PROCESSOR_LEASE_SECONDS)
+  2. assigns every events_only camera to one live shard — PROCESSOR_SHARD_PINS
+     ("cam-main=shard-a,…") when the pinned shard is live, otherwise a consistent-hash
+     ring over the live shard ids (64 virtual nodes each), so a joining or leaving shard
+     moves only ~1/N of the cameras
+  3. claims/renews processor_camera_lease rows for its cameras (a row held by another
+     shard is only taken once it has expired) and releases the ones it no longer owns
+A shard processes only cameras assigned to it whose lease is free, expired or its own,
+so a handoff never has two shards on one camera for longer than a heartbeat. A dead
+shard's cameras move to survivors once its heartbeat and leases expire; a clean stop
+deletes its rows so they move on the next heartbeat.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+
+from app.processing.detectors import _env_int
+from app.routes.api.utils import env_bool
+
+logger = logging.getLogger("opus.processing.sharding")
+
+ENABLED = env_bool("PROCESSOR_SHARDING", False)
+SHARD_ID = (os.environ.get("PROCESSOR_SHARD_ID") or socket.gethostname()).strip()
+HEARTBEAT_SECONDS = max(2, _env_int("PROCESSOR_HEARTBEAT_SECONDS", 10))
+LEASE_SECONDS = max(HEARTBEAT_SECONDS * 2, _env_int("PROCESSOR_LEASE_SECONDS", 30))
+_VNODES = 64
+
+
+def parse_pins(raw: str | None) -> dict[str, str]:
+    """"cam-main=shard-a, cam2-main=shard-b" -> {camera name: shard id}."""
+    pins = {}
+    for part in (raw or "").split(","):
+        cam, sep, shard = part.partition("=")
+        if sep and cam.strip() and shard.strip():
+            pins[cam.strip()] = shard.strip()
+    return pins
+
+
+PINS = parse_pins(os.environ.get("PROCESSOR_SHARD_PINS"))
+
+
+def _hash(s: str) -> int:
+    # Stable across processes (unlike hash()), so every shard builds the same ring.
+    return int.from_bytes(hashlib.md5(s.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, shard_ids, vnodes: int = _VNODES):
+        points = sorted((_hash("%s#%d" % (s, i)), s) for s in set(shard_ids) for i in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._shards = [p[1] for p in points]
+
+    def owner(self, name: str) -> str | None:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(name)) % len(self._keys)
+        return self._shards[i]
+
+
+def assign(names, live_shards, pins: dict[str, str] | None = None) -> dict[str, str]:
+    """Camera name -> shard id over the live shards (pins first, then the hash ring)."""
+    live = set(live_shards)
+    ring = HashRing(live)
+    out = {}
+    for n in names:
+        pinned = (pins or {}).get(n)
+        out[n] = pinned if pinned in live else ring.owner(n)
+    return out
+
+
+def default_status_url() -> str:
+    port = os.environ.get("PROCESSOR_STATUS_PORT", "5056")
+    return os.environ.get("PROCESSOR_STATUS_URL") or "http://%s:%s/status" % (socket.gethostname(), port)
+
+
+class ShardMembership:
+    """Heartbeat + lease thread; the engine tick filters its cameras through owned()."""
+
+    def __init__(self, shard_id: str = SHARD_ID, status_url: str | None = None):
+        self.shard_id = shard_id
+        self.status_url = status_url or default_status_url()
+        self.started_at = time.time()
+        self._names: list[str] | None = None
+        self._owned: set[str] = set()
+        self._assigned = 0
+        self._live: list[str] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_beat = 0.0
+        self.handoffs = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="processor-shard")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        from app.database import db
+
+        try:
+            # Hand our cameras over now instead of after the lease expires.
+            db.execute_sql("DELETE FROM processor_camera_lease WHERE shard_id = ?", (self.shard_id,))
+            db.execute_sql("DELETE FROM processor_shard WHERE shard_id = ?", (self.shard_id,))
+        except Exception:
+            logger.debug("shard cleanup failed", exc_info=True)
+
+    def owned(self, cams: list) -> list:
+        """This shard's share of the tick's cameras (also the candidate list for the next heartbeat)."""
+        first = self._names is None
+        self._names = [c.name for c in cams]
+        if first:
+            self._beat()
+        with self._lock:
+            owned = self._owned
+        return [c for c in cams if c.name in owned]
+
+    def _loop(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            if self._names is None:
+                continue
+            try:
+                self._beat()
+            except Exception:
+                logger.exception("shard heartbeat failed")
+
+    def _beat(self):
+        from app.database import db
+
+        now = time.time()
+        names = list(self._names or [])
+        db.execute_sql(
+            "INSERT INTO processor_shard (shard_id, status_url, started_at, heartbeat_at, cameras) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(shard_id) DO UPDATE SET "
+            "status_url = excluded.status_url, heartbeat_at = excluded.heartbeat_at, "
+            "cameras = excluded.cameras",
+            (self.shard_id, self.status_url, self.started_at, now, len(self._owned)),
+        )
+        live = {
+            r[0]
+            for r in db.execute_sql(
+                "SELECT shard_id FROM processor_shard WHERE heartbeat_at >= ?", (now - LEASE_SECONDS,)
+            ).fetchall()
+        }
+        live.add(self.shard_id)  # our own upsert may still be queued
+        leases = {
+            r[0]: (r[1], r[2])
+            for r in db.execute_sql(
+                "SELECT camera_name, shard_id, expires_at FROM processor_camera_lease"
+            ).fetchall()
+        }
+        mine = {n for n, s in assign(names, live, PINS).items() if s == self.shard_id}
+        owned = set()
+        for n in mine:
+            holder = leases.get(n)
+            if holder is None or holder[0] == self.shard_id or holder[1] < now:
+                owned.add(n)
+            # Conditional claim: never overwrite another shard's unexpired lease.
+            db.execute_sql(
+                "INSERT INTO processor_camera_lease (camera_name, shard_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(camera_name) DO UPDATE SET shard_id = excluded.shard_id, "
+                "expires_at = excluded.expires_at "
+                "WHERE processor_camera_lease.shard_id = excluded.shard_id "
+                "OR processor_camera_lease.expires_at < ?",
+                (n, self.shard_id, now + LEASE_SECONDS, now),
+            )
+        for n, (holder, _exp) in leases.items():
+            if holder == self.shard_id and n not in mine:
+                db.execute_sql(
+                    "DELETE FROM processor_camera_lease WHERE camera_name = ? AND shard_id = ?",
+                    (n, self.shard_id),
+                )
+        with self._lock:
+            gained, lost = owned - self._owned, self._owned - owned
+            self._owned = owned
+            self._assigned = len(mine)
+            self._live = sorted(live)
+        if gained or lost:
+            self.handoffs += len(gained) + len(lost)
+            logger.info(
+                "Shard %s: %d camera(s) (+%d −%d) across %d live shard(s)",
+                self.shard_id, len(owned), len(gained), len(lost), len(live),
+            )
+        self.last_beat = now
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "shard_id": self.shard_id,
+                "status_url": self.status_url,
+                "live_shards": list(self._live),
+                "assigned": self._assigned,
+                "cameras": sorted(self._owned),
+                "handoffs": self.handoffs,
+                "last_heartbeat_unix": self.last_beat,
+                "heartbeat_seconds": HEARTBEAT_SECONDS,
+                "lease_seconds": LEASE_SECONDS,
+            }
+
+
+def shards_overview(fetch_status: bool = True, timeout: float = 3.0) -> dict:
+    """API side: every shard row with its leases, live flag and (optionally) its /status."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+
+    from app.database import db
+
+    from app.models import Camera
+
+    now = time.time()
+    leases: dict[str, int] = {}
+    leased: set[str] = set()
+    for name, shard_id in db.execute_sql(
+        "SELECT camera_name, shard_id FROM processor_camera_lease WHERE expires_at >= ?", (now,)
+    ).fetchall():
+        leases[shard_id] = leases.get(shard_id, 0) + 1
+        leased.add(name)
+    shards = []
+    for shard_id, url, started, beat, cams in db.execute_sql(
+        "SELECT shard_id, status_url, started_at, heartbeat_at, cameras FROM processor_shard ORDER BY shard_id"
+    ).fetchall():
+        shards.append({
+            "shard_id": shard_id,
+            "live": beat >= now - LEASE_SECONDS,
+            "heartbeat_age_seconds": round(now - beat, 1),
+            "started_at_unix": started,
+            "cameras": leases.get(shard_id, 0),
+            "status_url": url,
+            "status": None,
+            "error": None,
+        })
+
+    def fetch(s):
+        try:
+            r = requests.get(s["status_url"], timeout=timeout)
+            r.raise_for_status()
+            s["status"] = r.json()
+        except Exception as exc:
+            s["error"] = str(exc)[:200]
+
+    live = [s for s in shards if s["live"] and s["status_url"]]
+    if fetch_status and live:
+        with ThreadPoolExecutor(max_workers=min(8, len(live))) as pool:
+            list(pool.map(fetch, live))
+
+    wanted = [
+        c.name
+        for c in Camera.select(Camera.name).where(
+            (Camera.active == True)
+            & (Camera.recording_enabled == True)
+            & (Camera.recording_policy == "events_only")
+        )
+        if c.name.endswith("-main")
+    ]
+    totals = {
+        "shards": len(shards),
+        "live": sum(1 for s in shards if s["live"]),
+        "cameras": sum(s["cameras"] for s in shards if s["live"]),
+        "clips_written": 0,
+        "clips_rejected": 0,
+    }
+    for s in shards:
+        cq = (s["status"] or {}).get("clip_queue") or {}
+        totals["clips_written"] += int(cq.get("written") or 0)
+        totals["clips_rejected"] += int(cq.get("rejected") or 0)
+    return {
+        "shards": shards,
+        "totals": totals,
+        # events_only cameras no shard holds a lease on (none live, or mid-handoff)
+        "unassigned_cameras": sorted(n for n in wanted if n not in leased),
+    }
@@ -3,7 +3,8 @@ Standalone processing worker (motion → clips for events_only cameras).
 """
 
 import logging
-import time
+import signal
+import threading
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,11 +35,23 @@ def main():
     status_port = int(os.environ.get("PROCESSOR_STATUS_PORT", "5056"))
     start_worker_status_server(eng, port=status_port, worker_name="processor")
     app.logger.info("Processor status HTTP on 0.0.0.0:%s (/status)", status_port)
+    # docker stop sends SIGTERM: stop cleanly so MOG2 backgrounds are snapshotted and
+    # shard leases released instead of waiting out their TTL.
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
     try:
-        while True:
-            time.sleep(3600)
+        while not stopping.wait(3600):
+            pass
     except KeyboardInterrupt:
-        eng.stop()
+        pass
+    app.logger.info("Processor shutting down")
+    eng.stop()
+    from playhouse.sqliteq import SqliteQueueDatabase
+
+    from app.database import db
+
+    if isinstance(db.obj, SqliteQueueDatabase):
+        db.obj.stop()  # flush queued writes (lease release, last events) before exiting
 
 
 if __name__ == "__main__":
@@ -2,11 +2,12 @@
 Recording Engine - Opus NVR
 Manages FFmpeg recording via go2rtc relay.
 Uses raw SQL (SqliteQueueDatabase compatible).
-Staggers FFmpeg launches to avoid overwhelming go2rtc/NVR.
+Rate-limits FFmpeg launches per NVR host (and go2rtc) to avoid overwhelming them.
 FFmpeg args matched to Frigate's battle-tested presets.
 """
 
 import os
+import queue
 import signal
 import subprocess
 import threading
@@ -15,9 +16,15 @@ import shutil
 import logging
 from app.config import get_recordings_dir
 from app.ffmpeg_config import get_video_pipeline_summary
+from app import recorder_launch
+from app import recorder_live
 from app import recorder_retention
 from app import recorder_segments
+from app import recorder_thumbnails
+from app import recorder_watch
+from app.routes.api.recording_settings import refresh_settings_cache
 from app.routes.api.utils import env_bool
+from app.services import connection_budget
 
 logger = logging.getLogger("opus.recorder")
 
@@ -29,14 +36,39 @@ MAX_STORAGE_GB       = float(os.environ.get("RECORDING_MAX_STORAGE_GB", "0"))
 POLL_INTERVAL        = int(os.environ.get("RECORDING_POLL_SECONDS", "10"))
 SCAN_INTERVAL        = int(os.environ.get("RECORDING_SCAN_SECONDS", "30"))
 RETENTION_INTERVAL   = int(os.environ.get("RECORDING_RETENTION_SECONDS", "300"))
+# Rows whose file vanished (manual deletes, volume restores) — one listdir per folder.
+ORPHAN_SWEEP_INTERVAL = int(os.environ.get("RECORDING_ORPHAN_SWEEP_SECONDS", "3600"))
 FFMPEG_RESTART_DELAY = int(os.environ.get("FFMPEG_RESTART_DELAY_SECONDS", "5"))
 GO2RTC_RTSP_URL      = os.environ.get("GO2RTC_RTSP_URL", "")
 MAX_CRASHES          = int(os.environ.get("RECORDING_MAX_CRASHES", "3"))
 SHELVE_RETRY_MIN     = int(os.environ.get("RECORDING_SHELVE_RETRY_MINUTES", "10"))
+# Minimum spacing between FFmpeg starts against the same NVR/camera host (token bucket rate).
 STAGGER_DELAY        = float(os.environ.get("RECORDING_STAGGER_SECONDS", "2"))
+LAUNCH_BURST         = float(os.environ.get("RECORDING_LAUNCH_BURST", "1"))
+# Starts per second through the go2rtc relay across all hosts (0 = only per-host limits).
+GO2RTC_LAUNCH_RATE   = float(os.environ.get("RECORDING_GO2RTC_LAUNCH_RATE", "2"))
+# A process that stays up this long has its crash counter reset.
+HEALTHY_AFTER_SECONDS = 60
 # Rolling segment buffer for events_only cameras (hours); older segments are purged first.
 EVENTS_ONLY_BUFFER_HOURS = int(os.environ.get("EVENTS_ONLY_BUFFER_HOURS", "48"))
 PROBE_SEGMENT_DURATIONS = env_bool("RECORDING_PROBE_DURATIONS", False)
+# inotify registers segments as FFmpeg closes them; the directory scan then only
+# reconciles every WATCH_RESCAN_INTERVAL seconds (falls back to SCAN_INTERVAL without inotify).
+SEGMENT_WATCH        = env_bool("RECORDING_SEGMENT_WATCH", True)
+# incremental = per-camera newest-filename cursor (O(new segments)); full = diff against every row.
+SCAN_MODE            = (os.environ.get("RECORDING_SCAN_MODE") or "incremental").strip().lower()
+WATCH_RESCAN_INTERVAL = int(os.environ.get("RECORDING_WATCH_RESCAN_SECONDS", "600"))
+# Scan-only mode: every Nth incremental scan is full, picking up files below a cursor.
+FULL_SCAN_EVERY = 20
+# mp4 = moov written when a segment closes; fmp4 = fragmented (empty moov + one fragment
+# per keyframe), readable while open — enables live indexing (recorder_live).
+SEGMENT_FORMAT       = (os.environ.get("RECORDING_SEGMENT_FORMAT") or "mp4").strip().lower()
+FRAGMENTED           = SEGMENT_FORMAT == "fmp4"
+_FRAGMENT_MOVFLAGS   = "movflags=+frag_keyframe+empty_moov+default_base_moof"
+# Write a keyframe index sidecar (<segment>.mp4.kfi) for every segment as it is registered.
+KEYFRAME_INDEX       = env_bool("RECORDING_KEYFRAME_INDEX", True)
+# Timeline thumbnail sprite sheets from completed segments (recorder_thumbnails).
+THUMBNAILS           = env_bool("RECORDING_THUMBNAILS", True)
 
 
 # When True, events_only cameras get 24/7 FFmpeg segment recording (rolling buffer up to EVENTS_ONLY_BUFFER_HOURS).
@@ -129,20 +161,73 @@ class RecordingEngine:
         self._thread = None
         self._last_scan = 0.0
         self._last_retention = 0.0
+        self._last_orphan_sweep = time.time()  # the service reconciles once at startup
         self._table_ok = False
+        self._watcher = None
+        self._live = recorder_live.LiveSegments(self.recordings_dir) if FRAGMENTED else None
+        self._live_thread = None
+        self._thumbs = recorder_thumbnails.ThumbnailWorker(self.recordings_dir) if THUMBNAILS else None
+        self._thumbs_thread = None
+        self._force_scan = False
+        # Serializes watcher inserts with the reconciliation scan (no duplicate rows).
+        self._register_lock = threading.Lock()
+        # camera_name -> newest registered filename; seeded lazily from the DB.
+        self._scan_cursors = {}
+        self._scan_passes = 0
+        self._last_retention_stats = None
+        # Launch scheduling: pending starts + backoff/shelve timers, serviced by the
+        # recorder-launch thread. Every structure below is guarded by self._lock, which
+        # is never held across Popen, process waits or sleeps.
+        self._sched = recorder_launch.LaunchScheduler(
+            host_rate=1.0 / STAGGER_DELAY if STAGGER_DELAY > 0 else 0.0,
+            burst=LAUNCH_BURST,
+            go2rtc_rate=GO2RTC_LAUNCH_RATE,
+        )
+        self._desired_cams = {}
+        self._segment_minutes = None
+        self._launch_blocked = False
+        self._launching = set()  # popped from the scheduler, Popen not yet recorded
+        self._budget_waiting = {}  # camera -> monotonic time its launch first hit a full NVR budget
+        self._exits = queue.Queue()
+        self._wake = threading.Condition()
+        self._woken = False
+        self._sched_thread = None
 
     def start(self):
         if self._running:
             return
         self._running = True
+        if SEGMENT_WATCH:
+            watcher = recorder_watch.SegmentWatcher(
+                self.recordings_dir,
+                self._on_segment_closed,
+                on_overflow=self._request_full_scan,
+                on_open=self._live.opened if self._live else None,
+            )
+            self._watcher = watcher if watcher.start() else None
         self._thread = threading.Thread(target=self._loop, daemon=True, name="recorder")
         self._thread.start()
+        self._sched_thread = threading.Thread(
+            target=self._schedule_loop, daemon=True, name="recorder-launch"
+        )
+        self._sched_thread.start()
+        if self._live:
+            self._live_thread = threading.Thread(target=self._live_loop, daemon=True, name="recorder-live")
+            self._live_thread.start()
+        if self._thumbs:
+            self._thumbs_thread = threading.Thread(
+                target=self._thumbnail_loop, daemon=True, name="recorder-thumbs"
+            )
+            self._thumbs_thread.start()
         logger.info(
-            "Recording engine started (seg=%smin, relay=%s, stagger=%ss, events_only_segments=%s)",
+            "Recording engine started (seg=%smin, format=%s, relay=%s, stagger=%ss/host, "
+            "events_only_segments=%s, watch=%s)",
             _segment_minutes_from_db(),
+            SEGMENT_FORMAT,
             "yes" if GO2RTC_RTSP_URL else "no",
             STAGGER_DELAY,
             "on" if _events_only_record_segments_from_db() else "off",
+            "inotify" if self._watcher else "scan",
         )
         vp = get_video_pipeline_summary()
         logger.info(
@@ -154,9 +239,20 @@ class RecordingEngine:
 
     def stop(self):
         self._running = False
+        if self._watcher:
+            self._watcher.stop()
+            self._watcher = None
+        self._notify()
+        if self._sched_thread:
+            self._sched_thread.join(timeout=5)
         with self._lock:
-            for n in list(self._procs):
-                self._kill(n)
+            infos = [self._forget(n) for n in list(self._procs)]
+        for info in infos:
+            self._terminate(info)
+        if self._live_thread:
+            self._live_thread.join(timeout=5)
+        if self._thumbs_thread:
+            self._thumbs_thread.join(timeout=5)
         if self._thread:
             self._thread.join(timeout=15)
 
@@ -165,14 +261,21 @@ class RecordingEngine:
         while self._running:
             try:
                 with self.app.app_context():
+                    # One settings version check per poll; every get_setting below is in-memory.
+                    refresh_settings_cache()
                     self._sync()
                     now = time.time()
-                    if now - self._last_scan >= SCAN_INTERVAL:
-                        self._scan_segments()
+                    if self._force_scan or now - self._last_scan >= self._scan_interval():
+                        full = self._force_scan or self._reconcile_due()
+                        self._force_scan = False
+                        self._scan_segments(full=full)
                         self._last_scan = now
                     if now - self._last_retention >= RETENTION_INTERVAL:
                         self._enforce_retention()
                         self._last_retention = now
+                    if now - self._last_orphan_sweep >= ORPHAN_SWEEP_INTERVAL:
+                        self._sweep_orphans()
+                        self._last_orphan_sweep = now
             except Exception:
                 logger.exception("Supervisor error")
             time.sleep(POLL_INTERVAL)
@@ -224,82 +327,101 @@ class RecordingEngine:
         return free < threshold
 
     def _sync(self):
+        """
+        Reconcile the desired camera set with running/pending FFmpeg writers.
+        Only decides; launches happen on the recorder-launch thread and kills
+        run after the lock is released.
+        """
         desired = self._desired()
         disk_pressure = self._disk_pressure()
+        cur_seg = _segment_minutes_from_db()
+        to_kill = []
         with self._lock:
+            self._desired_cams = desired
+            self._launch_blocked = disk_pressure
             for n in list(self._procs):
                 if n not in desired:
-                    self._kill(n)
+                    to_kill.append(self._forget(n))
+            for n in self._sched.pending_names():
+                if n not in desired:
+                    self._sched.cancel(n)
+                    self._budget_waiting.pop(n, None)
+
+            # Segment length is stored in DB — restart FFmpeg when it changes
+            if cur_seg != self._segment_minutes:
+                for n in list(self._procs):
+                    p = self._procs[n]
+                    if p.get("shelved") or p.get("segment_minutes") == cur_seg:
+                        continue
+                    logger.info(
+                        "Segment length for %s changed %s -> %s min; restarting FFmpeg",
+                        n,
+                        p.get("segment_minutes"),
+                        cur_seg,
+                    )
+                    to_kill.append(self._forget(n))
+                self._segment_minutes = cur_seg
 
-            launches = 0
             for name, cam in desired.items():
-                p = self._procs.get(name)
-
-                if p is None:
-                    if disk_pressure:
-                        logger.warning(
-                            "Skipping record start for %s: disk pressure (free < %.2f GiB)",
-                            name,
-                            _min_free_gb_from_db(),
-                        )
-                        continue
-                    if launches > 0:
-                        time.sleep(STAGGER_DELAY)
-                    self._launch(cam)
-                    launches += 1
+                if name in self._procs or name in self._launching or self._sched.is_pending(name):
                     continue
-
-                if p.get("shelved"):
-                    if time.time() >= p.get("retry_at", 0):
-                        logger.info("Retrying shelved: %s", name)
-                        cr = p.get("crashes", 0)
-                        del self._procs[name]
-                        if launches > 0:
-                            time.sleep(STAGGER_DELAY)
-                        self._launch(cam)
-                        if name in self._procs:
-                            self._procs[name]["crashes"] = cr
-                        launches += 1
+                if disk_pressure:
+                    logger.warning(
+                        "Skipping record start for %s: disk pressure (free < %.2f GiB)",
+                        name,
+                        _min_free_gb_from_db(),
+                    )
                     continue
+                self._sched.enqueue(name, self._bucket_keys(cam))
 
-                if p.get("wait_until") and time.time() < p["wait_until"]:
-                    continue
+        for info in to_kill:
+            self._terminate(info)
+        self._notify()
 
-                proc = p["process"]
-                if proc.poll() is None:
-                    if p.get("crashes", 0) > 0 and time.time() - p["started_at"] > 60:
-                        p["crashes"] = 0
-                    # Segment length is stored in DB — restart FFmpeg when it changes
-                    cur_seg = _segment_minutes_from_db()
-                    if p.get("segment_minutes") != cur_seg:
-                        logger.info(
-                            "Segment length for %s changed %s -> %s min; restarting FFmpeg",
-                            name,
-                            p.get("segment_minutes"),
-                            cur_seg,
-                        )
-                        self._kill(name)
-                        if disk_pressure:
-                            logger.warning(
-                                "Not restarting %s after segment change: disk pressure",
-                                name,
-                            )
-                            continue
-                        if launches > 0:
-                            time.sleep(STAGGER_DELAY)
-                        self._launch(desired[name])
-                        launches += 1
-                    continue
+    @staticmethod
+    def _bucket_keys(cam):
+        keys = (recorder_launch.source_host_key(cam),)
+        if GO2RTC_RTSP_URL:
+            keys += (recorder_launch.GO2RTC_BUCKET,)
+        return keys
+
+    def _notify(self):
+        with self._wake:
+            self._woken = True
+            self._wake.notify()
 
-                rt = time.time() - p["started_at"]
+    def _schedule_loop(self):
+        """recorder-launch thread: exits, due timers, then rate-limited launches."""
+        while self._running:
+            try:
+                with self.app.app_context():
+                    self._drain_exits()
+                    self._fire_timers()
+                    self._launch_ready()
+            except Exception:
+                logger.exception("Launch scheduler error")
+            with self._lock:
+                wait = self._sched.next_wakeup(include_pending=not self._launch_blocked)
+            with self._wake:
+                if not self._woken and self._running:
+                    self._wake.wait(timeout=POLL_INTERVAL if wait is None else min(wait, POLL_INTERVAL))
+                self._woken = False
+
+    def _drain_exits(self):
+        """Handle FFmpeg exits reported by their waiter threads (only the cameras that changed)."""
+        while True:
+            try:
+                name, proc, err = self._exits.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                p = self._procs.get(name)
+                if not p or p["process"] is not proc:
+                    continue  # killed on purpose or already replaced
+                now = time.time()
+                rt = now - p["started_at"]
                 cr = p.get("crashes", 0) + 1
                 p["crashes"] = cr
-
-                err = ""
-                try:
-                    err = proc.stderr.read().decode(errors="replace")[-300:]
-                except Exception:
-                    pass
                 p["last_error"] = err or "exit %s" % proc.returncode
 
                 if cr <= 3:
@@ -309,20 +431,75 @@ class RecordingEngine:
                     if cr == MAX_CRASHES:
                         logger.warning("Shelving %s (%d crashes)", name, cr)
                     p["shelved"] = True
-                    p["retry_at"] = time.time() + SHELVE_RETRY_MIN * 60
+                    p["retry_at"] = now + SHELVE_RETRY_MIN * 60
+                    self._sched.schedule(name, p["retry_at"], "retry")
                     continue
 
                 backoff = min(FFMPEG_RESTART_DELAY * (2 ** (cr - 1)), 60)
-                p["wait_until"] = time.time() + backoff
-                del self._procs[name]
-                if launches > 0:
-                    time.sleep(STAGGER_DELAY)
-                self._launch(cam)
-                if name in self._procs:
-                    self._procs[name]["crashes"] = cr
-                launches += 1
-
-    def _launch(self, camera):
+                p["wait_until"] = now + backoff
+                self._sched.schedule(name, p["wait_until"], "restart")
+
+    def _fire_timers(self):
+        with self._lock:
+            for name, kind, token in self._sched.pop_due():
+                p = self._procs.get(name)
+                if kind == "healthy":
+                    # Reset the crash counter only if the same process is still up.
+                    if p and p["process"] is token and token.poll() is None:
+                        p["crashes"] = 0
+                    continue
+                if name not in self._desired_cams:
+                    continue
+                if kind == "retry":
+                    logger.info("Retrying shelved: %s", name)
+                self._sched.enqueue(name, self._bucket_keys(self._desired_cams[name]))
+
+    def _launch_ready(self):
+        with self._lock:
+            if self._launch_blocked:
+                return
+            names = self._sched.pop_ready()
+            cams = [(n, self._desired_cams.get(n)) for n in names]
+            self._launching.update(names)
+        for name, cam in cams:
+            info, deferred = None, False
+            if cam is not None and self._running:
+                key, limit = connection_budget.budget_for(camera=cam)
+                lease = connection_budget.acquire(key, limit, purpose="record " + name, blocking=False)
+                if lease is None:
+                    deferred = True  # NVR session budget full — stays queued
+                    self._budget_waiting.setdefault(name, time.monotonic())
+                else:
+                    since = self._budget_waiting.pop(name, None)
+                    if since is not None:
+                        connection_budget.record_wait(key, limit, time.monotonic() - since)
+                    info = self._launch(cam, lease)
+            with self._lock:
+                self._launching.discard(name)
+                if deferred and name in self._desired_cams:
+                    self._sched.enqueue(name, self._bucket_keys(cam))
+                if info is None:
+                    continue
+                prev = self._procs.get(name)
+                if name not in self._desired_cams:
+                    stale = info  # removed while we were starting it
+                else:
+                    stale = None
+                    if prev:
+                        info["crashes"] = prev.get("crashes", 0)
+                    self._procs[name] = info
+                    if info["crashes"]:
+                        self._sched.schedule(
+                            name, info["started_at"] + HEALTHY_AFTER_SECONDS, "healthy", info["process"]
+                        )
+            if stale:
+                self._terminate(stale)
+
+    def _launch(self, camera, lease):
+        """
+        Start the segment FFmpeg for camera holding a connection-budget lease.
+        Returns the process-info dict, or None (lease released).
+        """
         from app.models import Camera
 
         try:
@@ -336,7 +513,8 @@ class RecordingEngine:
                 _norm_recording_policy(cam),
                 _events_only_record_segments_from_db(),
             )
-            return
+            lease.release()
+            return None
 
         cam_dir = os.path.join(self.recordings_dir, cam.name)
         os.makedirs(cam_dir, exist_ok=True)
@@ -370,6 +548,7 @@ class RecordingEngine:
             "-f", "segment",
             "-segment_time", str(seg),
             "-segment_format", "mp4",
+            *(["-segment_format_options", _FRAGMENT_MOVFLAGS] if FRAGMENTED else []),
             "-reset_timestamps", "1",
             "-strftime", "1",
             "-c:v", "copy",
@@ -381,21 +560,53 @@ class RecordingEngine:
             proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
         except FileNotFoundError:
             logger.error("ffmpeg not found")
-            return
+            lease.release()
+            return None
         except Exception:
             logger.exception("FFmpeg launch failed: %s", cam.name)
-            return
+            lease.release()
+            return None
 
-        self._procs[cam.name] = {
+        threading.Thread(
+            target=self._watch_exit, args=(cam.name, proc, lease), daemon=True, name="ffmpeg-wait"
+        ).start()
+        logger.info("Recording: %s PID=%d src=%s", cam.name, proc.pid, src)
+        return {
             "process": proc, "camera_id": cam.id, "source": src,
             "started_at": time.time(), "crashes": 0, "last_error": None,
             "shelved": False, "wait_until": None, "retry_at": None,
             "segment_minutes": seg_min,
         }
-        logger.info("Recording: %s PID=%d src=%s", cam.name, proc.pid, src)
 
-    def _kill(self, name):
-        info = self._procs.pop(name, None)
+    def _watch_exit(self, name, proc, lease):
+        """
+        Per-process waiter: drains stderr (so a chatty FFmpeg never blocks on a full
+        pipe), returns the NVR session slot, then reports the exit with the last
+        300 bytes of output.
+        """
+        tail = b""
+        try:
+            for chunk in iter(lambda: proc.stderr.read(4096), b""):
+                tail = (tail + chunk)[-300:]
+        except Exception:
+            pass
+        try:
+            proc.wait()
+        except Exception:
+            pass
+        lease.release()
+        self._exits.put((name, proc, tail.decode(errors="replace")))
+        self._notify()
+
+    def _forget(self, name):
+        """Drop name from the supervisor state (caller holds self._lock); returns its info."""
+        self._sched.cancel(name)
+        self._budget_waiting.pop(name, None)
+        return self._procs.pop(name, None)
+
+    @staticmethod
+    def _terminate(info):
+        """Stop an FFmpeg writer returned by _forget. Blocks up to 15s; never call under the lock."""
         if not info:
             return
         proc = info["process"]
@@ -422,27 +633,106 @@ class RecordingEngine:
         self._table_ok = bool(ok)
         return self._table_ok
 
-    def _scan_segments(self):
+    def _scan_interval(self):
+        if self._watcher and self._watcher.active:
+            return WATCH_RESCAN_INTERVAL
+        return SCAN_INTERVAL
+
+    def _reconcile_due(self):
+        """
+        Whether this periodic scan is full. With the watcher registering segments, the
+        periodic scan exists to reconcile what it missed, so it always is; scan-only,
+        every FULL_SCAN_EVERY-th pass is.
+        """
+        self._scan_passes += 1
+        if self._watcher and self._watcher.active:
+            return True
+        return self._scan_passes % FULL_SCAN_EVERY == 0
+
+    def _request_full_scan(self):
+        self._force_scan = True
+
+    def _on_segment_closed(self, cam_name, filename):
+        """Watcher thread callback: FFmpeg finished writing cam_name/filename."""
+        if not self._ensure_table():
+            return
+        if self._live:
+            self._live.closed(cam_name, filename)
+        with self._register_lock:
+            added = recorder_segments.register_segment_file(
+                self.recordings_dir,
+                cam_name,
+                filename,
+                segment_minutes=_segment_minutes_from_db(),
+                probe_segment_durations=PROBE_SEGMENT_DURATIONS,
+                fragmented=FRAGMENTED,
+                index_keyframes=KEYFRAME_INDEX,
+            )
+        # The scan cursors are left alone: moving one past a file this path skipped
+        # (table missing, still tiny, insert failed) would hide it from every later scan.
+        if added:
+            logger.debug("Watch: registered %s/%s", cam_name, filename)
+
+    def _scan_segments(self, full=False):
+        """
+        Register completed segments. Incremental (cursor) unless full=True or
+        RECORDING_SCAN_MODE=full; a full pass re-seeds the cursors from the DB.
+        """
         if not os.path.exists(self.recordings_dir):
             return
         if not self._ensure_table():
             return
 
+        writing = self._writing_names()
+        full = full or SCAN_MODE == "full"
+        with self._register_lock:
+            recorder_segments.scan_register_new_segments(
+                self.recordings_dir,
+                writing,
+                segment_minutes=_segment_minutes_from_db(),
+                probe_segment_durations=PROBE_SEGMENT_DURATIONS,
+                cursors=None if full else self._scan_cursors,
+                fragmented=FRAGMENTED,
+                index_keyframes=KEYFRAME_INDEX,
+            )
+            if full:
+                self._scan_cursors.clear()
+
+    def _writing_names(self):
+        """Cameras with a running (not shelved) segment FFmpeg."""
         writing = set()
         with self._lock:
             for n, p in self._procs.items():
                 if not p.get("shelved") and p["process"].poll() is None:
                     writing.add(n)
+        return writing
 
-        recorder_segments.scan_register_new_segments(
-            self.recordings_dir,
-            writing,
-            segment_minutes=_segment_minutes_from_db(),
-            probe_segment_durations=PROBE_SEGMENT_DURATIONS,
-        )
+    def _live_loop(self):
+        """Keep the open fragmented segments indexed and on the timeline (recorder_live)."""
+        while self._running:
+            time.sleep(recorder_live.LIVE_INDEX_SECONDS)
+            if not self._table_ok:
+                continue
+            try:
+                with self.app.app_context():
+                    self._live.tick(self._writing_names())
+            except Exception:
+                logger.exception("Live segment indexing failed")
+
+    def _thumbnail_loop(self):
+        """Pack newly completed segments into timeline sprite sheets (recorder_thumbnails)."""
+        while self._running:
+            time.sleep(recorder_thumbnails.POLL_SECONDS)
+            if not self._table_ok:
+                continue
+            try:
+                with self.app.app_context():
+                    self._thumbs.tick(lambda: self._running)
+            except Exception:
+                logger.exception("Thumbnail pass failed")
 
     def _enforce_retention(self):
-        recorder_retention.enforce_recording_retention(
+        self._last_retention_stats = recorder_retention.enforce_recording_retention(
             self.recordings_dir,
             retention_days=RETENTION_DAYS,
             max_storage_gb=MAX_STORAGE_GB,
@@ -450,18 +740,30 @@ class RecordingEngine:
             events_only_buffer_hours=_events_only_buffer_hours_from_db(),
         )
 
+    def _sweep_orphans(self):
+        from app.recording_reconcile import sweep_orphan_rows, sweep_orphan_sidecars
+
+        # Rows are read before their folder is listed, so a segment registered
+        # mid-sweep is already on disk when compared — no lock with the watcher needed.
+        sweep_orphan_rows()
+        sweep_orphan_sidecars(self.recordings_dir)
+
     @staticmethod
     def test_rtsp(url, timeout=10):
         res = {"url": url, "reachable": False, "error": None,
                "video_codec": None, "resolution": None, "fps": None,
                "video_bit_rate": None, "format_bit_rate": None}
         try:
-            p = subprocess.run(
-                ["ffprobe", "-v", "error", "-rtsp_transport", "tcp",
-                 "-timeout", str(timeout * 1000000),
-                 "-show_streams", "-show_format", "-of", "json", url],
-                capture_output=True, text=True, timeout=timeout + 5,
-            )
+            with connection_budget.session(url=url, purpose="ffprobe", timeout=timeout) as lease:
+                if lease is None:
+                    res["error"] = "NVR session budget full (waited %ds)" % timeout
+                    return res
+                p = subprocess.run(
+                    ["ffprobe", "-v", "error", "-rtsp_transport", "tcp",
+                     "-timeout", str(timeout * 1000000),
+                     "-show_streams", "-show_format", "-of", "json", url],
+                    capture_output=True, text=True, timeout=timeout + 5,
+                )
             if p.returncode != 0:
                 res["error"] = (p.stderr or "").strip()[-300:]
                 return res
@@ -500,6 +802,7 @@ class RecordingEngine:
         with self._lock:
             active = {}
             shelved_list = []
+            launch = self._sched.status()
             for name, p in self._procs.items():
                 if p.get("shelved"):
                     shelved_list.append({"name": name, "crashes": p.get("crashes", 0),
@@ -516,7 +819,7 @@ class RecordingEngine:
                     "source": p.get("source", ""),
                 }
 
-        tb = recorder_retention.total_mp4_bytes_under(self.recordings_dir)
+        tb = recorder_retention.segment_bytes_used(self.recordings_dir)
         disk = None
         free_gb = None
         if os.path.exists(self.recordings_dir):
@@ -538,9 +841,18 @@ class RecordingEngine:
             "shelved": shelved_list,
             "setup_complete_gate": self._setup_allows_recording(),
             "disk_pressure": pressure,
+            "launch_scheduler": launch,
+            "live_index": self._live.status() if self._live else None,
+            "thumbnails": self._thumbs.status() if self._thumbs else None,
+            "connection_budget": connection_budget.budget_status(),
+            "retention": {"last_run_unix": self._last_retention or None,
+                          "phases": self._last_retention_stats},
             "storage": {"recordings_gb": round(tb / 1024**3, 2),
                         "max_storage_gb": MAX_STORAGE_GB or None, "disk": disk},
             "config": {"segment_minutes": _segment_minutes_from_db(),
+                       "segment_format": SEGMENT_FORMAT,
+                       "keyframe_index": KEYFRAME_INDEX,
+                       "thumbnails": THUMBNAILS,
                        "retention_days": RETENTION_DAYS,
                        "clip_retention_days": _clip_retention_days_from_db(),
                        "events_only_record_segments": _events_only_record_segments_from_db(),
@@ -549,6 +861,11 @@ class RecordingEngine:
                        "recordings_free_gb": free_gb,
                        "source": "go2rtc_relay" if GO2RTC_RTSP_URL else "direct_rtsp",
                        "stagger_seconds": STAGGER_DELAY,
+                       "launch_burst": LAUNCH_BURST,
+                       "go2rtc_launch_rate": GO2RTC_LAUNCH_RATE if GO2RTC_RTSP_URL else None,
+                       "segment_watch": bool(self._watcher and self._watcher.active),
+                       "scan_interval_seconds": self._scan_interval(),
+                       "scan_mode": SCAN_MODE,
                        "shelve_after": MAX_CRASHES, "shelve_retry_min": SHELVE_RETRY_MIN},
         }
 
@@ -0,0 +1,172 @@
+"""
+FFmpeg launch scheduling for RecordingEngine.
+
+Replaces the old "sleep STAGGER_DELAY between Popen calls while holding the
+supervisor lock" loop:
+
+- Launch rate is limited by token buckets, one per upstream host (NVR / camera
+  IP) plus one shared bucket for go2rtc when recording through the relay, so a
+  slow host no longer delays cameras on other hosts.
+- Crash backoff, shelve retries and the "healthy after 60s" crash reset are
+  timers on a min-heap; the scheduler only wakes for timers that are due
+  instead of walking every process each tick.
+
+Pure bookkeeping — no threads or subprocesses here. The engine owns both.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+GO2RTC_BUCKET = "go2rtc"
+
+
+def source_host_key(cam) -> str:
+    """Bucket key for the device FFmpeg ultimately pulls from (NVR id, else RTSP host)."""
+    nvr = getattr(cam, "nvr", None)
+    nvr_id = getattr(nvr, "id", nvr)
+    if nvr_id:
+        return "nvr:%s" % nvr_id
+    try:
+        host = urlparse(getattr(cam, "rtsp_url", "") or "").hostname
+    except ValueError:
+        host = None
+    return "host:%s" % (host or "unknown")
+
+
+class TokenBucket:
+    """Classic token bucket; rate <= 0 means unlimited."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens -= 1.0
+
+
+class LaunchScheduler:
+    """
+    Pending launches (FIFO per camera name) gated by token buckets, plus a timer heap.
+
+    Not thread-safe: the engine calls it under its supervisor lock (all methods are O(1)
+    or O(log n) except pop_ready, which is O(pending)).
+    """
+
+    def __init__(self, host_rate: float, burst: float = 1.0, go2rtc_rate: float = 0.0):
+        self.host_rate = host_rate
+        self.burst = burst
+        self.go2rtc_rate = go2rtc_rate
+        self._buckets: dict[str, TokenBucket] = {}
+        self._pending: OrderedDict[str, tuple[str, ...]] = OrderedDict()
+        self._timers: list = []
+        self._timer_gen: dict[str, int] = {}
+        self._seq = itertools.count()
+        self.dispatched = 0
+        self.throttled = 0
+
+    def _bucket(self, key: str) -> TokenBucket:
+        b = self._buckets.get(key)
+        if b is None:
+            rate = self.go2rtc_rate if key == GO2RTC_BUCKET else self.host_rate
+            b = self._buckets[key] = TokenBucket(rate, self.burst)
+        return b
+
+    # ── pending launches ────────────────────────────────────────────────────
+
+    def enqueue(self, name: str, keys: tuple[str, ...]):
+        if name not in self._pending:
+            self._pending[name] = keys
+
+    def cancel(self, name: str):
+        self._pending.pop(name, None)
+        self.cancel_timers(name)
+
+    def is_pending(self, name: str) -> bool:
+        return name in self._pending
+
+    def pending_names(self) -> list[str]:
+        return list(self._pending)
+
+    def pop_ready(self, now: float | None = None) -> list[str]:
+        """Dequeue every pending launch whose buckets all have a token (tokens are taken)."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        for name, keys in list(self._pending.items()):
+            buckets = [self._bucket(k) for k in keys]
+            if any(b.wait_time(now) > 0 for b in buckets):
+                self.throttled += 1
+                continue
+            for b in buckets:
+                b.take(now)
+            del self._pending[name]
+            ready.append(name)
+        self.dispatched += len(ready)
+        return ready
+
+    # ── timers ──────────────────────────────────────────────────────────────
+
+    def schedule(self, name: str, due: float, kind: str, token=None):
+        """Fire (name, kind, token) at wall-clock *due*; replaces any earlier timer for name."""
+        gen = self._timer_gen.get(name, 0) + 1
+        self._timer_gen[name] = gen
+        heapq.heappush(self._timers, (due, next(self._seq), name, gen, kind, token))
+
+    def cancel_timers(self, name: str):
+        if name in self._timer_gen:
+            self._timer_gen[name] += 1
+
+    def pop_due(self, now: float | None = None) -> list[tuple[str, str, object]]:
+        now = time.time() if now is None else now
+        due = []
+        while self._timers and self._timers[0][0] <= now:
+            _, _, name, gen, kind, token = heapq.heappop(self._timers)
+            if self._timer_gen.get(name) == gen:
+                due.append((name, kind, token))
+        return due
+
+    def next_wakeup(self, now_wall: float | None = None, include_pending: bool = True) -> float | None:
+        """Seconds until the next timer or bucket refill matters (None = nothing scheduled)."""
+        now_wall = time.time() if now_wall is None else now_wall
+        waits = []
+        while self._timers and self._timer_gen.get(self._timers[0][2]) != self._timers[0][3]:
+            heapq.heappop(self._timers)
+        if self._timers:
+            waits.append(max(0.0, self._timers[0][0] - now_wall))
+        if include_pending and self._pending:
+            now = time.monotonic()
+            for keys in self._pending.values():
+                waits.append(max(self._bucket(k).wait_time(now) for k in keys))
+        return min(waits) if waits else None
+
+    def status(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "timers": len(self._timers),
+            "dispatched": self.dispatched,
+            "throttled_checks": self.throttled,
+            "hosts": len(self._buckets),
+        }
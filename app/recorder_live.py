@@ -0,0 +1,159 @@
+"""
+Live indexing of the segments FFmpeg is still writing (RECORDING_SEGMENT_FORMAT=fmp4).
+
+Fragmented segments are readable while open. Every RECORDING_LIVE_INDEX_SECONDS the
+recorder brings the keyframe sidecar (app/services/keyframe_index.py) of each writing
+camera's open segment up to date and upserts a status='writing' recording row spanning
+what has been written so far — the playback timeline, live-edge VOD and clip pre-roll
+all see the current segment. Closing the segment completes that row through the normal
+registration path (recorder_segments).
+
+The open file is learned from the watcher's IN_CREATE event; without inotify (or after
+a missed event) the camera folder is listed once the known file stops growing.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from app.recorder_segments import parse_segment_filename_ts
+from app.services import keyframe_index
+from app.services.mp4_index import Mp4Error, track_index
+
+logger = logging.getLogger("opus.recorder.live")
+
+LIVE_INDEX_SECONDS = max(1.0, float(os.environ.get("RECORDING_LIVE_INDEX_SECONDS", "2") or "2"))
+# Below this size the moov/first fragment may not be on disk yet.
+_MIN_BYTES = 10240
+
+_WRITING_SQL = (
+    "INSERT INTO recording"
+    " (camera,camera_name,filename,file_path,file_size,"
+    "  started_at,ended_at,duration_seconds,status)"
+    " VALUES (?,?,?,?,?,?,?,?,'writing')"
+    " ON CONFLICT(camera_name, filename) DO UPDATE SET"
+    " file_size = excluded.file_size, ended_at = excluded.ended_at,"
+    " duration_seconds = excluded.duration_seconds"
+    " WHERE recording.status = 'writing'"
+)
+
+
+class LiveSegments:
+    """Per-camera open segment + its last indexed state; driven by the recorder."""
+
+    def __init__(self, recordings_dir: str):
+        self.recordings_dir = recordings_dir
+        self._open: dict[str, str] = {}  # camera -> filename FFmpeg is writing
+        self._seen: dict[str, tuple[int, float]] = {}  # camera -> (indexed size, monotonic time it last grew)
+        self._cam_ids: dict[str, int | None] = {}
+        self._lock = threading.Lock()
+        self.rows_updated = 0
+        self.errors = 0
+
+    def opened(self, cam_name: str, filename: str):
+        """Watcher callback (IN_CREATE): FFmpeg started cam_name/filename."""
+        if not filename.endswith(".mp4"):
+            return
+        with self._lock:
+            if filename > self._open.get(cam_name, ""):
+                self._open[cam_name] = filename
+                self._seen.pop(cam_name, None)
+
+    def closed(self, cam_name: str, filename: str):
+        """Before registration of a closed segment: index its final fragments."""
+        fp = os.path.join(self.recordings_dir, cam_name, filename)
+        try:
+            keyframe_index.update_sidecar(fp)
+        except (OSError, Mp4Error) as exc:
+            logger.debug("Final index of %s failed: %s", fp, exc)
+        with self._lock:
+            if self._open.get(cam_name) == filename:
+                del self._open[cam_name]
+                self._seen.pop(cam_name, None)
+
+    def _newest(self, cam_name: str) -> str | None:
+        try:
+            names = [f for f in os.listdir(os.path.join(self.recordings_dir, cam_name)) if f.endswith(".mp4")]
+        except OSError:
+            return None
+        return max(names) if names else None
+
+    def tick(self, writing: set[str]) -> int:
+        """Index every writing camera's open segment and upsert its row. Returns rows written."""
+        from app.database import executemany_chunked
+        from app.models import Camera
+
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for gone in set(self._open) - writing:
+                self._open.pop(gone, None)
+                self._seen.pop(gone, None)
+            todo = {n: self._open.get(n) for n in writing}
+        for cam_name, fn in todo.items():
+            seen = self._seen.get(cam_name)
+            if fn is None or (seen and now - seen[1] > 3 * LIVE_INDEX_SECONDS):
+                # Unknown, or stopped growing (FFmpeg moved on without us seeing IN_CREATE).
+                fn = self._newest(cam_name)
+                if fn is None:
+                    continue
+                with self._lock:
+                    if fn != self._open.get(cam_name):
+                        self._open[cam_name] = fn
+                        self._seen.pop(cam_name, None)
+            fp = os.path.join(self.recordings_dir, cam_name, fn)
+            started = parse_segment_filename_ts(fn)
+            try:
+                size = os.path.getsize(fp)
+            except OSError:
+                continue
+            if started is None or size < _MIN_BYTES:
+                continue
+            seen = self._seen.get(cam_name)
+            if seen and seen[0] == size:
+                continue
+            self._seen[cam_name] = (size, now)
+            try:
+                keyframe_index.update_sidecar(fp, live=True)
+                secs = track_index(fp).seconds
+            except (OSError, Mp4Error) as exc:
+                self.errors += 1
+                logger.debug("Live index of %s failed: %s", fp, exc)
+                continue
+            if cam_name not in self._cam_ids:
+                cam = Camera.get_or_none(Camera.name == cam_name)
+                self._cam_ids[cam_name] = cam.id if cam else None
+            rows.append((
+                self._cam_ids[cam_name],
+                cam_name,
+                fn,
+                fp,
+                size,
+                started.isoformat(sep=" "),
+                (started + timedelta(seconds=secs)).isoformat(sep=" "),
+                int(secs),
+            ))
+        if not rows:
+            return 0
+        try:
+            n = executemany_chunked(_WRITING_SQL, rows)
+        except Exception:
+            self.errors += 1
+            logger.exception("Live segment rows failed (%d)", len(rows))
+            return 0
+        self.rows_updated += n
+        return n
+
+    def status(self) -> dict:
+        with self._lock:
+            open_files = dict(self._open)
+        return {
+            "interval_seconds": LIVE_INDEX_SECONDS,
+            "open_segments": open_files,
+            "rows_updated": self.rows_updated,
+            "errors": self.errors,
+        }
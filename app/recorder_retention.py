@@ -2,19 +2,32 @@
 Retention: age/size caps on `recording` rows, clip events, events_only rolling buffer.
 
 Separated from RecordingEngine so FFmpeg supervision does not own storage policy details.
+
+Each phase unlinks files in bulk and removes rows with chunked id deletes
+(one `DELETE … WHERE id IN (…)` and one transaction per DELETE_CHUNK_ROWS) instead of
+one queued DELETE per row. The age and storage-cap phases page through expired rows
+by (started_at, id), DELETE_CHUNK_ROWS at a time.
 """
 
 from __future__ import annotations
 
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 
+from app.services.keyframe_index import remove_sidecar
+
 logger = logging.getLogger("opus.recorder.retention")
 
+DELETE_CHUNK_ROWS = 500
+
 
 def total_mp4_bytes_under(recordings_dir: str) -> int:
-    """Sum byte size of all *.mp4 under per-camera subfolders (approximate storage use)."""
+    """
+    Sum byte size of all *.mp4 under per-camera subfolders (approximate storage use).
+    Full disk walk — prefer segment_bytes_used(), which reads the storage ledger.
+    """
     total = 0
     try:
         for d in os.listdir(recordings_dir):
@@ -32,6 +45,56 @@ def total_mp4_bytes_under(recordings_dir: str) -> int:
     return total
 
 
+def segment_bytes_used(recordings_dir: str) -> int:
+    """Registered segment bytes from the storage ledger; disk walk only if the ledger is unavailable."""
+    from app.services.storage_ledger import segment_bytes_total
+
+    total = segment_bytes_total()
+    if total is None:
+        return total_mp4_bytes_under(recordings_dir)
+    return total
+
+
+def _unlink_rows(rows) -> list[int]:
+    """
+    Remove files for (id, file_path, ...) rows. Returns ids whose file is gone
+    (removed now or already missing); rows whose unlink failed keep their DB row.
+    """
+    gone = []
+    for row in rows:
+        rid, fp = row[0], row[1]
+        if fp:
+            try:
+                os.remove(fp)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.debug("Cannot remove %s: %s", fp, exc)
+                continue
+            remove_sidecar(fp)
+        gone.append(rid)
+    return gone
+
+
+def _delete_rows(table: str, rows) -> int:
+    from app.database import delete_ids_chunked
+
+    ids = _unlink_rows(rows)
+    if not ids:
+        return 0
+    return delete_ids_chunked(table, ids, chunk_size=DELETE_CHUNK_ROWS)
+
+
+def _timed(phases: dict, name: str, fn, *args) -> None:
+    t0 = time.monotonic()
+    deleted = 0
+    try:
+        deleted = fn(*args) or 0
+    except Exception:
+        logger.exception("Retention phase %s failed", name)
+    phases[name] = {"deleted": deleted, "seconds": round(time.monotonic() - t0, 3)}
+
+
 def enforce_recording_retention(
     recordings_dir: str,
     *,
@@ -39,144 +102,170 @@ def enforce_recording_retention(
     max_storage_gb: float,
     clip_retention_days: int,
     events_only_buffer_hours: int,
-) -> None:
+) -> dict:
+    """
+    Apply age retention, optional max-storage trim, empty dir cleanup, clip retention,
+    events_only segment buffer purge, and drop timeline thumbnail sheets older than
+    what is left. Logs aggregate actions.
+    Returns per-phase {deleted, seconds} timings (also logged).
+
+    Orphan rows (file missing) are handled by recording_reconcile.sweep_orphan_rows on
+    the recorder's slower RECORDING_ORPHAN_SWEEP_SECONDS cadence.
+    """
+    phases: dict[str, dict] = {}
+    t0 = time.monotonic()
+
+    if retention_days > 0:
+        _timed(phases, "age", _purge_by_age, retention_days)
+    if max_storage_gb > 0:
+        _timed(phases, "max_storage", _purge_to_storage_cap, recordings_dir, max_storage_gb)
+    _timed(phases, "empty_dirs", _remove_empty_dirs, recordings_dir)
+    if clip_retention_days > 0:
+        _timed(phases, "clips", _purge_old_clips, clip_retention_days)
+    if events_only_buffer_hours > 0:
+        _timed(phases, "events_only_buffer", _purge_events_only_buffer, events_only_buffer_hours)
+    _timed(phases, "thumbnails", _prune_thumbnail_sheets, recordings_dir)
+
+    deleted = sum(p["deleted"] for k, p in phases.items() if k in ("age", "max_storage"))
+    if deleted:
+        logger.info("Retention: deleted %d segments", deleted)
+    logger.info(
+        "Retention pass %.2fs: %s",
+        time.monotonic() - t0,
+        ", ".join("%s=%d/%.2fs" % (k, p["deleted"], p["seconds"]) for k, p in phases.items()),
+    )
+    return phases
+
+
+def _prune_thumbnail_sheets(recordings_dir: str) -> int:
     """
-    Apply age retention, optional max-storage trim, orphan DB cleanup, empty dir cleanup,
-    clip retention, and events_only segment buffer purge. Logs aggregate actions.
+    Remove thumbnail sheets for hours before each camera's oldest remaining segment —
+    whichever phase (age, storage cap, events_only buffer) deleted the footage.
     """
     from app.database import db
+    from app.services import thumbnails
+
+    removed = 0
+    for cam_name in thumbnails.sheet_cameras(recordings_dir):
+        row = db.execute_sql(
+            "SELECT MIN(started_at) FROM recording WHERE camera_name = ?", (cam_name,)
+        ).fetchone()
+        oldest = None
+        if row and row[0]:
+            try:
+                oldest = row[0] if isinstance(row[0], datetime) else datetime.fromisoformat(str(row[0]))
+            except ValueError:
+                continue
+        removed += thumbnails.remove_before(recordings_dir, cam_name, oldest)
+    return removed
+
+
+def _purge_by_age(retention_days: int) -> int:
+    """Delete segments started before the cutoff, paging by (started_at, id)."""
+    from app.database import db
 
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(sep=" ")
     deleted = 0
+    last_sa, last_id = "", -1
+    while True:
+        rows = db.execute_sql(
+            "SELECT id, file_path, started_at FROM recording"
+            " WHERE started_at < ? AND (started_at > ? OR (started_at = ? AND id > ?))"
+            " ORDER BY started_at ASC, id ASC LIMIT ?",
+            (cutoff, last_sa, last_sa, last_id, DELETE_CHUNK_ROWS),
+        ).fetchall()
+        if not rows:
+            break
+        # Rows whose unlink failed stay behind the cursor, so a page is never re-read.
+        last_id, last_sa = rows[-1][0], rows[-1][2]
+        deleted += _delete_rows("recording", rows)
+        if len(rows) < DELETE_CHUNK_ROWS:
+            break
+    return deleted
 
-    if retention_days > 0:
-        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
-        try:
-            rows = db.execute_sql(
-                "SELECT id, file_path FROM recording WHERE started_at < ?", (cutoff,)
-            ).fetchall()
-            for rid, fp in rows:
-                try:
-                    if os.path.exists(fp):
-                        os.remove(fp)
-                    db.execute_sql("DELETE FROM recording WHERE id=?", (rid,))
-                    deleted += 1
-                except Exception:
-                    pass
-        except Exception:
-            logger.exception("Age retention failed")
 
-    if max_storage_gb > 0:
-        cap = max_storage_gb * 1024**3
-        total = total_mp4_bytes_under(recordings_dir)
-        if total > cap:
-            try:
-                rows = db.execute_sql(
-                    "SELECT id,file_path,file_size FROM recording ORDER BY started_at ASC"
-                ).fetchall()
-                freed = 0
-                for rid, fp, sz in rows:
-                    if freed >= total - cap:
-                        break
-                    try:
-                        if os.path.exists(fp):
-                            os.remove(fp)
-                        db.execute_sql("DELETE FROM recording WHERE id=?", (rid,))
-                        freed += sz or 0
-                        deleted += 1
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+def _purge_to_storage_cap(recordings_dir: str, max_storage_gb: float) -> int:
+    """Delete oldest segments until usage is under the cap, paging by (started_at, id)."""
+    from app.database import db
+
+    cap = max_storage_gb * 1024**3
+    total = segment_bytes_used(recordings_dir)
+    if total <= cap:
+        return 0
+    need = total - cap
+    freed = 0
+    deleted = 0
+    last_sa, last_id = "", -1
+    while freed < need:
+        rows = db.execute_sql(
+            "SELECT id, file_path, file_size, started_at FROM recording"
+            " WHERE started_at > ? OR (started_at = ? AND id > ?)"
+            " ORDER BY started_at ASC, id ASC LIMIT ?",
+            (last_sa, last_sa, last_id, DELETE_CHUNK_ROWS),
+        ).fetchall()
+        if not rows:
+            break
+        batch = []
+        for row in rows:
+            if freed >= need:
+                break
+            batch.append(row)
+            freed += row[2] or 0
+        last_id, last_sa = batch[-1][0], batch[-1][3]
+        deleted += _delete_rows("recording", batch)
+    return deleted
 
-    try:
-        rows = db.execute_sql("SELECT id,file_path FROM recording").fetchall()
-        orphans = [r[0] for r in rows if not os.path.exists(r[1])]
-        if orphans:
-            ph = ",".join("?" * len(orphans))
-            db.execute_sql("DELETE FROM recording WHERE id IN (%s)" % ph, orphans)
-            logger.info("Cleaned %d orphan records", len(orphans))
-    except Exception:
-        pass
 
+def _remove_empty_dirs(recordings_dir: str) -> int:
+    removed = 0
     try:
         for d in os.listdir(recordings_dir):
             p = os.path.join(recordings_dir, d)
             if os.path.isdir(p) and not os.listdir(p):
                 os.rmdir(p)
+                removed += 1
     except OSError:
         pass
-
-    if deleted:
-        logger.info("Retention: deleted %d segments", deleted)
-
-    if clip_retention_days > 0:
-        _purge_old_clips(clip_retention_days)
-
-    if events_only_buffer_hours > 0:
-        _purge_events_only_buffer(events_only_buffer_hours)
+    return removed
 
 
-def _purge_old_clips(clip_retention_days: int) -> None:
+def _purge_old_clips(clip_retention_days: int) -> int:
     """Delete motion/AI clip rows and files past clip_retention_days."""
     from app.database import db
 
-    cutoff = (datetime.now() - timedelta(days=clip_retention_days)).isoformat()
-    removed = 0
-    try:
-        rows = db.execute_sql(
-            "SELECT id, file_path FROM recording_event WHERE started_at < ?",
-            (cutoff,),
-        ).fetchall()
-        for rid, fp in rows:
-            try:
-                if fp and os.path.exists(fp):
-                    os.remove(fp)
-                db.execute_sql("DELETE FROM recording_event WHERE id=?", (rid,))
-                removed += 1
-            except Exception:
-                pass
-    except Exception:
-        logger.exception("Clip retention failed")
+    cutoff = (datetime.now() - timedelta(days=clip_retention_days)).isoformat(sep=" ")
+    rows = db.execute_sql(
+        "SELECT id, file_path FROM recording_event WHERE started_at < ?",
+        (cutoff,),
+    ).fetchall()
+    removed = _delete_rows("recording_event", rows)
     if removed:
         logger.info("Clip retention: deleted %d event clips", removed)
+    return removed
 
 
-def _purge_events_only_buffer(events_only_buffer_hours: int) -> None:
+def _purge_events_only_buffer(events_only_buffer_hours: int) -> int:
     from app.database import db
     from app.models import Camera
 
-    try:
-        names = [
-            c.name
-            for c in Camera.select(Camera.name).where(
-                (Camera.recording_policy == "events_only")
-                & (Camera.active == True)
-                & (Camera.recording_enabled == True)
-            )
-        ]
-    except Exception:
-        logger.exception("events_only buffer: camera query failed")
-        return
+    names = [
+        c.name
+        for c in Camera.select(Camera.name).where(
+            (Camera.recording_policy == "events_only")
+            & (Camera.active == True)
+            & (Camera.recording_enabled == True)
+        )
+    ]
     if not names:
-        return
+        return 0
 
-    cutoff = (datetime.now() - timedelta(hours=events_only_buffer_hours)).isoformat()
-    deleted = 0
-    try:
-        for cam_name in names:
-            rows = db.execute_sql(
-                "SELECT id, file_path FROM recording WHERE camera_name = ? AND started_at < ?",
-                (cam_name, cutoff),
-            ).fetchall()
-            for rid, fp in rows:
-                try:
-                    if fp and os.path.exists(fp):
-                        os.remove(fp)
-                    db.execute_sql("DELETE FROM recording WHERE id=?", (rid,))
-                    deleted += 1
-                except Exception:
-                    pass
-    except Exception:
-        logger.exception("events_only buffer purge failed")
+    cutoff = (datetime.now() - timedelta(hours=events_only_buffer_hours)).isoformat(sep=" ")
+    ph = ",".join("?" * len(names))
+    rows = db.execute_sql(
+        "SELECT id, file_path FROM recording WHERE camera_name IN (%s) AND started_at < ?" % ph,
+        (*names, cutoff),
+    ).fetchall()
+    deleted = _delete_rows("recording", rows)
     if deleted:
         logger.info("events_only buffer: removed %d old segments", deleted)
+    return deleted
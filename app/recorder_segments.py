@@ -13,6 +13,22 @@ from datetime import datetime, timedelta
 
 logger = logging.getLogger("opus.recorder.segments")
 
+# Rows per executemany transaction; keeps each write-lock hold short for other writers.
+INSERT_CHUNK_ROWS = 500
+
+_INSERT_SQL = (
+    "INSERT OR IGNORE INTO recording"
+    " (camera,camera_name,filename,file_path,file_size,"
+    "  started_at,ended_at,duration_seconds,status)"
+    " VALUES (?,?,?,?,?,?,?,?,?)"
+)
+# Fragmented segments are registered as 'writing' while open (recorder_live); closing
+# one completes that row instead of inserting a new one.
+_PROMOTE_SQL = (
+    "UPDATE recording SET file_size = ?, ended_at = ?, duration_seconds = ?, status = 'complete'"
+    " WHERE camera_name = ? AND filename = ? AND status = 'writing'"
+)
+
 
 def ensure_recording_table() -> bool:
     """Create legacy `recording` table + index if missing (SqliteQueueDatabase compatible)."""
@@ -37,10 +53,18 @@ def ensure_recording_table() -> bool:
             "CREATE INDEX IF NOT EXISTS idx_rec_cam_start "
             "ON recording (camera_name, started_at)"
         )
-        return True
     except Exception:
         logger.exception("Table creation failed")
         return False
+    try:
+        # Normally created (after de-duplication) by migration 014.
+        db.execute_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_recording_cam_file "
+            "ON recording (camera_name, filename)"
+        )
+    except Exception:
+        logger.warning("Unique (camera_name, filename) index missing — duplicate rows possible")
+    return True
 
 
 def parse_segment_filename_ts(fn: str):
@@ -74,38 +98,172 @@ def ffprobe_segment_duration(fp: str) -> float | None:
     return None
 
 
+def _segment_row(cam_id, cam_name: str, fn: str, fp: str, sz: int, sa: datetime, dur: float):
+    ea = sa + timedelta(seconds=int(dur))
+    return (
+        cam_id,
+        cam_name,
+        fn,
+        fp,
+        sz,
+        sa.isoformat(sep=" ") if sa else None,
+        ea.isoformat(sep=" ") if ea else None,
+        int(dur) if dur else None,
+        "complete",
+    )
+
+
+def insert_segment_rows(rows: list[tuple], fragmented: bool = False) -> int:
+    """
+    Batched INSERT OR IGNORE of _segment_row tuples, one transaction per INSERT_CHUNK_ROWS.
+    The unique (camera_name, filename) index rejects rows already registered.
+    fragmented: first complete the matching 'writing' rows of open fMP4 segments.
+    Returns the number of rows actually inserted or completed.
+    """
+    from app.database import executemany_chunked
+
+    promoted = 0
+    if fragmented:
+        promoted = executemany_chunked(
+            _PROMOTE_SQL, [(r[4], r[6], r[7], r[1], r[2]) for r in rows], chunk_size=INSERT_CHUNK_ROWS
+        )
+    return promoted + executemany_chunked(_INSERT_SQL, rows, chunk_size=INSERT_CHUNK_ROWS)
+
+
+def _indexed_duration(fp: str) -> float | None:
+    """Exact length of a fragmented segment from its keyframe sidecar or fragment index."""
+    from app.services.keyframe_index import fresh_sidecar
+    from app.services.mp4_index import Mp4Error, index_once
+
+    kfi = fresh_sidecar(fp)
+    try:
+        secs = kfi.seconds if kfi is not None else index_once(fp).seconds
+    except (OSError, Mp4Error):
+        return None
+    return secs if secs > 0 else None
+
+
+def _index_keyframes(fp: str):
+    """Write the segment's keyframe sidecar (app/services/keyframe_index.py)."""
+    from app.services.keyframe_index import update_sidecar
+    from app.services.mp4_index import Mp4Error
+
+    try:
+        update_sidecar(fp)
+    except (OSError, Mp4Error) as exc:
+        logger.debug("Keyframe index skipped for %s: %s", fp, exc)
+
+
+def register_segment_file(
+    recordings_dir: str,
+    cam_name: str,
+    fn: str,
+    *,
+    segment_minutes: int,
+    probe_segment_durations: bool,
+    fragmented: bool = False,
+    index_keyframes: bool = False,
+) -> bool:
+    """
+    Register one just-closed segment (watcher path). No directory listing: the next
+    segment usually does not exist yet, so duration comes from ffprobe or file mtime
+    (fragmented segments: from their fragment index, which is exact and cheap).
+    Returns True when a row was inserted or a 'writing' row completed.
+    """
+    from app.models import Camera
+
+    if not fn.endswith(".mp4"):
+        return False
+    sa = parse_segment_filename_ts(fn)
+    if sa is None:
+        return False
+    fp = os.path.join(recordings_dir, cam_name, fn)
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return False
+    if st.st_size < 10240:
+        return False
+
+    dur = _indexed_duration(fp) if fragmented else None
+    if dur is None and probe_segment_durations:
+        dur = ffprobe_segment_duration(fp)
+    if dur is None:
+        # FFmpeg closes the file at segment end, so mtime ≈ ended_at.
+        span = datetime.fromtimestamp(st.st_mtime) - sa
+        secs = span.total_seconds()
+        if 0 < secs <= segment_minutes * 60 * 2:
+            dur = float(secs)
+    if dur is None:
+        dur = float(segment_minutes * 60)
+
+    cam_obj = Camera.get_or_none(Camera.name == cam_name)
+    row = _segment_row(cam_obj.id if cam_obj else None, cam_name, fn, fp, st.st_size, sa, dur)
+    try:
+        added = insert_segment_rows([row], fragmented) > 0
+    except Exception as exc:
+        logger.debug("Insert skip %s: %s", fn, exc)
+        return False
+    if added and index_keyframes:
+        _index_keyframes(fp)
+    return added
+
+
+def newest_registered_filename(cam_name: str) -> str:
+    """Filename of the newest registered segment for cam_name ('' if none). Uses idx_rec_cam_start."""
+    from app.database import db
+
+    row = db.execute_sql(
+        "SELECT filename FROM recording WHERE camera_name = ? AND status != 'writing'"
+        " ORDER BY started_at DESC LIMIT 1",
+        (cam_name,),
+    ).fetchone()
+    return row[0] if row else ""
+
+
+def _registered_filenames(cam_name: str) -> set[str]:
+    from app.database import db
+
+    cur = db.execute_sql(
+        "SELECT filename FROM recording WHERE camera_name = ? AND status != 'writing'", (cam_name,)
+    )
+    return {r[0] for r in cur.fetchall()}
+
+
 def scan_register_new_segments(
     recordings_dir: str,
     writing_camera_names: set[str],
     *,
     segment_minutes: int,
     probe_segment_durations: bool,
+    cursors: dict[str, str] | None = None,
+    fragmented: bool = False,
+    index_keyframes: bool = False,
 ) -> int:
     """
     Walk recordings_dir camera folders; insert DB rows for completed MP4s not yet registered.
+    New rows are collected and written in batches (insert_segment_rows).
     Returns count of newly inserted rows.
+
+    cursors (incremental mode): per-camera newest registered filename, updated in place.
+    Segment names are strftime-ordered, so files at or below the cursor are skipped without
+    a stat; cameras missing from the dict are seeded with one indexed query. None = full
+    scan; each camera's registered names are loaded only to avoid stat() on known files —
+    duplicates are rejected by the unique index either way. 'writing' rows of open
+    fragmented segments are not registrations: they are completed once the file closes.
     """
-    from app.database import db
     from app.models import Camera
 
     if not os.path.exists(recordings_dir):
         return 0
 
-    known = set()
-    try:
-        cur = db.execute_sql("SELECT camera_name, filename FROM recording")
-        for r in cur.fetchall():
-            known.add((r[0], r[1]))
-    except Exception:
-        logger.exception("Cannot query recordings")
-        return 0
-
-    added = 0
     try:
         dirs = sorted(os.listdir(recordings_dir))
     except OSError:
         return 0
 
+    rows = []
+    cursor_updates = {}
     for cam_name in dirs:
         cam_dir = os.path.join(recordings_dir, cam_name)
         if not os.path.isdir(cam_dir):
@@ -116,14 +274,26 @@ def scan_register_new_segments(
             continue
         if not files:
             continue
-        parsed_ts = {fn: parse_segment_filename_ts(fn) for fn in files}
-
         newest = files[-1] if cam_name in writing_camera_names else None
-        cam_obj = Camera.get_or_none(Camera.name == cam_name)
-        cam_id = cam_obj.id if cam_obj else None
+        known = ()
+        try:
+            if cursors is None:
+                known = _registered_filenames(cam_name)
+            elif cam_name not in cursors:
+                cursors[cam_name] = newest_registered_filename(cam_name)
+        except Exception:
+            logger.exception("Cannot query recordings")
+            continue
+        if cursors is not None:
+            floor = cursors[cam_name]
+            files = [f for f in files if f > floor]
+            if not files or files == [newest]:
+                continue
+        parsed_ts = {fn: parse_segment_filename_ts(fn) for fn in files}
 
+        cam_obj = None
         for idx, fn in enumerate(files):
-            if (cam_name, fn) in known or fn == newest:
+            if fn in known or fn == newest:
                 continue
             fp = os.path.join(cam_dir, fn)
             try:
@@ -135,8 +305,8 @@ def scan_register_new_segments(
             sa = parsed_ts.get(fn)
             if sa is None:
                 continue
-            dur = None
-            if probe_segment_durations:
+            dur = _indexed_duration(fp) if fragmented else None
+            if dur is None and probe_segment_durations:
                 dur = ffprobe_segment_duration(fp)
             if dur is None and idx + 1 < len(files):
                 next_sa = parsed_ts.get(files[idx + 1])
@@ -144,29 +314,27 @@ def scan_register_new_segments(
                     dur = float((next_sa - sa).total_seconds())
             if dur is None:
                 dur = float(segment_minutes * 60)
-            ea = sa + timedelta(seconds=int(dur))
-            try:
-                db.execute_sql(
-                    "INSERT INTO recording"
-                    " (camera,camera_name,filename,file_path,file_size,"
-                    "  started_at,ended_at,duration_seconds,status)"
-                    " VALUES (?,?,?,?,?,?,?,?,?)",
-                    (
-                        cam_id,
-                        cam_name,
-                        fn,
-                        fp,
-                        sz,
-                        sa.isoformat() if sa else None,
-                        ea.isoformat() if ea else None,
-                        int(dur) if dur else None,
-                        "complete",
-                    ),
-                )
-                added += 1
-            except Exception as exc:
-                logger.debug("Insert skip %s: %s", fn, exc)
+            if cam_obj is None:
+                cam_obj = Camera.get_or_none(Camera.name == cam_name) or False
+            rows.append(_segment_row(cam_obj.id if cam_obj else None, cam_name, fn, fp, sz, sa, dur))
+            cursor_updates[cam_name] = fn
+
+    if not rows:
+        return 0
+    try:
+        added = insert_segment_rows(rows, fragmented)
+    except Exception:
+        logger.exception("Segment batch insert failed (%d rows)", len(rows))
+        return 0
+    if cursors is not None:
+        for cam_name, fn in cursor_updates.items():
+            if fn > cursors.get(cam_name, ""):
+                cursors[cam_name] = fn
 
     if added:
         logger.info("Scan: registered %d new segments", added)
+        if index_keyframes:
+            # A row the watcher registered meanwhile just has its sidecar re-stamped.
+            for row in rows:
+                _index_keyframes(row[3])
     return added
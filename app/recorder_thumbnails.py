@@ -0,0 +1,225 @@
+"""
+Timeline thumbnails for completed segments (RECORDING_THUMBNAILS).
+
+Every POLL_SECONDS the recorder picks up the segments each camera completed since its
+cursor (started_at; one query per camera on the (camera_name, started_at) index —
+cursors start THUMBNAIL_BACKFILL_HOURS back) and packs them into the camera-hour sprite
+sheets of app/services/thumbnails.py.
+
+Per segment the keyframe index (app/services/keyframe_index.py) names the first
+keyframe of every THUMBNAIL_INTERVAL_SECONDS slot. One FFmpeg run opens the segment once
+per pick, seeks straight to that keyframe (-ss, FFMPEG_HWACCEL) and writes one scaled raw
+BGR frame per pick to its own file, so only the picked keyframes are decoded and a pick
+the decoder cannot emit costs just its tile. Segments already listed in a sheet's
+manifest are skipped, so a restart re-reads the backfill window without decoding it
+again; a segment none of whose tiles decoded is retried on the next _DECODE_ATTEMPTS
+polls before the cursor moves past it.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import math
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.services import keyframe_index, thumbnails
+
+logger = logging.getLogger("opus.recorder.thumbnails")
+
+BACKFILL_HOURS = max(0, int(os.environ.get("THUMBNAIL_BACKFILL_HOURS", "24") or "0"))
+POLL_SECONDS = 30
+_BATCH_ROWS = 50
+_DECODE_ATTEMPTS = 3
+
+_SEGMENTS_SQL = (
+    "SELECT filename, file_path, started_at FROM recording"
+    " WHERE camera_name = ? AND started_at > ? AND status = 'complete'"
+    " ORDER BY started_at LIMIT ?"
+)
+
+
+def _parse_ts(val) -> datetime | None:
+    if isinstance(val, datetime):
+        return val
+    try:
+        return datetime.fromisoformat(str(val))
+    except ValueError:
+        return None
+
+
+def pick_keyframes(kfi, started_at: datetime) -> list[tuple[int, datetime, int]]:
+    """[(keyframe ordinal, sheet hour, slot)] — the first keyframe of every slot."""
+    picks = []
+    last = None
+    for n, t in enumerate(kfi.times):
+        at = started_at + timedelta(seconds=t)
+        hour = thumbnails.hour_of(at)
+        key = (hour, thumbnails.slot_of(hour, at))
+        if key != last:
+            picks.append((n, hour, key[1]))
+            last = key
+    return picks
+
+
+def thumbnail_frames_cmd(segment_path: str, seconds: list[float], out_paths: list[str]) -> list[str]:
+    """ffmpeg argv writing the frame at each keyframe time as one BGR rawvideo tile per out path."""
+    from app.ffmpeg_config import hwaccel_input_args
+
+    w, h = thumbnails.TILE_WIDTH, thumbnails.TILE_HEIGHT
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y"]
+    for t in seconds:
+        # Decode times, floored to the ms so the seek never lands just past the keyframe.
+        cmd += [*hwaccel_input_args(), "-ss", "%.3f" % (math.floor(t * 1000) / 1000), "-i", segment_path]
+    cmd += [
+        "-filter_complex",
+        ";".join(
+            "[%d:v:0]scale=%d:%d:force_original_aspect_ratio=decrease,pad=%d:%d:(ow-iw)/2:(oh-ih)/2[t%d]"
+            % (i, w, h, w, h, i)
+            for i in range(len(seconds))
+        ),
+    ]
+    for i, path in enumerate(out_paths):
+        cmd += ["-map", "[t%d]" % i, "-frames:v", "1", "-f", "rawvideo", "-pix_fmt", "bgr24", path]
+    return cmd
+
+
+def extract_tiles(segment_path: str, started_at: datetime) -> dict[datetime, dict] | None:
+    """{sheet hour: {slot: tile}} for one segment; None when no tile could be decoded."""
+    import numpy as np
+
+    kfi = keyframe_index.load(segment_path, cached=False)
+    if not kfi:
+        return None
+    picks = pick_keyframes(kfi, started_at)
+    w, h = thumbnails.TILE_WIDTH, thumbnails.TILE_HEIGHT
+    frame_bytes = w * h * 3
+    out: dict[datetime, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="opus-thumbs-") as tmp:
+        paths = [os.path.join(tmp, "%d.raw" % i) for i in range(len(picks))]
+        try:
+            r = subprocess.run(
+                thumbnail_frames_cmd(segment_path, [kfi.times[n] for n, _h, _s in picks], paths),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=60 + len(picks),
+            )
+        except (subprocess.TimeoutExpired, OSError) as exc:
+            logger.debug("Thumbnail decode of %s failed: %s", segment_path, exc)
+            return None
+        # Each pick has its own output, so the tiles that decoded are kept even when one did not.
+        for path, (_n, hour, slot) in zip(paths, picks):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if len(data) == frame_bytes:
+                out.setdefault(hour, {})[slot] = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+    if sum(map(len, out.values())) < len(picks):
+        logger.debug(
+            "Thumbnail decode of %s: rc=%s, %d of %d tiles: %s",
+            segment_path, r.returncode, sum(map(len, out.values())), len(picks),
+            r.stderr.decode("utf-8", "replace")[-200:],
+        )
+    return out or None
+
+
+class ThumbnailWorker:
+    """Per-camera started_at cursors + cache size bookkeeping; driven by the recorder."""
+
+    def __init__(self, recordings_dir: str):
+        self.recordings_dir = recordings_dir
+        self._cursors: dict[str, str] = {}  # camera -> started_at of the last segment looked at
+        self._attempts: dict[str, int] = {}  # segment path -> failed decodes so far
+        self._bytes: int | None = None
+        self._lock = threading.Lock()
+        self.segments_packed = 0
+        self.segments_failed = 0
+        self.sheets_evicted = 0
+        self.last_run_unix = None
+
+    def tick(self, running=lambda: True) -> int:
+        """Pack every newly completed segment. Returns segments packed."""
+        from app.database import db
+        from app.models import Camera
+
+        if self._bytes is None:
+            self._evict()
+        start = (datetime.now() - timedelta(hours=BACKFILL_HOURS)).isoformat(sep=" ")
+        packed = 0
+        for (cam_name,) in Camera.select(Camera.name).tuples():
+            while running():
+                rows = db.execute_sql(
+                    _SEGMENTS_SQL, (cam_name, self._cursors.get(cam_name, start), _BATCH_ROWS)
+                ).fetchall()
+                retry = False
+                for fn, fp, sa in rows:
+                    started = _parse_ts(sa)
+                    result = self._pack(cam_name, fn, fp, started) if started is not None else "skipped"
+                    if result == "retry":
+                        retry = True  # the cursor stays before it; picked up again next poll
+                        break
+                    if result == "packed":
+                        packed += 1
+                    self._cursors[cam_name] = str(sa)
+                if retry or len(rows) < _BATCH_ROWS:
+                    break
+        self.last_run_unix = time.time()
+        return packed
+
+    def _pack(self, cam_name: str, fn: str, fp: str, started_at: datetime) -> str:
+        """"packed", "skipped" (already packed, or given up on) or "retry" (decode failed)."""
+        # A segment running into the next hour is listed in both sheets, its first one first.
+        if fn in thumbnails.packed_segments(self.recordings_dir, cam_name, thumbnails.hour_of(started_at)):
+            return "skipped"
+        tiles = extract_tiles(fp, started_at)
+        if tiles is None:
+            attempts = self._attempts.pop(fp, 0) + 1
+            if attempts < _DECODE_ATTEMPTS and os.path.exists(fp):
+                self._attempts[fp] = attempts
+                return "retry"
+            self.segments_failed += 1
+            return "skipped"
+        self._attempts.pop(fp, None)
+        grown = 0
+        try:
+            for hour, hour_tiles in sorted(tiles.items()):
+                grown += thumbnails.add_tiles(self.recordings_dir, cam_name, hour, hour_tiles, fn)
+        except OSError as exc:
+            self.segments_failed += 1
+            logger.warning("Thumbnail sheet for %s/%s not written: %s", cam_name, fn, exc)
+            return "skipped"
+        self.segments_packed += 1
+        with self._lock:
+            self._bytes = (self._bytes or 0) + grown
+            over = thumbnails.MAX_BYTES > 0 and self._bytes > thumbnails.MAX_BYTES
+        if over:
+            self._evict()
+        return "packed"
+
+    def _evict(self):
+        total, removed = thumbnails.evict(self.recordings_dir)
+        with self._lock:
+            self._bytes = total
+            self.sheets_evicted += removed
+        if removed:
+            logger.info("Thumbnails: evicted %d sheets (cache now %.1f MB)", removed, total / 1024**2)
+
+    def status(self) -> dict:
+        with self._lock:
+            cache = self._bytes
+        return {
+            **thumbnails.geometry(),
+            "cache_mb": round(cache / 1024**2, 1) if cache is not None else None,
+            "max_mb": round(thumbnails.MAX_BYTES / 1024**2) or None,
+            "segments_packed": self.segments_packed,
+            "segments_failed": self.segments_failed,
+            "sheets_evicted": self.sheets_evicted,
+            "last_run_unix": self.last_run_unix,
+        }
@@ -0,0 +1,211 @@
+"""
+inotify watcher: register a segment the moment FFmpeg closes it.
+
+Watches RECORDINGS_DIR (new camera folders) and each RECORDINGS_DIR/<cam>/ for
+IN_CLOSE_WRITE / IN_MOVED_TO on *.mp4 (plus IN_CREATE when the caller wants to know
+about segments as FFmpeg opens them — fragmented recording). The periodic directory scan in
+recorder_segments stays as a low-frequency reconciliation fallback (startup,
+queue overflow, folders created before their watch was added).
+
+Linux only, via libc through ctypes — no extra dependency. On other platforms
+SegmentWatcher.start() returns False and the recorder keeps polling.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+from typing import Callable
+
+logger = logging.getLogger("opus.recorder.watch")
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+_CAMERA_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+
+# Subfolders of RECORDINGS_DIR that never hold recorder segments.
+_SKIP_DIRS = frozenset({"clips"})
+
+
+def _load_libc():
+    name = ctypes.util.find_library("c")
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+    return libc
+
+
+class SegmentWatcher:
+    """
+    Background thread that calls on_segment(cam_name, filename) for every closed MP4,
+    on_open(cam_name, filename) for every new one (optional) and on_overflow() when
+    the kernel dropped events (caller should run a full scan).
+    """
+
+    def __init__(
+        self,
+        recordings_dir: str,
+        on_segment: Callable[[str, str], None],
+        on_overflow: Callable[[], None] | None = None,
+        on_open: Callable[[str, str], None] | None = None,
+    ):
+        self.recordings_dir = recordings_dir
+        self._on_segment = on_segment
+        self._on_overflow = on_overflow
+        self._on_open = on_open
+        self._camera_mask = _CAMERA_MASK | (IN_CREATE if on_open else 0)
+        self._libc = None
+        self._fd = -1
+        self._root_wd = -1
+        self._wd_to_cam: dict[int, str] = {}
+        self._running = False
+        self._thread = None
+        self.events_handled = 0
+
+    @property
+    def active(self) -> bool:
+        return self._running and self._fd >= 0
+
+    def start(self) -> bool:
+        """Open inotify and start the reader thread. False when unavailable (caller keeps polling)."""
+        if self._running:
+            return True
+        libc = _load_libc()
+        if libc is None:
+            logger.info("inotify unavailable — segment registration stays scan-only")
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning("inotify_init1 failed: %s", os.strerror(ctypes.get_errno()))
+            return False
+        self._libc = libc
+        self._fd = fd
+        os.makedirs(self.recordings_dir, exist_ok=True)
+        self._root_wd = self._add_watch(self.recordings_dir, _ROOT_MASK)
+        if self._root_wd < 0:
+            self._close()
+            return False
+        try:
+            for name in os.listdir(self.recordings_dir):
+                self._watch_camera_dir(name)
+        except OSError:
+            pass
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="recorder-watch")
+        self._thread.start()
+        logger.info("Segment watcher started (%d camera folders)", len(self._wd_to_cam))
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._close()
+
+    def _close(self):
+        if self._fd >= 0:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        self._fd = -1
+        self._root_wd = -1
+        self._wd_to_cam.clear()
+
+    def _add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning(
+                    "inotify watch limit reached at %s — raise fs.inotify.max_user_watches", path
+                )
+            elif err not in (errno.ENOENT, errno.ENOTDIR):
+                logger.warning("inotify_add_watch %s failed: %s", path, os.strerror(err))
+        return wd
+
+    def _watch_camera_dir(self, name: str):
+        if name in _SKIP_DIRS or name.startswith("."):
+            return
+        path = os.path.join(self.recordings_dir, name)
+        if not os.path.isdir(path):
+            return
+        wd = self._add_watch(path, self._camera_mask)
+        if wd >= 0:
+            self._wd_to_cam[wd] = name
+
+    def _loop(self):
+        while self._running:
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+            except (OSError, ValueError):
+                break
+            if not ready:
+                continue
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                logger.exception("inotify read failed")
+                break
+            self._dispatch(buf)
+        self._running = False
+
+    def _dispatch(self, buf: bytes):
+        off = 0
+        while off + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, ln = _EVENT_HEADER.unpack_from(buf, off)
+            off += _EVENT_HEADER.size
+            name = buf[off : off + ln].rstrip(b"\0").decode(errors="replace")
+            off += ln
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflow — requesting full segment scan")
+                if self._on_overflow:
+                    self._on_overflow()
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                self._wd_to_cam.pop(wd, None)
+                continue
+            if wd == self._root_wd:
+                if mask & IN_ISDIR and name:
+                    self._watch_camera_dir(name)
+                continue
+
+            cam = self._wd_to_cam.get(wd)
+            if not cam or not name.endswith(".mp4") or mask & IN_ISDIR:
+                continue
+            try:
+                if mask & IN_CREATE:
+                    self._on_open(cam, name)
+                    continue
+                self._on_segment(cam, name)
+                self.events_handled += 1
+            except Exception:
+                logger.exception("segment callback failed: %s/%s", cam, name)
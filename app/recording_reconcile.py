@@ -1,43 +1,126 @@
-"""Remove DB rows for recordings/events whose files are gone (e.g. volume wiped)."""
+"""
+Remove DB rows for recordings/events whose files are gone (e.g. volume wiped), and
+keyframe index sidecars left behind by segments deleted outside retention.
+"""
 
 from __future__ import annotations
 
 import logging
 import os
 
+from app.config import get_recordings_dir
+
 logger = logging.getLogger("opus.recording_reconcile")
 
+_TABLES = ("recording", "recording_event")
 
-def reconcile_storage_with_db():
+
+def _orphan_ids(table: str) -> list[int]:
+    """
+    Ids in *table* whose file_path is missing. One listdir per folder, diffed against the
+    DB's filenames for that camera — instead of one stat per row.
+    """
+    from app.database import db
+
+    names = [r[0] for r in db.execute_sql("SELECT DISTINCT camera_name FROM %s" % table).fetchall()]
+    listings: dict[str, set[str] | None] = {}
+    orphans = []
+    for cam_name in names:
+        rows = db.execute_sql(
+            "SELECT id, file_path FROM %s WHERE camera_name = ?" % table, (cam_name,)
+        ).fetchall()
+        for rid, fp in rows:
+            if not fp:
+                orphans.append(rid)
+                continue
+            folder, fn = os.path.split(fp)
+            if folder not in listings:
+                try:
+                    listings[folder] = set(os.listdir(folder))
+                except FileNotFoundError:
+                    listings[folder] = set()
+                except OSError as exc:
+                    # Unreadable (not missing) — leave its rows alone.
+                    logger.warning("Orphan sweep: cannot list %s: %s", folder, exc)
+                    listings[folder] = None
+            present = listings[folder]
+            if present is not None and fn not in present:
+                orphans.append(rid)
+    return orphans
+
+
+def sweep_orphan_rows():
     """
-    Delete Recording and RecordingEvent rows when file_path is missing on disk.
+    Bulk-delete Recording and RecordingEvent rows whose files are missing.
     Returns (removed_segments, removed_events).
     """
-    from app.models import Recording, RecordingEvent
+    from app.database import delete_ids_chunked
+
+    removed = []
+    for table in _TABLES:
+        try:
+            ids = _orphan_ids(table)
+            removed.append(delete_ids_chunked(table, ids) if ids else 0)
+        except Exception:
+            logger.exception("Orphan sweep failed for %s", table)
+            removed.append(0)
+    removed_r, removed_e = removed
+    if removed_r or removed_e:
+        logger.info(
+            "Orphan sweep: removed %d segment row(s), %d event row(s) (missing files)",
+            removed_r,
+            removed_e,
+        )
+    return removed_r, removed_e
 
-    removed_r = 0
-    removed_e = 0
 
-    for rec in Recording.select():
-        fp = rec.file_path
-        if not fp or not os.path.isfile(fp):
-            try:
-                rec.delete_instance()
-                removed_r += 1
-            except Exception:
-                pass
+def sweep_orphan_sidecars(recordings_dir: str) -> int:
+    """
+    Remove keyframe index sidecars (<segment>.mp4.kfi) whose segment is gone — deleted
+    outside retention, which removes both. One listdir per camera folder.
+    """
+    from app.services.keyframe_index import SUFFIX
 
+    removed = 0
     try:
-        for ev in RecordingEvent.select():
-            fp = ev.file_path
-            if not fp or not os.path.isfile(fp):
+        cams = os.listdir(recordings_dir)
+    except OSError:
+        return 0
+    for cam_name in cams:
+        if cam_name == "clips" or cam_name.startswith("."):
+            continue
+        folder = os.path.join(recordings_dir, cam_name)
+        try:
+            present = set(os.listdir(folder))
+        except OSError:
+            continue
+        for fn in present:
+            if fn.endswith(SUFFIX) and fn[: -len(SUFFIX)] not in present:
                 try:
-                    ev.delete_instance()
-                    removed_e += 1
-                except Exception:
+                    os.remove(os.path.join(folder, fn))
+                    removed += 1
+                except OSError:
                     pass
+    if removed:
+        logger.info("Orphan sweep: removed %d keyframe index sidecar(s) (missing segments)", removed)
+    return removed
+
+
+def reconcile_storage_with_db():
+    """
+    Delete Recording and RecordingEvent rows when file_path is missing on disk and
+    keyframe sidecars whose segment is gone, then rebuild the storage ledger from the surviving rows.
+    Returns (removed_segments, removed_events).
+    """
+    removed_r, removed_e = sweep_orphan_rows()
+    sweep_orphan_sidecars(get_recordings_dir())
+
+    try:
+        from app.services.storage_ledger import rebuild_ledger
+
+        rebuild_ledger()
     except Exception:
-        pass
+        logger.exception("Storage ledger rebuild failed")
 
     if removed_r or removed_e:
         logger.info(
@@ -1,10 +1,11 @@
+import json
 import re
 import time
 import requests as http
 from flask import Blueprint, request, current_app
 from flask_login import current_user
 
-from app.models import Camera, NVR
+from app.models import Camera, CameraMotionZone, NVR
 from app.services.camera_stream_health import (
     camera_online_from_health_map,
     fetch_stream_online_map,
@@ -444,10 +445,87 @@ def delete_camera(cam_id):
         if not Camera.select().where(Camera.name == sub_name).exists():
             stream_delete(sub_name)
     name = cam.display_name
+    CameraMotionZone.delete().where(CameraMotionZone.camera_id == cam.id).execute()
     cam.delete_instance()
     return api_response(message=f'Camera "{name}" deleted.')
 
 
+# ── Motion masks / zones ──────────────────────────────────────────────────────
+
+MOTION_ZONE_KINDS = frozenset({"mask", "zone"})
+
+
+def _motion_zone_to_dict(z):
+    try:
+        points = json.loads(z.points)
+    except ValueError:
+        points = []
+    return {"id": z.id, "name": z.name, "kind": z.kind, "points": points, "enabled": bool(z.enabled)}
+
+
+@bp.route("/<int:cam_id>/motion-zones", methods=["GET"])
+@require_admin
+def list_motion_zones(cam_id):
+    if not Camera.select().where(Camera.id == cam_id).exists():
+        return api_error("Camera not found.", 404)
+    rows = CameraMotionZone.select().where(CameraMotionZone.camera_id == cam_id).order_by(CameraMotionZone.id)
+    return api_response([_motion_zone_to_dict(z) for z in rows])
+
+
+@bp.route("/<int:cam_id>/motion-zones", methods=["PUT"])
+@require_admin
+def replace_motion_zones(cam_id):
+    """
+    Replace the camera's masks and zones. Body: {"zones": [{"kind": "mask"|"zone",
+    "name": "...", "points": [[x, y], ...], "enabled": true}, ...]}, points in 0..1.
+    """
+    from app.processing.motion_masks import parse_points
+
+    if not Camera.select().where(Camera.id == cam_id).exists():
+        return api_error("Camera not found.", 404)
+    data = request.get_json(silent=True) or {}
+    items = data.get("zones")
+    if not isinstance(items, list):
+        return api_error('"zones" must be a list.')
+
+    rows, seen = [], set()
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return api_error(f"zones[{i}] must be an object.")
+        kind = item.get("kind") or "mask"
+        kind = kind.strip().lower() if isinstance(kind, str) else None
+        if kind not in MOTION_ZONE_KINDS:
+            return api_error(f'zones[{i}].kind must be "mask" or "zone".')
+        name = item.get("name") or ""
+        if not isinstance(name, str):
+            return api_error(f"zones[{i}].name must be a string.")
+        name = name.strip()[:50]
+        if kind == "zone":
+            if not name:
+                return api_error(f"zones[{i}]: zones need a name.")
+            if name in seen:
+                return api_error(f'Duplicate zone name "{name}".')
+            seen.add(name)
+        points = parse_points(item.get("points"))
+        if points is None:
+            return api_error(f"zones[{i}].points must be 3+ [x, y] pairs between 0 and 1.")
+        rows.append(
+            {
+                "camera_id": cam_id,
+                "name": name,
+                "kind": kind,
+                "points": json.dumps([[round(x, 4), round(y, 4)] for x, y in points]),
+                "enabled": bool(item.get("enabled", True)),
+            }
+        )
+
+    CameraMotionZone.delete().where(CameraMotionZone.camera_id == cam_id).execute()
+    if rows:
+        CameraMotionZone.insert_many(rows).execute()
+    out = CameraMotionZone.select().where(CameraMotionZone.camera_id == cam_id).order_by(CameraMotionZone.id)
+    return api_response([_motion_zone_to_dict(z) for z in out], message="Motion zones saved.")
+
+
 # ── Runtime endpoints ─────────────────────────────────────────────────────────
 
 @bp.route("/summary", methods=["GET"])
@@ -31,10 +31,18 @@ def nvr_to_dict(nvr, cam_count=None, admin=False):
             "ip_address":   nvr.ip_address,
             # Never expose username or password to any user
             "max_channels": nvr.max_channels,
+            "max_sessions": nvr.max_sessions,
         })
     return base
 
 
+def _parse_max_sessions(raw):
+    """Blank/None = use NVR_MAX_SESSIONS; 0 = unlimited."""
+    if raw is None or str(raw).strip() == "":
+        return None
+    return max(0, min(int(raw), 1024))
+
+
 # ── go2rtc + import helpers ───────────────────────────────────────────────────
 
 def stream_add(name, rtsp_url):
@@ -158,6 +166,7 @@ def create_nvr():
         username=data.get("username") or None,
         password=data.get("password") or None,
         max_channels=max_ch,
+        max_sessions=_parse_max_sessions(data.get("max_sessions")),
     )
     created, skipped, unreachable = import_cameras(nvr)
     cam_total = Camera.select().where(Camera.nvr == nvr.id).count()
@@ -197,6 +206,8 @@ def update_nvr(nvr_id):
         nvr.password = data["password"]
     if "max_channels" in data:
         nvr.max_channels = max(1, min(int(data["max_channels"]), 256))
+    if "max_sessions" in data:
+        nvr.max_sessions = _parse_max_sessions(data["max_sessions"])
     if "active" in data:
         nvr.active = bool(data["active"])
 
@@ -3,20 +3,27 @@ Playback API — timeline segments + unified HLS entrypoint for live and recorde
 
 Assumptions:
 - Recording rows use the same paths the recorder wrote (typically /recordings/... inside Docker).
-- go2rtc shares the recordings volume so ffmpeg: file sources resolve for VOD.
+- Recorded playback is native fMP4 HLS served by Opus from the segment files
+  (app/services/vod_hls.py): one indexed query for the rows, no go2rtc stream or
+  FFmpeg process per viewer.
 - Live HLS uses the camera's *-main go2rtc stream key (same source as segment recording).
 """
 
 from __future__ import annotations
 
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from urllib.parse import urlencode
 
-import requests
-from flask import Blueprint, redirect, request, current_app
+from flask import Blueprint, Response, redirect, request, current_app
 from flask_login import current_user
 from app.models import Camera, Recording
+from app.services import keyframe_index, vod_hls
+from app.services import mp4_index
+from app.services.mp4_index import Mp4Error, track_index
 from app.routes.api.utils import (
     api_error,
     api_response,
@@ -24,10 +31,14 @@ from app.routes.api.utils import (
     recordings_view_allowed,
     to_iso,
     accessible_camera_names,
+    parse_iso_local,
 )
 
 bp = Blueprint("api_playback", __name__, url_prefix="/api")
 
+# 'writing' = open fragmented segment the recorder is live-indexing (recorder_live).
+_PLAYABLE = ("complete", "writing")
+
 _GO2RTC_STREAM_NAME_RE = re.compile(r"^[A-Za-z0-9_.:-]+$")
 
 
@@ -60,70 +71,140 @@ def _user_can_access_camera(cam: Camera) -> bool:
     return cam.name in allowed
 
 
-def _go2rtc_register_file_stream(stream_name: str, file_path: str) -> tuple[bool, str | None]:
-    """Register a short-lived ffmpeg file source in go2rtc for HLS output."""
-    base = (current_app.config.get("GO2RTC_URL") or "").rstrip("/")
-    if not base:
-        return False, "GO2RTC_URL is not configured."
-    # go2rtc ffmpeg template: local file + input=file avoids treating URL as live stream.
-    src = f"ffmpeg:{file_path}#video=copy#input=file"
-    url = f"{base}/api/streams"
-    try:
-        r = requests.put(url, params={"name": stream_name, "src": src}, timeout=12)
-        if r.ok:
-            return True, None
-        if r.status_code == 400:
-            rp = requests.patch(url, params={"name": stream_name, "src": src}, timeout=12)
-            if rp.ok:
-                return True, None
-            return False, (rp.text or rp.reason or "go2rtc PATCH error")[:500]
-        if r.status_code >= 400:
-            return False, (r.text or r.reason or "go2rtc error")[:500]
-        return True, None
-    except requests.RequestException as exc:
-        current_app.logger.warning("go2rtc register stream failed: %s", exc)
-        return False, str(exc)
-
-
-def _pick_recording_for_time(camera_name: str, at: datetime) -> Recording | None:
+def _seek_segment(camera_name: str, at: datetime) -> tuple[Recording | None, bool]:
     """
-    Prefer a segment whose [started_at, ended_at) contains *at* (ended_at may be null).
-    If none match, use the latest segment that started at or before *at*, else the earliest after.
+    (segment, in_gap) for wall-clock *at*: the segment covering it, else the next one
+    to start (in_gap), else the last one before it (in_gap). Each probe is a single
+    seek on the (camera_name, started_at) index — no scan of the camera's history.
     """
     q_base = (
         Recording.select()
         .where(
             (Recording.camera_name == camera_name)
-            & (Recording.status == "complete")
-        )
-    )
-    inside = (
-        q_base.where(
-            (Recording.started_at <= at)
-            & (
-                Recording.ended_at.is_null(True)
-                | (Recording.ended_at > at)
-            )
+            & (Recording.status.in_(_PLAYABLE))
         )
-        .order_by(Recording.started_at.desc())
     )
-    hit = inside.first()
-    if hit:
-        return hit
-
     before = (
         q_base.where(Recording.started_at <= at)
         .order_by(Recording.started_at.desc())
         .first()
     )
-    if before:
-        return before
+    if before and (before.ended_at is None or before.ended_at > at):
+        return before, False
 
-    return (
+    after = (
         q_base.where(Recording.started_at > at)
         .order_by(Recording.started_at.asc())
         .first()
     )
+    if after:
+        return after, True
+    return before, before is not None
+
+
+def _segments_in_range(camera_name: str, start_dt: datetime, end_dt: datetime, limit: int):
+    """Playable segments overlapping [start_dt, end_dt), oldest first (camera_name, started_at index)."""
+    return (
+        Recording.select()
+        .where(
+            (Recording.camera_name == camera_name)
+            & (Recording.status.in_(_PLAYABLE))
+            & (Recording.started_at < end_dt)
+            & (
+                Recording.ended_at.is_null(True)
+                | (Recording.ended_at > start_dt)
+            )
+        )
+        .order_by(Recording.started_at.asc())
+        .limit(limit)
+    )
+
+
+_RANGE_LIMIT = 2000
+# A range playlist stops once its segment indexes fill this share of the mp4_index
+# cache, so the fragment requests that follow (and reloads) find them still cached.
+_RANGE_CACHE_SHARE = 0.5
+_LAYOUT_TTL_SECONDS = 30.0
+_LAYOUT_CACHE_ENTRIES = 32
+_layouts: OrderedDict[tuple, tuple[float, list]] = OrderedDict()
+_layouts_lock = threading.Lock()
+
+
+def _playlist_entries(recs: list[Recording], budget: int | None = None, used: int = 0) -> list:
+    """vod_hls.layout() entries for recs, cut short once their indexes (plus used) pass budget bytes."""
+    entries = []
+    for rec in recs:
+        fp = (rec.file_path or "").strip()
+        if not fp.endswith(".mp4"):
+            continue
+        try:
+            idx = track_index(fp)
+        except (OSError, Mp4Error) as exc:
+            # Deleted by retention or unreadable: leave it out (a gap in the playlist).
+            current_app.logger.warning("VOD: skipping %s: %s", fp, exc)
+            continue
+        used += idx.nbytes
+        if budget is not None and entries and used > budget:
+            current_app.logger.info(
+                "VOD: range for %s ends at %s (segment indexes over %d MB; MP4_INDEX_CACHE_MB)",
+                rec.camera_name, rec.started_at, budget // (1024 * 1024),
+            )
+            break
+        entries.append((rec.id, rec.started_at, idx, rec.status == "writing"))
+    return entries
+
+
+def _playlist_items(recs: list[Recording]) -> list:
+    return vod_hls.layout(_playlist_entries(recs))
+
+
+def _range_layout(camera_name: str, start_dt: datetime, end_dt: datetime) -> list:
+    """
+    vod_hls.layout() for the segments in [start_dt, end_dt), kept briefly so the seek
+    API and a player reloading the same range share one pass over the rows. A range
+    ending in a segment still being written (EVENT playlist) keeps its closed segments
+    and only re-reads the live one and any newer rows on reload.
+    """
+    key = (camera_name, start_dt, end_dt)
+    now = time.monotonic()
+    with _layouts_lock:
+        hit = _layouts.get(key)
+        if hit is not None and now - hit[0] >= _LAYOUT_TTL_SECONDS:
+            hit = None
+        if hit is not None:
+            _layouts.move_to_end(key)
+    budget = int(mp4_index.CACHE_MAX_BYTES * _RANGE_CACHE_SHARE)
+    if hit is None:
+        built = now
+        entries = _playlist_entries(list(_segments_in_range(camera_name, start_dt, end_dt, _RANGE_LIMIT)), budget)
+    elif not (hit[1] and hit[1][-1].live):
+        return hit[1]
+    else:
+        built = hit[0]
+        closed = hit[1][:-1]
+        entries = [(it.rec_id, it.started_at, it.idx, False) for it in closed]
+        used = sum(it.idx.nbytes for it in closed)
+        known = {it.rec_id for it in closed}
+        newer = _segments_in_range(camera_name, hit[1][-1].started_at, end_dt, _RANGE_LIMIT - len(closed))
+        entries += _playlist_entries([r for r in newer if r.id not in known], budget, used)
+    items = vod_hls.layout(entries)
+    with _layouts_lock:
+        _layouts[key] = (built, items)
+        while len(_layouts) > _LAYOUT_CACHE_ENTRIES:
+            _layouts.popitem(last=False)
+    return items
+
+
+def _parse_range(start_s: str, end_s: str):
+    """(start, end) naive local datetimes or an api_error response."""
+    try:
+        start_dt = parse_iso_local(start_s)
+        end_dt = parse_iso_local(end_s)
+    except ValueError:
+        return None, api_error("Invalid start or end datetime. Use ISO 8601.", 400)
+    if end_dt <= start_dt:
+        return None, api_error("end must be after start.", 400)
+    return (start_dt, end_dt), None
 
 
 @bp.route("/segments", methods=["GET"])
@@ -141,14 +222,10 @@ def list_segments():
     if not cam_id or not start_s or not end_s:
         return api_error("camera_id, start, and end query parameters are required.", 400)
 
-    try:
-        start_dt = datetime.fromisoformat(start_s.replace("Z", "+00:00"))
-        end_dt = datetime.fromisoformat(end_s.replace("Z", "+00:00"))
-    except ValueError:
-        return api_error("Invalid start or end datetime. Use ISO 8601.", 400)
-
-    if end_dt <= start_dt:
-        return api_error("end must be after start.", 400)
+    rng, err = _parse_range(start_s, end_s)
+    if err:
+        return err
+    start_dt, end_dt = rng
 
     try:
         cam = Camera.get_by_id(cam_id)
@@ -162,25 +239,10 @@ def list_segments():
     if main_cam is None:
         return api_response({"segments": [], "camera_id": cam_id, "stream_camera_id": None})
 
-    limit = min(request.args.get("limit", default=2000, type=int) or 2000, 5000)
-
-    q = (
-        Recording.select()
-        .where(
-            (Recording.camera_name == main_cam.name)
-            & (Recording.status == "complete")
-            & (Recording.started_at < end_dt)
-            & (
-                Recording.ended_at.is_null(True)
-                | (Recording.ended_at > start_dt)
-            )
-        )
-        .order_by(Recording.started_at.asc())
-        .limit(limit)
-    )
+    limit = min(request.args.get("limit", default=_RANGE_LIMIT, type=int) or _RANGE_LIMIT, 5000)
 
     rows = []
-    for rec in q:
+    for rec in _segments_in_range(main_cam.name, start_dt, end_dt, limit):
         rows.append(
             {
                 "id": rec.id,
@@ -191,6 +253,7 @@ def list_segments():
                 "file_path": rec.file_path,
                 "filename": rec.filename,
                 "duration_seconds": rec.duration_seconds,
+                "status": rec.status,
             }
         )
 
@@ -203,6 +266,105 @@ def list_segments():
     )
 
 
+@bp.route("/seek", methods=["GET"])
+@require_auth
+@recordings_view_allowed
+def seek():
+    """
+    Map a wall-clock instant to a recorded segment and offset.
+
+    Query: camera_id (int), at (ISO 8601). Optional start, end (ISO 8601): the range of a
+    start/end playlist from /api/stream/<id>/index.m3u8 — the answer then also carries
+    stream_offset_seconds, the player position for *at* in that playlist.
+    When *at* falls in a recording gap the next segment is returned with in_gap=true.
+    """
+    cam_id = request.args.get("camera_id", type=int)
+    at_s = request.args.get("at")
+    if not cam_id or not at_s:
+        return api_error("camera_id and at query parameters are required.", 400)
+    try:
+        at_dt = parse_iso_local(at_s)
+    except ValueError:
+        return api_error("Invalid at datetime. Use ISO 8601.", 400)
+
+    try:
+        cam = Camera.get_by_id(cam_id)
+    except Camera.DoesNotExist:
+        return api_error("Camera not found.", 404)
+    if not _user_can_access_camera(cam):
+        return api_error("Forbidden.", 403)
+    main_cam = _main_camera_for_segments(cam)
+    if main_cam is None:
+        return api_error("Playback is only available for cameras with a paired main stream.", 400)
+
+    rec, in_gap = _seek_segment(main_cam.name, at_dt)
+    if rec is None:
+        return api_error("No recording segment found for the requested time.", 404)
+    offset = 0.0
+    if not in_gap and rec.started_at is not None:
+        offset = max(0.0, (at_dt - rec.started_at).total_seconds())
+    keyframe_offset = None
+    kfi = keyframe_index.load((rec.file_path or "").strip())
+    k = kfi.at_or_before(offset) if kfi is not None else None
+    if k is not None:
+        keyframe_offset = kfi.times[k]
+
+    stream_offset = None
+    start_s = request.args.get("start")
+    end_s = request.args.get("end")
+    if start_s and end_s:
+        rng, err = _parse_range(start_s, end_s)
+        if err:
+            return err
+        items = _range_layout(main_cam.name, rng[0], rng[1])
+        stream_offset = vod_hls.locate(items, rec.id, offset)
+
+    return api_response(
+        {
+            "camera_id": cam_id,
+            "stream_camera_id": main_cam.id,
+            "recording_id": rec.id,
+            "start_time": to_iso(rec.started_at),
+            "end_time": to_iso(rec.ended_at),
+            "offset_seconds": round(offset, 3),
+            # Nearest keyframe at or before offset: where a stream-copy cut or a
+            # decoder seek actually lands.
+            "keyframe_offset_seconds": None if keyframe_offset is None else round(keyframe_offset, 3),
+            "in_gap": in_gap,
+            "stream_offset_seconds": None if stream_offset is None else round(stream_offset, 3),
+        }
+    )
+
+
+@bp.route("/segments/<int:recording_id>/keyframes", methods=["GET"])
+@require_auth
+@recordings_view_allowed
+def segment_keyframes(recording_id: int):
+    """
+    Keyframe index of one segment (app/services/keyframe_index.py): parallel arrays of
+    keyframe times (seconds from the segment start), byte offsets and sizes. Clients
+    seek to times[i] / fetch bytes [offsets[i], offsets[i] + sizes[i]) without probing.
+    """
+    found, err = _segment_recording(recording_id)
+    if err:
+        return err
+    rec, fp = found
+    kfi = keyframe_index.load(fp)
+    if kfi is None:
+        return api_error("Recording file not found or unreadable.", 404)
+    return api_response(
+        {
+            "recording_id": rec.id,
+            "start_time": to_iso(rec.started_at),
+            "duration_seconds": round(kfi.seconds, 3),
+            "writing": rec.status == "writing",
+            "times": [round(t, 3) for t in kfi.times],
+            "offsets": kfi.offsets,
+            "sizes": kfi.sizes,
+        }
+    )
+
+
 @bp.route("/stream/<int:camera_id>/index.m3u8", methods=["GET"])
 @require_auth
 @recordings_view_allowed
@@ -211,13 +373,19 @@ def stream_index(camera_id: int):
     Unified HLS entrypoint.
 
     - Default: redirect to go2rtc live HLS for the recording (main) stream.
-    - recording_id=<id>: register a go2rtc ffmpeg file source for that DB row, then redirect.
-    - at=<ISO>: resolve the segment row covering that instant (same as recording_id path).
-
-    The browser follows the redirect; segment URLs inside the playlist stay on /go2rtc/...
+    - recording_id=<id>: VOD playlist for that DB row.
+    - at=<ISO>: VOD playlist for the segment row covering that instant (or the next one).
+    - start=<ISO>&end=<ISO>: one continuous VOD playlist across every segment in the range
+      (up to 2000, and as many as half the MP4_INDEX_CACHE_MB index cache holds),
+      starting playback at start. Back-to-back segments play seamlessly;
+      EXT-X-DISCONTINUITY marks only real recording gaps.
+
+    VOD playlists are fMP4 HLS served by Opus (/api/vod/...), see app/services/vod_hls.py.
     """
     recording_id = request.args.get("recording_id", type=int)
     at_s = request.args.get("at")
+    start_s = request.args.get("start")
+    end_s = request.args.get("end")
 
     try:
         cam = Camera.get_by_id(camera_id)
@@ -235,6 +403,19 @@ def stream_index(camera_id: int):
     if not _GO2RTC_STREAM_NAME_RE.match(stream_key):
         return api_error("Invalid stream key.", 400)
 
+    if start_s and end_s:
+        rng, err = _parse_range(start_s, end_s)
+        if err:
+            return err
+        start_dt, end_dt = rng
+        items = _range_layout(main_cam.name, start_dt, end_dt)
+        if not items:
+            return api_error("No recording segment found for the requested time range.", 404)
+        offset = None
+        if items[0].started_at is not None and items[0].started_at < start_dt:
+            offset = (start_dt - items[0].started_at).total_seconds()
+        return _vod_playlist_response(items, offset)
+
     target_rec: Recording | None = None
 
     if recording_id is not None:
@@ -246,25 +427,103 @@ def stream_index(camera_id: int):
             return api_error("Recording does not belong to this camera.", 403)
     elif at_s:
         try:
-            at_dt = datetime.fromisoformat(at_s.replace("Z", "+00:00"))
+            at_dt = parse_iso_local(at_s)
         except ValueError:
             return api_error("Invalid at datetime. Use ISO 8601.", 400)
-        target_rec = _pick_recording_for_time(main_cam.name, at_dt)
+        target_rec, _in_gap = _seek_segment(main_cam.name, at_dt)
 
     if target_rec is None and (recording_id is not None or at_s):
         return api_error("No recording segment found for the requested time range.", 404)
 
     if target_rec is not None:
-        fp = (target_rec.file_path or "").strip()
-        if not fp.endswith(".mp4"):
-            return api_error("Invalid recording file.", 400)
-        stream_name = f"opuspb{target_rec.id}"
-        ok, err = _go2rtc_register_file_stream(stream_name, fp)
-        if not ok:
-            current_app.logger.warning("go2rtc VOD register failed: %s", err)
-            return api_error(f"Could not prepare playback stream: {err or 'unknown error'}", 503)
-        stream_key = stream_name
+        return _vod_playlist_response(_playlist_items([target_rec]))
 
     # LivePlayer uses /go2rtc/api/stream.m3u8 — keep the same path for cache-friendly behavior.
     q = urlencode({"src": stream_key})
     return redirect(f"/go2rtc/api/stream.m3u8?{q}", code=302)
+
+
+def _vod_playlist_response(items: list, start_offset: float | None = None):
+    if not items:
+        return api_error("Recording file not found or unreadable.", 404)
+    body = vod_hls.playlist(items, start_offset=start_offset)
+    return Response(
+        body,
+        mimetype="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+def _segment_recording(recording_id: int):
+    """(Recording, file path) the user may play, or an api_error response."""
+    try:
+        rec = Recording.get_by_id(recording_id)
+    except Recording.DoesNotExist:
+        return None, api_error("Recording not found.", 404)
+    allowed = accessible_camera_names(current_user)
+    if allowed is not None and rec.camera_name not in allowed:
+        return None, api_error("Forbidden.", 403)
+    fp = (rec.file_path or "").strip()
+    if not fp.endswith(".mp4"):
+        return None, api_error("Invalid recording file.", 400)
+    return (rec, fp), None
+
+
+def _vod_recording(recording_id: int):
+    """(Recording, TrackIndex) the user may play, or an api_error response."""
+    found, err = _segment_recording(recording_id)
+    if err:
+        return None, err
+    rec, fp = found
+    try:
+        return (rec, track_index(fp)), None
+    except (OSError, Mp4Error):
+        return None, api_error("Recording file not found or unreadable.", 404)
+
+
+# Segment files never change once registered, so init/fragments cache like static files.
+_VOD_CACHE = "private, max-age=86400"
+
+
+@bp.route("/vod/<int:recording_id>/init.mp4", methods=["GET"])
+@require_auth
+@recordings_view_allowed
+def vod_init(recording_id: int):
+    """fMP4 init segment (ftyp + moov without samples) for a recording."""
+    found, err = _vod_recording(recording_id)
+    if err:
+        return err
+    _rec, idx = found
+    return Response(vod_hls.init_segment(idx), mimetype="video/mp4", headers={"Cache-Control": _VOD_CACHE})
+
+
+@bp.route("/vod/<int:recording_id>/<int:n>.m4s", methods=["GET"])
+@require_auth
+@recordings_view_allowed
+def vod_fragment(recording_id: int, n: int):
+    """
+    Fragment n: synthesized moof + the samples' bytes streamed from the segment file.
+    base (track timescale) shifts the decode times so the fragment continues the
+    previous segment of a seamless range playlist.
+    """
+    found, err = _vod_recording(recording_id)
+    if err:
+        return err
+    rec, idx = found
+    frags = idx.fragments(vod_hls.FRAGMENT_SECONDS)
+    if n >= len(frags) or (rec.status == "writing" and n == len(frags) - 1):
+        return api_error("Fragment not found.", 404)
+    first, end = frags[n]
+    base = max(0, request.args.get("base", default=0, type=int) or 0)
+    header, runs = vod_hls.fragment_header(idx, first, end, n + 1, base)
+    length = len(header) + sum(ln for _off, ln in runs)
+
+    def body():
+        yield header
+        yield from vod_hls.read_runs(idx.path, runs)
+
+    return Response(
+        body(),
+        mimetype="video/iso.segment",
+        headers={"Content-Length": str(length), "Cache-Control": _VOD_CACHE},
+    )
@@ -1,6 +1,6 @@
 """Optional processing engine status (motion worker)."""
 
-from flask import Blueprint
+from flask import Blueprint, request
 from flask_login import current_user
 
 from app.routes.api.utils import api_response, api_error, login_required_api
@@ -21,3 +21,18 @@ def processing_status():
     if engine is None:
         return api_response({"initialized": False, "message": "Processing worker not running."})
     return api_response({"initialized": True, **engine.get_status()})
+
+
+@bp.route("/shards", methods=["GET"])
+@login_required_api
+def processing_shards():
+    """Sharded processors (PROCESSOR_SHARDING): heartbeats, camera leases and each live shard's /status."""
+    if not current_user.is_admin:
+        return api_error("Admin access required.", 403)
+    from app.processing.sharding import shards_overview
+
+    try:
+        data = shards_overview(fetch_status=request.args.get("status", "1") != "0")
+    except Exception as exc:
+        return api_error("Shard status unavailable: %s" % exc, 503)
+    return api_response(data)
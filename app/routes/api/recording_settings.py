@@ -7,9 +7,16 @@ Stores settings in a `setting` key-value table so they persist across restarts
 and can be changed without editing .env files.
 
 Settings hierarchy: DB settings > env vars > defaults
+
+Reads are served from a per-process copy of the whole `setting` table. The copy is
+reloaded only when setting_version (bumped by triggers, migration 016) changes;
+long-running loops call refresh_settings_cache() once per iteration, other callers
+re-check the version at most every _CACHE_MAX_AGE seconds.
 """
 
 import os
+import threading
+import time
 from datetime import datetime
 from flask import Blueprint, request
 from flask_login import current_user
@@ -57,16 +64,54 @@ def _ensure_table():
     """)
 
 
-def get_setting(key, default=None):
+# ── Settings cache ────────────────────────────────────────────────────────────
+
+_CACHE_MAX_AGE = 2.0
+
+_cache_lock = threading.Lock()
+_cache = None           # key -> value, or None before the first load
+_cache_version = None   # setting_version.version at load time (None = table missing)
+_cache_checked = 0.0    # monotonic time of the last version check
+
+
+def _settings_version():
     try:
-        _ensure_table()
-        row = db.execute_sql(
-            "SELECT value FROM setting WHERE key = ?", (key,)
-        ).fetchone()
-        if row:
-            return row[0]
+        row = db.execute_sql("SELECT version FROM setting_version WHERE id = 1").fetchone()
+        return row[0] if row else None
     except Exception:
-        pass
+        return None
+
+
+def refresh_settings_cache(force=False):
+    """
+    One version query; reload the whole `setting` table only if it changed.
+    Call once per worker loop iteration so the rest of the loop reads from memory.
+    """
+    global _cache, _cache_version, _cache_checked
+    with _cache_lock:
+        version = _settings_version()
+        _cache_checked = time.monotonic()
+        # Without the version table (pre-016 DB) every check reloads.
+        if not force and _cache is not None and version is not None and version == _cache_version:
+            return
+        try:
+            rows = db.execute_sql("SELECT key, value FROM setting").fetchall()
+        except Exception:
+            rows = []
+        _cache = {k: v for k, v in rows}
+        _cache_version = version
+
+
+def _cached_value(key):
+    if _cache is None or time.monotonic() - _cache_checked >= _CACHE_MAX_AGE:
+        refresh_settings_cache()
+    return (_cache or {}).get(key)
+
+
+def get_setting(key, default=None):
+    val = _cached_value(key)
+    if val is not None:
+        return val
     env_map = {
         "segment_minutes": "RECORDING_SEGMENT_MINUTES",
         "retention_days":  "RECORDING_RETENTION_DAYS",
@@ -100,6 +145,10 @@ def set_setting(key, value):
         "INSERT OR REPLACE INTO setting (key, value) VALUES (?, ?)",
         (key, str(value))
     )
+    # Write-through: the queued write may not have landed when the next read comes in.
+    with _cache_lock:
+        if _cache is not None:
+            _cache[key] = str(value)
 
 
 # ── Audit trail ───────────────────────────────────────────────────────────────
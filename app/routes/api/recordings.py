@@ -13,12 +13,14 @@ Key improvements over the original:
 """
 
 import os
+import zlib
 import requests
-from datetime import datetime
-from flask import Blueprint, request, current_app
+from datetime import datetime, timedelta
+from flask import Blueprint, request, current_app, send_file
 from flask_login import current_user
 from app.config import get_recordings_dir
 from app.models import Recording, Camera
+from app.services import keyframe_index, thumbnails
 from app.routes.api.utils import (
     api_response,
     api_error,
@@ -29,6 +31,7 @@ from app.routes.api.utils import (
     serve_mp4_file,
     parse_timeline_params,
     to_hms,
+    parse_iso_local,
 )
 
 bp = Blueprint("api_recordings", __name__, url_prefix="/api/recordings")
@@ -211,6 +214,93 @@ def timeline():
     return api_response({"date": target_date.isoformat(), "cameras": cameras})
 
 
+# ── Timeline thumbnails (sprite sheets from the recorder) ───────────────────
+
+_THUMBNAIL_RANGE_HOURS = 48
+# Sheet URLs carry their mtime (?v=), so a cached copy is never stale for long.
+_THUMBNAIL_MAX_AGE = 86400
+
+
+def _thumbnail_camera_error(camera_name: str):
+    """api_error when camera_name has no sheets this user may see, else None."""
+    if not camera_name or ".." in camera_name or "/" in camera_name:
+        return api_error("A main-stream 'camera' is required.", 400)
+    allowed = _get_allowed_camera_names()
+    if allowed is not None and camera_name not in allowed:
+        return api_error("Access denied to this camera.", 403)
+    if camera_name not in _main_stream_names():
+        return api_error("Thumbnails are available for main streams only.", 400)
+    return None
+
+
+@bp.route("/thumbnails", methods=["GET"])
+@require_auth
+def thumbnail_sheets():
+    """
+    Sprite sheets covering a time range, for timeline hover previews.
+
+    Query params:
+      camera      — main-stream camera name (required)
+      start, end  — ISO datetimes (required, at most 48 hours apart)
+
+    Tile k of a sheet shows the first keyframe in [k, k+1) * interval_seconds after
+    the sheet's hour, at row k // columns, column k % columns; "tiles" lists the
+    filled ones. Revalidate with If-None-Match: the ETag changes whenever a sheet does.
+    """
+    camera_name = request.args.get("camera", "")
+    err = _thumbnail_camera_error(camera_name)
+    if err:
+        return err
+    try:
+        start_dt = parse_iso_local(request.args.get("start", ""))
+        end_dt = parse_iso_local(request.args.get("end", ""))
+    except ValueError:
+        return api_error("start and end are required ISO 8601 datetimes.", 400)
+    if end_dt <= start_dt:
+        return api_error("end must be after start.", 400)
+    if end_dt - start_dt > timedelta(hours=_THUMBNAIL_RANGE_HOURS):
+        return api_error("Range is limited to %d hours." % _THUMBNAIL_RANGE_HOURS, 400)
+
+    sheets = []
+    stamps = []
+    for hour, _path, manifest, st in thumbnails.sheets_in_range(
+        get_recordings_dir(), camera_name, start_dt, end_dt
+    ):
+        version = "%x-%x" % (st.st_mtime_ns // 1000000, st.st_size)
+        stamps.append("%s@%s" % (thumbnails.hour_key(hour), version))
+        sheets.append({
+            "hour":  to_iso(hour),
+            "url":   "/api/recordings/thumbnails/%s/%s.jpg?v=%s" % (camera_name, thumbnails.hour_key(hour), version),
+            "tiles": manifest["tiles"],
+        })
+
+    resp, _status = api_response({"camera": camera_name, **thumbnails.geometry(), "sheets": sheets})
+    resp.set_etag("%08x" % zlib.crc32("|".join([camera_name, *stamps]).encode("utf-8")), weak=True)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+@bp.route("/thumbnails/<camera_name>/<sheet>.jpg", methods=["GET"])
+@require_auth
+def thumbnail_sheet(camera_name, sheet):
+    """One camera-hour sprite sheet (JPEG), with ETag / If-None-Match support."""
+    err = _thumbnail_camera_error(camera_name)
+    if err:
+        return err
+    hour = thumbnails.parse_hour_key(sheet)
+    if hour is None:
+        return api_error("Invalid sheet name.", 400)
+    path = thumbnails.sheet_path(get_recordings_dir(), camera_name, hour)
+    if not os.path.isfile(path):
+        return api_error("Sheet not found.", 404)
+    thumbnails.touch(path)
+    resp = send_file(path, mimetype="image/jpeg", conditional=True, etag=True, max_age=_THUMBNAIL_MAX_AGE)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    return resp
+
+
 # ── Available dates (for date picker) ────────────────────────────────────────
 
 @bp.route("/dates", methods=["GET"])
@@ -294,6 +384,16 @@ def serve_recording(camera_name, filename):
 
 # ── Delete a recording ───────────────────────────────────────────────────────
 
+def _drop_thumbnails(camera_name: str, recs) -> None:
+    """Blank deleted segments out of the timeline thumbnail sheets."""
+    try:
+        thumbnails.drop_spans(
+            get_recordings_dir(), camera_name, [(r.started_at, r.ended_at, r.filename) for r in recs]
+        )
+    except (OSError, ValueError, TypeError) as e:
+        current_app.logger.warning(f"Could not update thumbnails for {camera_name}: {e}")
+
+
 @bp.route("/<int:recording_id>", methods=["DELETE"])
 @require_admin
 def delete_recording(recording_id):
@@ -307,10 +407,12 @@ def delete_recording(recording_id):
     try:
         if os.path.exists(rec.file_path):
             os.remove(rec.file_path)
+        keyframe_index.remove_sidecar(rec.file_path)
     except OSError as e:
         current_app.logger.warning(f"Could not delete file {rec.file_path}: {e}")
 
     rec.delete_instance()
+    _drop_thumbnails(rec.camera_name, [rec])
     return api_response(message="Recording deleted.")
 
 
@@ -355,14 +457,18 @@ def bulk_delete():
             return api_error("Invalid 'end' datetime.", 400)
 
     deleted = 0
+    removed = []
     for rec in query:
         try:
             if os.path.exists(rec.file_path):
                 os.remove(rec.file_path)
+            keyframe_index.remove_sidecar(rec.file_path)
         except OSError:
             pass
         rec.delete_instance()
+        removed.append(rec)
         deleted += 1
+    _drop_thumbnails(camera_name, removed)
 
     return api_response(
         {"deleted": deleted},
@@ -400,14 +506,61 @@ def _scan_mp4_folder(folder):
     return cam_count, cam_bytes, oldest_file, newest_file
 
 
+def _storage_from_ledger():
+    """Per-camera rows from the storage ledger, or None when it is unavailable."""
+    from app.services.storage_ledger import ledger_rows
+
+    rows = ledger_rows()
+    if rows is None:
+        return None
+    cameras = []
+    for r in rows:
+        if not r["segment_count"] and not r["clip_count"]:
+            continue
+        tb = (r["segment_bytes"] or 0) + (r["clip_bytes"] or 0)
+        ends = [v for v in (r["segment_oldest"], r["clip_oldest"]) if v]
+        news = [v for v in (r["segment_newest"], r["clip_newest"]) if v]
+        cameras.append({
+            "camera_name": r["camera_name"],
+            "segment_count": r["segment_count"],
+            "clip_count": r["clip_count"],
+            "total_bytes": tb,
+            "total_gb": round(tb / (1024**3), 2) if tb else 0.0,
+            "oldest": min(ends) if ends else None,
+            "newest": max(news) if news else None,
+        })
+    return cameras
+
+
 @bp.route("/storage", methods=["GET"])
 @require_auth
 def storage_stats():
     """
-    Filesystem-backed stats: rolling segments under <dir>/<camera>/ and motion clips
-    under <dir>/clips/<camera>/ (events_only). Uses the same recordings path as settings.
+    Per-camera segment/clip usage, served from the storage ledger (kept current by DB
+    triggers). ?source=disk walks <dir>/<camera>/ and <dir>/clips/<camera>/ instead —
+    slow with many files; use it to cross-check the ledger.
     """
+    from app.services.disk_usage import get_disk_usage
+
     recordings_dir = get_recordings_dir()
+    if request.args.get("source") != "disk":
+        cameras = _storage_from_ledger()
+        if cameras is not None:
+            segs = sum(c["segment_count"] for c in cameras)
+            clips = sum(c["clip_count"] for c in cameras)
+            all_bytes = sum(c["total_bytes"] for c in cameras)
+            return api_response({
+                "recordings_dir":  recordings_dir,
+                "cameras":         cameras,
+                "total_segments":  segs,
+                "total_clips":     clips,
+                "total_files":     segs + clips,
+                "total_gb":        round(all_bytes / (1024**3), 2),
+                "total_bytes":     all_bytes,
+                "disk":            get_disk_usage(recordings_dir),
+                "source":          "ledger",
+            })
+
     by_cam = {}
     total_segment_files = 0
     total_clip_files = 0
@@ -475,8 +628,6 @@ def storage_stats():
         row["total_gb"] = round(tb / (1024**3), 2) if tb else 0.0
         cameras.append(row)
 
-    from app.services.disk_usage import get_disk_usage
-
     return api_response({
         "recordings_dir":  recordings_dir,
         "cameras":         cameras,
@@ -486,6 +637,7 @@ def storage_stats():
         "total_gb":        round(all_bytes / (1024**3), 2),
         "total_bytes":     all_bytes,
         "disk":            get_disk_usage(recordings_dir),
+        "source":          "disk",
     })
 
 
@@ -563,7 +715,7 @@ def force_rescan():
 
     # Force a scan
     try:
-        engine._scan_segments()
+        engine._scan_segments(full=True)
     except Exception as e:
         return api_error(f"Scan failed: {str(e)}", 500)
 
@@ -147,6 +147,18 @@ def to_iso(val):
     return val.isoformat()
 
 
+def parse_iso_local(value: str):
+    """
+    ISO 8601 string → naive local datetime, comparable with recording timestamps (the
+    recorder's wall clock, from segment filenames). Offset-carrying input such as the
+    UI's toISOString() "...Z" is converted to local time. Raises ValueError.
+    """
+    from datetime import datetime
+
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+
 def is_original_admin() -> bool:
     """True only for the first admin account (id == 1). Used to gate sensitive settings."""
     return (
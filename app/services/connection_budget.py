@@ -0,0 +1,247 @@
+"""
+Per-NVR RTSP session budget shared by the recorder, processor and API processes.
+
+NVRs cap concurrent RTSP sessions (often 1-2 per channel); exceeding the cap shows up
+as stream-load failures and producer churn (see migration 013). Every path that opens
+an upstream session — recorder FFmpeg writers, motion frame probes, clip grabs and
+ffprobe diagnostics — takes a lease here first.
+
+A budget is keyed by Camera.nvr (or the NVR whose ip_address matches the URL host),
+else by the RTSP host. The limit is NVR.max_sessions, falling back to NVR_MAX_SESSIONS
+(0 = unlimited: leases are still counted for /status, nothing waits).
+
+Slots are flock()ed files under NVR_SESSION_LOCK_DIR (default: next to the SQLite DB,
+which every service mounts), so accounting spans processes and a crashed holder's
+slot is released by the kernel. Waiters poll for a free slot — requests queue, they
+do not fail, until the caller's timeout.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines: per-process accounting only
+    fcntl = None
+
+logger = logging.getLogger("opus.connection_budget")
+
+DEFAULT_MAX_SESSIONS = max(0, int(os.environ.get("NVR_MAX_SESSIONS", "0") or "0"))
+WAIT_TIMEOUT_SECONDS = float(os.environ.get("NVR_SESSION_WAIT_SECONDS", "30") or "30")
+_POLL_SECONDS = 0.25
+_MAP_TTL = 30.0
+
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_local_in_use: dict[str, int] = {}
+_fallback_sems: dict[str, threading.Semaphore] = {}
+_map = {"at": 0.0, "cameras": {}, "nvr_limits": {}, "nvr_by_ip": {}}
+
+
+def _lock_dir() -> str:
+    d = os.environ.get("NVR_SESSION_LOCK_DIR")
+    if not d:
+        db_path = os.environ.get("DATABASE_PATH", "/app/instance/opus.db")
+        d = os.path.join(os.path.dirname(db_path) or ".", "sessions")
+    return d
+
+
+def _host(url: str | None) -> str | None:
+    try:
+        return urlparse(url or "").hostname
+    except ValueError:
+        return None
+
+
+def _load_map():
+    """Camera name -> (nvr id, rtsp host); NVR limits and ip -> id. Cached for _MAP_TTL."""
+    now = time.monotonic()
+    if now - _map["at"] < _MAP_TTL:
+        return _map
+    try:
+        from app.models import NVR, Camera
+
+        nvr_limits, nvr_by_ip = {}, {}
+        for n in NVR.select(NVR.id, NVR.ip_address, NVR.max_sessions):
+            nvr_limits[n.id] = n.max_sessions
+            if n.ip_address:
+                nvr_by_ip[n.ip_address.strip()] = n.id
+        cameras = {
+            c.name: (c.nvr, _host(c.rtsp_url))
+            for c in Camera.select(Camera.name, Camera.nvr, Camera.rtsp_url)
+        }
+        _map.update(at=now, cameras=cameras, nvr_limits=nvr_limits, nvr_by_ip=nvr_by_ip)
+    except Exception:
+        logger.debug("connection budget map refresh failed", exc_info=True)
+        _map["at"] = now
+    return _map
+
+
+def budget_for(*, camera=None, camera_name: str | None = None, url: str | None = None) -> tuple[str, int]:
+    """(key, max_sessions) for a camera row, a camera name, or a bare RTSP URL."""
+    m = _load_map()
+    nvr_id, host = None, None
+    if camera is not None:
+        nvr_id, host = getattr(camera, "nvr", None), _host(getattr(camera, "rtsp_url", None))
+        camera_name = camera_name or getattr(camera, "name", None)
+    if nvr_id is None and host is None and camera_name in m["cameras"]:
+        nvr_id, host = m["cameras"][camera_name]
+    if nvr_id is None and host is None:
+        host = _host(url)
+    if nvr_id is None and host:
+        nvr_id = m["nvr_by_ip"].get(host)
+    if nvr_id:
+        limit = m["nvr_limits"].get(nvr_id)
+        return "nvr-%s" % nvr_id, DEFAULT_MAX_SESSIONS if limit is None else max(0, int(limit))
+    return "host-%s" % (host or "unknown"), DEFAULT_MAX_SESSIONS
+
+
+def _key_stats(key: str, limit: int) -> dict:
+    st = _stats.get(key)
+    if st is None:
+        st = _stats[key] = {
+            "limit": limit,
+            "in_use": 0,
+            "acquired": 0,
+            "waited": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+    st["limit"] = limit
+    return st
+
+
+def _note_wait(st: dict, seconds: float):
+    st["waited"] += 1
+    st["wait_seconds_total"] += seconds
+    st["wait_seconds_max"] = max(st["wait_seconds_max"], seconds)
+
+
+def record_wait(key: str, limit: int, seconds: float):
+    """Account a wait the caller queued itself (non-blocking acquire retried later)."""
+    with _lock:
+        _note_wait(_key_stats(key, limit), seconds)
+
+
+class SessionLease:
+    """One held session slot. release() is idempotent."""
+
+    def __init__(self, key: str, purpose: str, slot):
+        self.key = key
+        self.purpose = purpose
+        self._slot = slot  # flock()ed fd, fallback Semaphore, or None (unlimited)
+        self._released = False
+
+    def release(self):
+        with _lock:
+            if self._released:
+                return
+            self._released = True
+            _local_in_use[self.key] = max(0, _local_in_use.get(self.key, 1) - 1)
+            _stats[self.key]["in_use"] = _local_in_use[self.key]
+        if isinstance(self._slot, int):
+            try:
+                os.close(self._slot)  # drops the flock
+            except OSError:
+                pass
+        elif self._slot is not None:
+            self._slot.release()
+        self._slot = None
+
+
+def _try_slot(key: str, limit: int):
+    """Grab any free slot for key. Returns (ok, slot) — see SessionLease._slot."""
+    if limit <= 0:
+        return True, None
+    if fcntl is None:
+        with _lock:
+            sem = _fallback_sems.setdefault(key, threading.BoundedSemaphore(limit))
+        return (True, sem) if sem.acquire(blocking=False) else (False, None)
+    d = _lock_dir()
+    os.makedirs(d, exist_ok=True)
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", key)
+    for slot in range(limit):
+        fd = os.open(os.path.join(d, "%s.%d.lock" % (safe, slot)), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True, fd
+        except OSError:
+            os.close(fd)
+    return False, None
+
+
+def acquire(
+    key: str,
+    limit: int,
+    *,
+    purpose: str = "",
+    timeout: float | None = None,
+    blocking: bool = True,
+) -> SessionLease | None:
+    """
+    Wait (up to timeout, default NVR_SESSION_WAIT_SECONDS) for a session slot.
+    Returns a SessionLease, or None on timeout / when non-blocking and the budget is full.
+    """
+    timeout = WAIT_TIMEOUT_SECONDS if timeout is None else timeout
+    t0 = time.monotonic()
+    while True:
+        try:
+            ok, slot = _try_slot(key, limit)
+        except OSError:
+            logger.warning("session lock dir unusable (%s) — not enforcing budget", _lock_dir(), exc_info=True)
+            ok, slot = True, None
+        waited = time.monotonic() - t0
+        if ok:
+            with _lock:
+                st = _key_stats(key, limit)
+                _local_in_use[key] = _local_in_use.get(key, 0) + 1
+                st["in_use"] = _local_in_use[key]
+                st["acquired"] += 1
+                if waited >= _POLL_SECONDS:
+                    _note_wait(st, waited)
+            if waited >= 5:
+                logger.info("Session budget %s: %s waited %.1fs", key, purpose or "session", waited)
+            return SessionLease(key, purpose, slot)
+        if not blocking or waited >= timeout:
+            if blocking:
+                with _lock:
+                    _key_stats(key, limit)["timeouts"] += 1
+                logger.warning(
+                    "Session budget %s full (%d): %s gave up after %.1fs",
+                    key, limit, purpose or "session", waited,
+                )
+            return None
+        time.sleep(_POLL_SECONDS)
+
+
+@contextmanager
+def session(*, camera=None, camera_name=None, url=None, purpose: str = "", timeout: float | None = None):
+    """Context manager around acquire(); yields the lease or None when the wait timed out."""
+    key, limit = budget_for(camera=camera, camera_name=camera_name, url=url)
+    lease = acquire(key, limit, purpose=purpose, timeout=timeout)
+    try:
+        yield lease
+    finally:
+        if lease is not None:
+            lease.release()
+
+
+def budget_status() -> dict:
+    """Per-key lease counters for this process (wait seconds rounded for JSON)."""
+    with _lock:
+        out = {}
+        for key, st in _stats.items():
+            row = dict(st)
+            row["wait_seconds_total"] = round(row["wait_seconds_total"], 2)
+            row["wait_seconds_max"] = round(row["wait_seconds_max"], 2)
+            row["wait_seconds_avg"] = round(st["wait_seconds_total"] / st["waited"], 2) if st["waited"] else 0.0
+            out[key] = row
+    return {"default_max_sessions": DEFAULT_MAX_SESSIONS, "budgets": out}
@@ -0,0 +1,169 @@
+"""
+Keyframe index sidecar next to a recorded segment: <segment>.mp4.kfi
+
+A 24-byte header (magic, version, timescale, track id, indexed duration) followed by
+one fixed 20-byte record per keyframe: decode time (track timescale), byte offset and
+size of the keyframe sample. Records are only ever appended and the duration field is
+rewritten in place, so readers never see a torn index — a partially written trailing
+record is ignored.
+
+The recorder writes the sidecar when it registers a segment (RECORDING_KEYFRAME_INDEX)
+and keeps the one of a fragmented (RECORDING_SEGMENT_FORMAT=fmp4) segment current while
+FFmpeg is still writing it. Playback seeks, clip export and thumbnails use load() to jump
+straight to the keyframe at or before a time without probing the segment; a missing or
+outdated sidecar is rebuilt from the segment's sample tables on first use.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import struct
+
+from app.services.mp4_index import Mp4Error, TrackIndex, index_once, track_index
+
+SUFFIX = ".kfi"
+_MAGIC = b"OKFI"
+_VERSION = 1
+_HEADER = struct.Struct(">4sHHIIQ")  # magic, version, reserved, timescale, track id, duration
+_RECORD = struct.Struct(">QQI")  # dts, byte offset, size
+_DURATION_AT = 16
+
+
+def sidecar_path(segment_path: str) -> str:
+    return segment_path + SUFFIX
+
+
+class KeyframeIndex:
+    """Keyframe decode times (seconds) and byte ranges of one segment."""
+
+    def __init__(self, timescale: int, track_id: int, duration: int, records: list[tuple[int, int, int]]):
+        self.timescale = timescale or 1
+        self.track_id = track_id
+        self.duration_ticks = duration
+        self.times = [r[0] / float(self.timescale) for r in records]
+        self.offsets = [r[1] for r in records]
+        self.sizes = [r[2] for r in records]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def seconds(self) -> float:
+        return self.duration_ticks / float(self.timescale)
+
+    @classmethod
+    def from_track(cls, idx: TrackIndex) -> "KeyframeIndex":
+        return cls(idx.timescale, idx.track_id, idx.duration, _records(idx))
+
+    def at_or_before(self, seconds: float) -> int | None:
+        """Index of the last keyframe at or before seconds (the first one when earlier)."""
+        if not self.times:
+            return None
+        return max(0, bisect.bisect_right(self.times, seconds + 1e-6) - 1)
+
+
+def read_sidecar(segment_path: str) -> KeyframeIndex | None:
+    """The segment's sidecar index, or None when missing or unreadable."""
+    try:
+        with open(sidecar_path(segment_path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, _r, timescale, track_id, duration = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    count = (len(data) - _HEADER.size) // _RECORD.size
+    records = [_RECORD.unpack_from(data, _HEADER.size + i * _RECORD.size) for i in range(count)]
+    return KeyframeIndex(timescale, track_id, duration, records)
+
+
+def _records(idx: TrackIndex) -> list[tuple[int, int, int]]:
+    return [(idx.dts[k], idx.offsets[k], idx.sizes[k]) for k in idx.keyframes]
+
+
+def update_sidecar(segment_path: str, live: bool = False) -> int:
+    """
+    Bring the sidecar up to date with the segment (appending keyframes indexed since the
+    last call). Returns the keyframe count; raises OSError / Mp4Error when unreadable.
+    live: the segment is still being written — index it through the mp4_index cache so
+    the next call only parses new fragments. A completed segment is indexed uncached
+    (the recorder never reads it again) and not at all when its sidecar is current.
+    """
+    if live:
+        return _write_sidecar(segment_path, track_index(segment_path))
+    kfi = fresh_sidecar(segment_path)
+    if kfi is not None:
+        return len(kfi)
+    return _write_sidecar(segment_path, index_once(segment_path))
+
+
+def _write_sidecar(segment_path: str, idx: TrackIndex) -> int:
+    path = sidecar_path(segment_path)
+    header = _HEADER.pack(_MAGIC, _VERSION, 0, idx.timescale, idx.track_id, idx.duration)
+    records = _records(idx)
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+    except OSError:
+        size, head = 0, b""
+    have = (size - _HEADER.size) // _RECORD.size if size >= _HEADER.size else -1
+    if head[:_DURATION_AT] == header[:_DURATION_AT] and 0 <= have <= len(records):
+        with open(path, "r+b") as f:
+            f.seek(_HEADER.size + have * _RECORD.size)
+            f.write(b"".join(_RECORD.pack(*r) for r in records[have:]))
+            f.truncate()
+            f.seek(_DURATION_AT)
+            f.write(header[_DURATION_AT:])
+        return len(records)
+    # New, foreign or inconsistent sidecar: rewrite it whole.
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"".join(_RECORD.pack(*r) for r in records))
+    os.replace(tmp, path)
+    return len(records)
+
+
+def fresh_sidecar(segment_path: str) -> KeyframeIndex | None:
+    """The sidecar index when it is at least as new as the segment, else None."""
+    try:
+        if os.stat(sidecar_path(segment_path)).st_mtime_ns < os.stat(segment_path).st_mtime_ns:
+            return None
+    except OSError:
+        return None
+    return read_sidecar(segment_path)
+
+
+def load(segment_path: str, cached: bool = True) -> KeyframeIndex | None:
+    """
+    The segment's keyframe index: its sidecar when at least as new as the segment, else
+    rebuilt from the segment (and the sidecar rewritten when the folder is writable).
+    None when the segment is missing or unreadable. cached=False rebuilds without the
+    mp4_index cache (callers reading each segment once).
+    """
+    if not os.path.exists(segment_path):
+        return None
+    kfi = fresh_sidecar(segment_path)
+    if kfi is not None:
+        return kfi
+    try:
+        idx = track_index(segment_path) if cached else index_once(segment_path)
+    except (OSError, Mp4Error):
+        return None
+    try:
+        _write_sidecar(segment_path, idx)
+    except OSError:
+        pass  # read-only recordings mount: serve from memory
+    return KeyframeIndex.from_track(idx)
+
+
+def remove_sidecar(segment_path: str) -> None:
+    try:
+        os.remove(sidecar_path(segment_path))
+    except OSError:
+        pass
+
@@ -0,0 +1,447 @@
+"""
+Sample index of a recorded MP4 read straight from its moov box (no ffmpeg).
+
+The first video track's sample tables (stsz, stco/co64, stsc, stts, ctts, stss, elst)
+are flattened into per-sample arrays — file offset, size, decode time, composition
+offset and keyframe flag — plus the raw mvhd/trak boxes needed to write an fMP4 init
+segment. Indexes are cached by (path, size, mtime) so a playlist and the fragment
+requests that follow parse each segment once; the cache is bounded by the indexes'
+estimated size (MP4_INDEX_CACHE_MB). Files read once — the recorder indexing a
+completed segment — use index_once(), which bypasses the cache.
+
+Fragmented recordings (RECORDING_SEGMENT_FORMAT=fmp4: empty moov + moof/mdat pairs)
+take their samples from the fragments' tfhd/tfdt/trun boxes instead. Only complete
+moof+mdat pairs are indexed, so a segment FFmpeg is still writing can be read, and a
+grown file is indexed incrementally from where the previous index stopped.
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+CACHE_MAX_BYTES = int(float(os.environ.get("MP4_INDEX_CACHE_MB", "64") or "0") * 1024 * 1024)
+
+_cache: OrderedDict[tuple, "TrackIndex"] = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+# path -> newest index of a fragmented file, the starting point when it grows
+_growing: dict[str, "TrackIndex"] = {}
+
+_NON_SYNC = 0x00010000  # sample_is_non_sync_sample in trun/tfhd/trex sample flags
+
+
+class Mp4Error(ValueError):
+    pass
+
+
+def iter_boxes(buf, start: int, end: int):
+    """(type, box start, payload start, box end) for the boxes in buf[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, typ = struct.unpack_from(">I4s", buf, pos)
+        hdr = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            hdr = 16
+        elif size == 0:
+            size = end - pos
+        if size < hdr or pos + size > end:
+            raise Mp4Error("truncated %r box" % typ)
+        yield typ, pos, pos + hdr, pos + size
+        pos += size
+
+
+def _child(buf, start: int, end: int, typ: bytes):
+    for t, b0, p0, b1 in iter_boxes(buf, start, end):
+        if t == typ:
+            return b0, p0, b1
+    return None
+
+
+def _u32s(buf, pos: int, count: int) -> array:
+    a = array("I")
+    a.frombytes(bytes(buf[pos:pos + 4 * count]))
+    if sys.byteorder == "little":
+        a.byteswap()
+    return a
+
+
+def read_moov(path: str) -> bytes:
+    """The file's moov box (header included), found by walking the top-level boxes."""
+    return _read_moov(path)[0]
+
+
+def _read_moov(path: str) -> tuple[bytes, int]:
+    """(moov box, file offset just past it)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        file_end = f.tell()
+        pos = 0
+        while pos + 8 <= file_end:
+            f.seek(pos)
+            hdr = f.read(16)
+            size, typ = struct.unpack_from(">I4s", hdr)
+            if size == 1:
+                size = struct.unpack_from(">Q", hdr, 8)[0]
+            elif size == 0:
+                size = file_end - pos
+            if size < 8:
+                break
+            if typ == b"moov":
+                f.seek(pos)
+                data = f.read(size)
+                if len(data) != size:
+                    break
+                return data, pos + size
+            pos += size
+    raise Mp4Error("no moov box (file still being written or not an MP4)")
+
+
+class TrackIndex:
+    """Per-sample arrays for one video track. Times are in the track's timescale."""
+
+    fragmented = False
+
+    def __init__(self, path: str):
+        self.path = path
+        moov, moov_end = _read_moov(path)
+        end = len(moov)
+        mvhd = _child(moov, 8, end, b"mvhd")
+        if mvhd is None:
+            raise Mp4Error("no mvhd")
+        self.mvhd = bytes(moov[mvhd[0]:mvhd[2]])
+        for t, b0, p0, b1 in iter_boxes(moov, 8, end):
+            if t == b"trak" and self._parse_trak(moov, b0, p0, b1):
+                break
+        else:
+            raise Mp4Error("no video track")
+        mvex = _child(moov, 8, end, b"mvex")
+        if mvex is not None:
+            self._init_fragmented(moov, mvex, moov_end)
+
+    def _parse_trak(self, buf, b0: int, p0: int, b1: int) -> bool:
+        mdia = _child(buf, p0, b1, b"mdia")
+        if mdia is None:
+            return False
+        hdlr = _child(buf, mdia[1], mdia[2], b"hdlr")
+        if hdlr is None or buf[hdlr[1] + 8:hdlr[1] + 12] != b"vide":
+            return False
+        tkhd = _child(buf, p0, b1, b"tkhd")
+        v = buf[tkhd[1]]
+        self.track_id = struct.unpack_from(">I", buf, tkhd[1] + (20 if v == 1 else 12))[0]
+        mdhd = _child(buf, mdia[1], mdia[2], b"mdhd")
+        v = buf[mdhd[1]]
+        self.timescale = struct.unpack_from(">I", buf, mdhd[1] + (20 if v == 1 else 12))[0]
+        self.trak = bytes(buf[b0:b1])
+
+        minf = _child(buf, mdia[1], mdia[2], b"minf")
+        stbl = _child(buf, minf[1], minf[2], b"stbl")
+        tables = {t: (p, e) for t, _b, p, e in iter_boxes(buf, stbl[1], stbl[2])}
+
+        p, _e = tables[b"stsz"]
+        const, count = struct.unpack_from(">II", buf, p + 4)
+        self.sizes = array("I", [const]) * count if const else _u32s(buf, p + 12, count)
+        n = count
+
+        dts = array("Q")
+        p, _e = tables[b"stts"]
+        t = 0
+        (entries,) = struct.unpack_from(">I", buf, p + 4)
+        for i in range(entries):
+            c, delta = struct.unpack_from(">II", buf, p + 8 + 8 * i)
+            for _ in range(c):
+                dts.append(t)
+                t += delta
+        self.dts = dts[:n]
+        self.duration = t
+
+        shift = 0
+        edts = _child(buf, p0, b1, b"edts")
+        if edts is not None:
+            elst = _child(buf, edts[1], edts[2], b"elst")
+            if elst is not None:
+                v = buf[elst[1]]
+                (entries,) = struct.unpack_from(">I", buf, elst[1] + 4)
+                pos = elst[1] + 8
+                for _ in range(entries):
+                    if v == 1:
+                        _dur, media_time = struct.unpack_from(">Qq", buf, pos)
+                        pos += 20
+                    else:
+                        _dur, media_time = struct.unpack_from(">Ii", buf, pos)
+                        pos += 12
+                    if media_time != -1:
+                        shift = media_time
+                        break
+        cts = array("i")
+        if b"ctts" in tables:
+            p, _e = tables[b"ctts"]
+            signed = buf[p] == 1
+            (entries,) = struct.unpack_from(">I", buf, p + 4)
+            fmt = ">Ii" if signed else ">II"
+            for i in range(entries):
+                c, off = struct.unpack_from(fmt, buf, p + 8 + 8 * i)
+                cts.extend([off - shift] * c)
+        cts.extend([-shift] * (n - len(cts)))
+        self.cts = cts[:n]
+        self._shift = shift
+
+        if b"stss" in tables:
+            p, _e = tables[b"stss"]
+            (entries,) = struct.unpack_from(">I", buf, p + 4)
+            self.keyframes = [s - 1 for s in _u32s(buf, p + 8, entries) if 0 < s <= n]
+        else:
+            self.keyframes = list(range(n))
+        self.keyframe_set = frozenset(self.keyframes)
+
+        if b"stco" in tables:
+            p, _e = tables[b"stco"]
+            (entries,) = struct.unpack_from(">I", buf, p + 4)
+            chunks = _u32s(buf, p + 8, entries)
+        else:
+            p, _e = tables[b"co64"]
+            (entries,) = struct.unpack_from(">I", buf, p + 4)
+            chunks = struct.unpack_from(">%dQ" % entries, buf, p + 8)
+        p, _e = tables[b"stsc"]
+        (entries,) = struct.unpack_from(">I", buf, p + 4)
+        runs = [struct.unpack_from(">III", buf, p + 8 + 12 * i)[:2] for i in range(entries)]
+        offsets = array("Q")
+        sizes = self.sizes
+        s = 0
+        for r, (first_chunk, per_chunk) in enumerate(runs):
+            last_chunk = runs[r + 1][0] - 1 if r + 1 < len(runs) else len(chunks)
+            for c in range(first_chunk - 1, last_chunk):
+                off = chunks[c]
+                for _ in range(per_chunk):
+                    if s >= n:
+                        break
+                    offsets.append(off)
+                    off += sizes[s]
+                    s += 1
+        if s != n:
+            raise Mp4Error("sample tables disagree (%d of %d samples placed)" % (s, n))
+        self.offsets = offsets
+        self.sample_count = n
+        self._fragments: dict[float, list[tuple[int, int]]] = {}
+        return True
+
+    def _init_fragmented(self, moov, mvex, moov_end: int):
+        self.fragmented = True
+        self._trex = (0, 0, 0)
+        for t, b0, p0, b1 in iter_boxes(moov, mvex[1], mvex[2]):
+            if t == b"trex" and struct.unpack_from(">I", moov, p0 + 4)[0] == self.track_id:
+                # default sample duration, size, flags
+                self._trex = struct.unpack_from(">III", moov, p0 + 12)
+        # Samples in moov tables (normally none with empty_moov) come first.
+        self.dts = array("Q", self.dts)
+        self.sizes = array("I", self.sizes)
+        self.keyframes = list(self.keyframes)
+        self.next_offset = moov_end
+        self._read_fragments()
+
+    def _read_fragments(self):
+        """Append the samples of every complete moof+mdat pair from next_offset on."""
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            file_end = f.tell()
+            pos = self.next_offset
+            moof = None
+            while pos + 8 <= file_end:
+                f.seek(pos)
+                hdr = f.read(16)
+                size, typ = struct.unpack_from(">I4s", hdr)
+                if size == 1:
+                    size = struct.unpack_from(">Q", hdr, 8)[0]
+                if size < 8 or pos + size > file_end:
+                    break  # box still being written
+                if typ == b"moof":
+                    f.seek(pos)
+                    moof = (pos, f.read(size))
+                elif typ == b"mdat" and moof is not None:
+                    self._add_moof(*moof)
+                    moof = None
+                    self.next_offset = pos + size
+                elif moof is None:
+                    self.next_offset = pos + size
+                pos += size
+        self.sample_count = len(self.sizes)
+        self.keyframe_set = frozenset(self.keyframes)
+        self._fragments = {}
+
+    def _add_moof(self, moof_pos: int, buf: bytes):
+        for t, b0, p0, b1 in iter_boxes(buf, 8, len(buf)):
+            if t != b"traf":
+                continue
+            tfhd = _child(buf, p0, b1, b"tfhd")
+            if tfhd is None:
+                continue
+            p = tfhd[1]
+            (vf,) = struct.unpack_from(">I", buf, p)
+            flags = vf & 0xFFFFFF
+            if struct.unpack_from(">I", buf, p + 4)[0] != self.track_id:
+                continue
+            p += 8
+            base = moof_pos
+            if flags & 0x01:
+                base = struct.unpack_from(">Q", buf, p)[0]
+                p += 8
+            if flags & 0x02:
+                p += 4
+            d_dur, d_size, d_flags = self._trex
+            if flags & 0x08:
+                d_dur = struct.unpack_from(">I", buf, p)[0]
+                p += 4
+            if flags & 0x10:
+                d_size = struct.unpack_from(">I", buf, p)[0]
+                p += 4
+            if flags & 0x20:
+                d_flags = struct.unpack_from(">I", buf, p)[0]
+            t_dts = self.duration
+            tfdt = _child(buf, p0, b1, b"tfdt")
+            if tfdt is not None:
+                v = buf[tfdt[1]]
+                t_dts = struct.unpack_from(">Q" if v == 1 else ">I", buf, tfdt[1] + 4)[0]
+            data = base
+            for tt, x0, q0, x1 in iter_boxes(buf, p0, b1):
+                if tt != b"trun":
+                    continue
+                (vf,) = struct.unpack_from(">I", buf, q0)
+                version, tf = vf >> 24, vf & 0xFFFFFF
+                (count,) = struct.unpack_from(">I", buf, q0 + 4)
+                q = q0 + 8
+                if tf & 0x01:
+                    data = base + struct.unpack_from(">i", buf, q)[0]
+                    q += 4
+                first_flags = None
+                if tf & 0x04:
+                    first_flags = struct.unpack_from(">I", buf, q)[0]
+                    q += 4
+                for i in range(count):
+                    dur, size, sflags, cto = d_dur, d_size, d_flags, 0
+                    if tf & 0x100:
+                        dur = struct.unpack_from(">I", buf, q)[0]
+                        q += 4
+                    if tf & 0x200:
+                        size = struct.unpack_from(">I", buf, q)[0]
+                        q += 4
+                    if tf & 0x400:
+                        sflags = struct.unpack_from(">I", buf, q)[0]
+                        q += 4
+                    elif i == 0 and first_flags is not None:
+                        sflags = first_flags
+                    if tf & 0x800:
+                        cto = struct.unpack_from(">i" if version else ">I", buf, q)[0]
+                        q += 4
+                    n = len(self.sizes)
+                    if not sflags & _NON_SYNC:
+                        self.keyframes.append(n)
+                    self.dts.append(t_dts)
+                    self.sizes.append(size)
+                    self.offsets.append(data)
+                    self.cts.append(cto - self._shift)
+                    data += size
+                    t_dts += dur
+                self.duration = t_dts
+
+    def extended(self) -> "TrackIndex":
+        """A fragmented index grown by the fragments written since this one was built."""
+        idx = copy.copy(self)
+        idx.dts = array("Q", self.dts)
+        idx.sizes = array("I", self.sizes)
+        idx.offsets = array("Q", self.offsets)
+        idx.cts = array("i", self.cts)
+        idx.keyframes = list(self.keyframes)
+        idx._read_fragments()
+        return idx
+
+    @property
+    def seconds(self) -> float:
+        return self.duration / float(self.timescale or 1)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: the sample arrays plus keyframe list/set entries and raw boxes."""
+        arrays = sum(a.itemsize * len(a) for a in (self.dts, self.sizes, self.offsets, self.cts))
+        return arrays + 110 * len(self.keyframes) + len(self.trak) + len(self.mvhd) + 512
+
+    def sample_duration(self, i: int) -> int:
+        return (self.dts[i + 1] if i + 1 < self.sample_count else self.duration) - self.dts[i]
+
+    def fragments(self, target_seconds: float) -> list[tuple[int, int]]:
+        """[first, end) sample ranges starting on keyframes, about target_seconds each."""
+        frags = self._fragments.get(target_seconds)
+        if frags is not None:
+            return frags
+        target = int(target_seconds * self.timescale)
+        starts = list(self.keyframes) or [0]
+        if starts[0] != 0:
+            starts.insert(0, 0)  # leading non-key samples ride with the first fragment
+        frags = []
+        first = 0
+        for k in starts[1:]:
+            if self.dts[k] - self.dts[first] >= target:
+                frags.append((first, k))
+                first = k
+        if first < self.sample_count:
+            frags.append((first, self.sample_count))
+        self._fragments[target_seconds] = frags
+        return frags
+
+
+def track_index(path: str) -> TrackIndex:
+    """
+    Cached TrackIndex for path, rebuilt when the file's size or mtime changes — a grown
+    fragmented file only has its new fragments parsed.
+    """
+    global _cache_bytes
+
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        idx = _cache.get(key)
+        if idx is not None:
+            _cache.move_to_end(key)
+            return idx
+        prev = _growing.get(path)
+    if prev is not None and prev.next_offset <= st.st_size:
+        idx = prev.extended()
+    else:
+        idx = TrackIndex(path)
+    size = idx.nbytes
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+        _cache[key] = idx
+        _cache_bytes += size
+        if idx.fragmented:
+            _growing[path] = idx
+        while _cache_bytes > CACHE_MAX_BYTES and len(_cache) > 1:
+            old_key, old = _cache.popitem(last=False)
+            _cache_bytes -= old.nbytes
+            if _growing.get(old_key[0]) is old:
+                del _growing[old_key[0]]
+    return idx
+
+
+def index_once(path: str) -> TrackIndex:
+    """
+    Uncached TrackIndex for a file that will not be read again soon (the recorder
+    indexing a completed segment). A growing fragmented file's cached index is extended
+    rather than reparsed, and the file's cache entries are dropped.
+    """
+    global _cache_bytes
+
+    with _cache_lock:
+        prev = _growing.pop(path, None)
+        for key in [k for k in _cache if k[0] == path]:
+            _cache_bytes -= _cache.pop(key).nbytes
+    if prev is not None and prev.next_offset <= os.path.getsize(path):
+        return prev.extended()
+    return TrackIndex(path)
+
@@ -0,0 +1,81 @@
+"""
+Per-camera storage totals from the `storage_ledger` table (migration 015).
+
+Triggers on `recording` / `recording_event` keep the ledger current, so readers
+(retention max-storage check, recorder /status, /api/recordings/storage) never
+walk the recordings volume. Counts cover registered files only: the segment
+FFmpeg is still writing appears once it is registered.
+"""
+
+from __future__ import annotations
+
+import logging
+
+logger = logging.getLogger("opus.storage_ledger")
+
+_COLUMNS = (
+    "camera_name",
+    "segment_count",
+    "segment_bytes",
+    "segment_oldest",
+    "segment_newest",
+    "clip_count",
+    "clip_bytes",
+    "clip_oldest",
+    "clip_newest",
+)
+
+
+def ledger_rows() -> list[dict] | None:
+    """All ledger rows as dicts, sorted by camera name. None if the ledger is unavailable."""
+    from app.database import db
+
+    try:
+        cur = db.execute_sql(
+            "SELECT %s FROM storage_ledger ORDER BY camera_name" % ", ".join(_COLUMNS)
+        )
+        return [dict(zip(_COLUMNS, r)) for r in cur.fetchall()]
+    except Exception:
+        logger.exception("storage ledger query failed")
+        return None
+
+
+def segment_bytes_total() -> int | None:
+    """Bytes of all registered segments (clips excluded). None if the ledger is unavailable."""
+    from app.database import db
+
+    try:
+        row = db.execute_sql("SELECT COALESCE(SUM(segment_bytes), 0) FROM storage_ledger").fetchone()
+        return int(row[0] or 0)
+    except Exception:
+        logger.exception("storage ledger query failed")
+        return None
+
+
+def rebuild_ledger() -> None:
+    """Recompute every ledger row from `recording` / `recording_event` (explicit reconcile)."""
+    from app.database import write_transaction
+
+    with write_transaction() as cur:
+        cur.execute("DELETE FROM storage_ledger")
+        cur.execute(
+            "INSERT INTO storage_ledger"
+            " (camera_name, segment_count, segment_bytes, segment_oldest, segment_newest)"
+            " SELECT camera_name, COUNT(*), COALESCE(SUM(file_size), 0), MIN(filename), MAX(filename)"
+            " FROM recording GROUP BY camera_name"
+        )
+        cur.execute(
+            "INSERT OR IGNORE INTO storage_ledger (camera_name)"
+            " SELECT DISTINCT camera_name FROM recording_event"
+        )
+        cur.execute(
+            "UPDATE storage_ledger SET"
+            " clip_count = (SELECT COUNT(*) FROM recording_event e"
+            "   WHERE e.camera_name = storage_ledger.camera_name),"
+            " clip_bytes = (SELECT COALESCE(SUM(file_size), 0) FROM recording_event e"
+            "   WHERE e.camera_name = storage_ledger.camera_name),"
+            " clip_oldest = (SELECT MIN(filename) FROM recording_event e"
+            "   WHERE e.camera_name = storage_ledger.camera_name),"
+            " clip_newest = (SELECT MAX(filename) FROM recording_event e"
+            "   WHERE e.camera_name = storage_ledger.camera_name)"
+        )
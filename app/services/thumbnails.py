@@ -0,0 +1,316 @@
+"""
+Timeline thumbnail sprite sheets: <recordings>/.thumbs/<camera>/<YYYY-MM-DD_HH>.jpg
+
+One sheet per camera and wall-clock hour: a grid of THUMBNAIL_WIDTH x THUMBNAIL_HEIGHT
+tiles, COLUMNS per row, tile k covering [k, k+1) * THUMBNAIL_INTERVAL_SECONDS into the
+hour (the first keyframe decoded in that slot). A JSON manifest next to each sheet
+lists the filled tiles, the segments already packed and the grid geometry; sheets
+built with another geometry are started over.
+
+The recorder fills the sheets (app/recorder_thumbnails.py); the API serves them
+(/api/recordings/thumbnails). Both replace files atomically. Total size is capped at
+THUMBNAIL_MAX_MB: the least recently used sheets go first, where "used" is the access
+time the API stamps on a sheet it serves (at most every _TOUCH_SECONDS, so serving
+stays read-mostly) and the recorder sets when it writes one. Sheets follow their
+footage: retention removes the hours before a camera's oldest segment, and manual
+deletes blank the deleted segments' tiles (drop_spans).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta
+
+THUMBS_DIRNAME = ".thumbs"
+INTERVAL_SECONDS = max(2, int(os.environ.get("THUMBNAIL_INTERVAL_SECONDS", "10") or "10"))
+TILE_WIDTH = max(16, int(os.environ.get("THUMBNAIL_WIDTH", "160") or "160")) // 2 * 2
+TILE_HEIGHT = max(16, int(os.environ.get("THUMBNAIL_HEIGHT", "90") or "90")) // 2 * 2
+MAX_BYTES = int(float(os.environ.get("THUMBNAIL_MAX_MB", "1024") or "0") * 1024 * 1024)
+COLUMNS = 20
+JPEG_QUALITY = 75
+SLOTS = math.ceil(3600 / INTERVAL_SECONDS)
+ROWS = math.ceil(SLOTS / COLUMNS)
+_HOUR_FORMAT = "%Y-%m-%d_%H"
+_TOUCH_SECONDS = 600
+# Eviction stops this far below the cap so a full cache is not swept on every write.
+_EVICT_TO = 0.9
+
+
+def geometry() -> dict:
+    return {
+        "interval_seconds": INTERVAL_SECONDS,
+        "tile_width": TILE_WIDTH,
+        "tile_height": TILE_HEIGHT,
+        "columns": COLUMNS,
+        "rows": ROWS,
+    }
+
+
+def thumbs_root(recordings_dir: str) -> str:
+    return os.path.join(recordings_dir, THUMBS_DIRNAME)
+
+
+def hour_of(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_key(hour: datetime) -> str:
+    return hour.strftime(_HOUR_FORMAT)
+
+
+def parse_hour_key(key: str) -> datetime | None:
+    try:
+        return datetime.strptime(key, _HOUR_FORMAT)
+    except ValueError:
+        return None
+
+
+def sheet_path(recordings_dir: str, camera_name: str, hour: datetime) -> str:
+    return os.path.join(thumbs_root(recordings_dir), camera_name, hour_key(hour) + ".jpg")
+
+
+def manifest_path(path: str) -> str:
+    return path[: -len(".jpg")] + ".json"
+
+
+def slot_of(hour: datetime, at: datetime) -> int:
+    return int((at - hour).total_seconds() // INTERVAL_SECONDS)
+
+
+def read_manifest(path: str) -> dict | None:
+    """The sheet's manifest when it matches the current geometry, else None."""
+    try:
+        with open(manifest_path(path), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or any(manifest.get(k) != v for k, v in geometry().items()):
+        return None
+    return manifest
+
+
+def _replace(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def add_tiles(recordings_dir: str, camera_name: str, hour: datetime, tiles: dict, segment: str) -> int:
+    """
+    Paste tiles ({slot: BGR uint8 array of TILE_HEIGHT x TILE_WIDTH}) packed from
+    segment into the camera's sheet for hour. Returns the change in bytes on disk.
+    """
+    import cv2
+    import numpy as np
+
+    path = sheet_path(recordings_dir, camera_name, hour)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    manifest = read_manifest(path)
+    canvas = None
+    old_size = 0
+    if manifest is not None:
+        canvas = cv2.imread(path, cv2.IMREAD_COLOR)
+        try:
+            old_size = os.path.getsize(path) + os.path.getsize(manifest_path(path))
+        except OSError:
+            pass
+    if canvas is None or canvas.shape[:2] != (ROWS * TILE_HEIGHT, COLUMNS * TILE_WIDTH):
+        canvas = np.zeros((ROWS * TILE_HEIGHT, COLUMNS * TILE_WIDTH, 3), dtype=np.uint8)
+        manifest = dict(geometry(), hour=hour.isoformat(), tiles=[], segments=[])
+    for slot, tile in tiles.items():
+        if 0 <= slot < SLOTS:
+            y, x = divmod(slot, COLUMNS)
+            canvas[y * TILE_HEIGHT:(y + 1) * TILE_HEIGHT, x * TILE_WIDTH:(x + 1) * TILE_WIDTH] = tile
+    ok, jpg = cv2.imencode(".jpg", canvas, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    if not ok:
+        raise OSError("JPEG encode failed for %s" % path)
+    manifest["tiles"] = sorted(set(manifest["tiles"]).union(s for s in tiles if 0 <= s < SLOTS))
+    if segment not in manifest["segments"]:
+        manifest["segments"].append(segment)
+    meta = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    # Sheet first: a manifest never lists tiles its sheet does not have yet.
+    _replace(path, jpg.tobytes())
+    _replace(manifest_path(path), meta)
+    return len(jpg) + len(meta) - old_size
+
+
+def packed_segments(recordings_dir: str, camera_name: str, hour: datetime) -> set[str]:
+    manifest = read_manifest(sheet_path(recordings_dir, camera_name, hour))
+    return set(manifest["segments"]) if manifest else set()
+
+
+def sheets_in_range(recordings_dir: str, camera_name: str, start: datetime, end: datetime) -> list:
+    """[(hour, sheet path, manifest, os.stat_result)] of the sheets overlapping [start, end)."""
+    out = []
+    hour = hour_of(start)
+    while hour < end:
+        path = sheet_path(recordings_dir, camera_name, hour)
+        manifest = read_manifest(path)
+        if manifest is not None:
+            try:
+                out.append((hour, path, manifest, os.stat(path)))
+            except OSError:
+                pass
+        hour += timedelta(hours=1)
+    return out
+
+
+def _remove_sheet(path: str) -> None:
+    for p in (manifest_path(path), path):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def sheet_cameras(recordings_dir: str) -> list[str]:
+    try:
+        return sorted(os.listdir(thumbs_root(recordings_dir)))
+    except OSError:
+        return []
+
+
+def remove_before(recordings_dir: str, camera_name: str, before: datetime | None) -> int:
+    """
+    Remove the camera's sheets for hours entirely before *before* (all of them when
+    None: the camera has no footage left). Returns sheets removed.
+    """
+    cam_dir = os.path.join(thumbs_root(recordings_dir), camera_name)
+    try:
+        names = os.listdir(cam_dir)
+    except OSError:
+        return 0
+    floor = hour_of(before) if before is not None else None
+    removed = 0
+    for name in names:
+        if not name.endswith(".jpg"):
+            continue
+        hour = parse_hour_key(name[: -len(".jpg")])
+        if hour is not None and (floor is None or hour < floor):
+            _remove_sheet(os.path.join(cam_dir, name))
+            removed += 1
+    if floor is None:
+        try:
+            os.rmdir(cam_dir)
+        except OSError:
+            pass
+    return removed
+
+
+def drop_spans(recordings_dir: str, camera_name: str, spans) -> int:
+    """
+    Forget deleted footage: spans = [(start, end, segment filename)]. Tiles whose slot
+    overlaps a span are blacked out and unlisted; a sheet left without tiles is
+    removed. One rewrite per affected sheet. Returns sheets changed or removed.
+    """
+    by_hour: dict[datetime, tuple[set, set]] = {}
+    for start, end, fn in spans:
+        if start is None:
+            continue
+        end = end if end is not None and end > start else start + timedelta(seconds=1)
+        hour = hour_of(start)
+        while hour < end:
+            slots, names = by_hour.setdefault(hour, (set(), set()))
+            first = slot_of(hour, max(start, hour))
+            last = min(SLOTS, math.ceil((min(end, hour + timedelta(hours=1)) - hour).total_seconds() / INTERVAL_SECONDS))
+            slots.update(range(first, last))
+            names.add(fn)
+            hour += timedelta(hours=1)
+
+    changed = 0
+    for hour, (slots, names) in sorted(by_hour.items()):
+        path = sheet_path(recordings_dir, camera_name, hour)
+        manifest = read_manifest(path)
+        if manifest is None:
+            continue
+        keep = [k for k in manifest["tiles"] if k not in slots]
+        if not keep:
+            _remove_sheet(path)
+            changed += 1
+            continue
+        gone = [k for k in manifest["tiles"] if k in slots]
+        if gone:
+            import cv2
+
+            canvas = cv2.imread(path, cv2.IMREAD_COLOR)
+            if canvas is None:
+                _remove_sheet(path)
+                changed += 1
+                continue
+            for slot in gone:
+                y, x = divmod(slot, COLUMNS)
+                canvas[y * TILE_HEIGHT:(y + 1) * TILE_HEIGHT, x * TILE_WIDTH:(x + 1) * TILE_WIDTH] = 0
+            ok, jpg = cv2.imencode(".jpg", canvas, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+            if not ok:
+                raise OSError("JPEG encode failed for %s" % path)
+            _replace(path, jpg.tobytes())
+        manifest["tiles"] = keep
+        manifest["segments"] = [fn for fn in manifest["segments"] if fn not in names]
+        _replace(manifest_path(path), json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+        changed += 1
+    return changed
+
+
+def touch(path: str) -> None:
+    """Stamp a served sheet's access time (LRU order); the mtime behind its ETag is kept."""
+    try:
+        st = os.stat(path)
+        now = time.time()
+        if now - st.st_atime > _TOUCH_SECONDS:
+            os.utime(path, ns=(int(now * 1e9), st.st_mtime_ns))
+    except OSError:
+        pass  # read-only mount: the write time orders it
+
+
+def _sheets(recordings_dir: str) -> list[tuple[float, int, str]]:
+    """(last use, bytes incl. manifest, sheet path) of every sheet on disk."""
+    out = []
+    root = thumbs_root(recordings_dir)
+    try:
+        cams = os.listdir(root)
+    except OSError:
+        return out
+    for cam in cams:
+        try:
+            entries = list(os.scandir(os.path.join(root, cam)))
+        except OSError:
+            continue
+        stats = {}
+        for e in entries:
+            try:
+                stats[e.name] = e.stat()
+            except OSError:
+                continue
+        for name, st in stats.items():
+            if not name.endswith(".jpg"):
+                continue
+            meta = stats.get(name[: -len(".jpg")] + ".json")
+            out.append((
+                max(st.st_atime, st.st_mtime),
+                st.st_size + (meta.st_size if meta else 0),
+                os.path.join(root, cam, name),
+            ))
+    return out
+
+
+def evict(recordings_dir: str, max_bytes: int = MAX_BYTES) -> tuple[int, int]:
+    """
+    Remove least recently used sheets while over max_bytes (down to _EVICT_TO of it).
+    Returns (bytes on disk afterwards, sheets removed).
+    """
+    sheets = _sheets(recordings_dir)
+    total = sum(s[1] for s in sheets)
+    if max_bytes <= 0 or total <= max_bytes:
+        return total, 0
+    removed = 0
+    for _at, size, path in sorted(sheets):
+        if total <= max_bytes * _EVICT_TO:
+            break
+        _remove_sheet(path)
+        total -= size
+        removed += 1
+    return total, removed
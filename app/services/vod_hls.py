@@ -0,0 +1,230 @@
+"""
+Native VOD HLS for recorded segments: fMP4 playlists, init segments and fragments.
+
+A playlist covers recording rows in time order; each segment file is cut into
+keyframe-aligned fragments of ~VOD_FRAGMENT_SECONDS. A fragment is a small synthesized
+moof followed by the samples' bytes copied from the recording as they sit on disk — no
+ffmpeg, no go2rtc stream, nothing registered per viewer.
+
+Consecutive segments (next one starts within VOD_GAP_SECONDS of the previous one's
+end, same codec setup) play as one stream: they share the first file's EXT-X-MAP and
+their fragments' decode times are shifted (?base=) to continue where the previous
+file stopped. A real gap or a codec change starts a new EXT-X-DISCONTINUITY run.
+
+A segment still being written (fragmented recording, status 'writing') ends the
+playlist as an EVENT playlist without EXT-X-ENDLIST: players reload it and pick up the
+fragments written since. Its last, still-growing fragment group is left out.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import struct
+
+from app.services.mp4_index import TrackIndex, iter_boxes
+
+FRAGMENT_SECONDS = max(1.0, float(os.environ.get("VOD_FRAGMENT_SECONDS", "4") or "4"))
+GAP_SECONDS = max(0.0, float(os.environ.get("VOD_GAP_SECONDS", "2") or "2"))
+_READ_CHUNK = 256 * 1024
+_SYNC_FLAGS = 0x02000000  # sample_depends_on = 2 (I-frame)
+_NON_SYNC_FLAGS = 0x01010000  # depends on others, sample_is_non_sync_sample
+_TRUN_FLAGS = 0x000F01  # data offset + per-sample duration, size, flags, composition offset
+
+
+def _box(typ: bytes, *payload: bytes) -> bytes:
+    body = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(body), typ) + body
+
+
+def _full(typ: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return _box(typ, struct.pack(">I", (version << 24) | flags), *payload)
+
+
+def _strip_trak(trak: bytes) -> bytes:
+    """The source trak with an empty sample table and no edit list (samples live in fragments)."""
+    def rebuild(buf, start, end):
+        out = []
+        for t, b0, p0, b1 in iter_boxes(buf, start, end):
+            if t in (b"trak", b"mdia", b"minf"):
+                out.append(_box(t, rebuild(buf, p0, b1)))
+            elif t == b"stbl":
+                stsd = next(buf[x0:x1] for tt, x0, _p, x1 in iter_boxes(buf, p0, b1) if tt == b"stsd")
+                out.append(_box(
+                    b"stbl",
+                    stsd,
+                    _full(b"stts", 0, 0, struct.pack(">I", 0)),
+                    _full(b"stsc", 0, 0, struct.pack(">I", 0)),
+                    _full(b"stsz", 0, 0, struct.pack(">II", 0, 0)),
+                    _full(b"stco", 0, 0, struct.pack(">I", 0)),
+                ))
+            elif t != b"edts":
+                out.append(bytes(buf[b0:b1]))
+        return b"".join(out)
+
+    return rebuild(trak, 0, len(trak))
+
+
+def init_segment(idx: TrackIndex) -> bytes:
+    ftyp = _box(b"ftyp", b"iso6", struct.pack(">I", 0), b"iso6isommp41")
+    trex = _full(b"trex", 0, 0, struct.pack(">IIIII", idx.track_id, 1, 0, 0, 0))
+    return ftyp + _box(b"moov", idx.mvhd, _strip_trak(idx.trak), _box(b"mvex", trex))
+
+
+def fragment_header(
+    idx: TrackIndex, first: int, end: int, sequence: int, base: int = 0
+) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    (moof + mdat header, [(file offset, length)] runs of sample data) for samples
+    [first, end); base (track timescale) is added to the decode times.
+    """
+    keys = idx.keyframe_set
+    n = end - first
+    rows = []
+    for i in range(first, end):
+        rows.extend((
+            idx.sample_duration(i),
+            idx.sizes[i],
+            _SYNC_FLAGS if i in keys else _NON_SYNC_FLAGS,
+            idx.cts[i],
+        ))
+    samples = struct.pack(">" + "IIIi" * n, *rows)
+
+    def moof(data_offset: int) -> bytes:
+        trun = _full(b"trun", 1, _TRUN_FLAGS, struct.pack(">Ii", n, data_offset), samples)
+        tfhd = _full(b"tfhd", 0, 0x020000, struct.pack(">I", idx.track_id))  # default-base-is-moof
+        tfdt = _full(b"tfdt", 1, 0, struct.pack(">Q", base + idx.dts[first]))
+        return _box(b"moof", _full(b"mfhd", 0, 0, struct.pack(">I", sequence)), _box(b"traf", tfhd, tfdt, trun))
+
+    size = len(moof(0))
+    payload = sum(idx.sizes[first:end])
+    header = moof(size + 8) + struct.pack(">I4s", 8 + payload, b"mdat")
+
+    runs: list[tuple[int, int]] = []
+    for i in range(first, end):
+        off, ln = idx.offsets[i], idx.sizes[i]
+        if runs and runs[-1][0] + runs[-1][1] == off:
+            runs[-1] = (runs[-1][0], runs[-1][1] + ln)
+        else:
+            runs.append((off, ln))
+    return header, runs
+
+
+def read_runs(path: str, runs: list[tuple[int, int]]):
+    """Yield the sample bytes of runs from path in chunks."""
+    with open(path, "rb") as f:
+        for off, ln in runs:
+            f.seek(off)
+            while ln > 0:
+                chunk = f.read(min(_READ_CHUNK, ln))
+                if not chunk:
+                    raise OSError("%s truncated at %d" % (os.path.basename(path), off))
+                ln -= len(chunk)
+                yield chunk
+
+
+class PlaylistItem:
+    """One segment file in a playlist: where its fragments sit on the stream timeline."""
+
+    __slots__ = ("rec_id", "started_at", "idx", "map_id", "base", "discontinuity", "stream_offset", "live")
+
+    def __init__(self, rec_id, started_at, idx, map_id, base, discontinuity, stream_offset, live=False):
+        self.rec_id = rec_id
+        self.started_at = started_at
+        self.idx = idx
+        self.map_id = map_id  # recording whose init segment this file's fragments use
+        self.base = base  # decode-time shift (track timescale) continuing the run
+        self.discontinuity = discontinuity
+        self.stream_offset = stream_offset  # seconds from the playlist start
+        self.live = live  # file still being written
+
+    @property
+    def seconds(self) -> float:
+        return self.idx.seconds
+
+    def fragments(self) -> list[tuple[int, int]]:
+        frags = self.idx.fragments(FRAGMENT_SECONDS)
+        # The last group of a growing file may still gain samples: not listed yet.
+        return frags[:-1] if self.live else frags
+
+
+def _stsd(buf, start: int, end: int) -> bytes:
+    """The sample description box (codec setup) inside a trak, or b"" when absent."""
+    for t, b0, p0, b1 in iter_boxes(buf, start, end):
+        if t == b"stsd":
+            return bytes(buf[b0:b1])
+        if t in (b"mdia", b"minf", b"stbl"):
+            found = _stsd(buf, p0, b1)
+            if found:
+                return found
+    return b""
+
+
+def layout(entries) -> list[PlaylistItem]:
+    """
+    entries: [(recording id, started_at datetime or None, TrackIndex, still being written)]
+    in time order. Groups consecutive, codec-compatible files into seamless runs.
+    """
+    items: list[PlaylistItem] = []
+    offset = 0.0
+    prev = None
+    for rec_id, started_at, idx, live in entries:
+        joined = (
+            prev is not None
+            and started_at is not None
+            and prev.started_at is not None
+            and prev.idx.timescale == idx.timescale
+            and prev.idx.track_id == idx.track_id
+            and abs((started_at - prev.started_at).total_seconds() - prev.seconds) <= GAP_SECONDS
+            and _stsd(prev.idx.trak, 8, len(prev.idx.trak)) == _stsd(idx.trak, 8, len(idx.trak))
+        )
+        if joined:
+            item = PlaylistItem(rec_id, started_at, idx, prev.map_id, prev.base + prev.idx.duration, False, offset, live)
+        else:
+            item = PlaylistItem(rec_id, started_at, idx, rec_id, 0, prev is not None, offset, live)
+        items.append(item)
+        offset += idx.seconds
+        prev = item
+    return items
+
+
+def locate(items: list[PlaylistItem], rec_id: int, offset_seconds: float) -> float | None:
+    """Stream time of offset_seconds into recording rec_id, or None when it is not in the playlist."""
+    for item in items:
+        if item.rec_id == rec_id:
+            return item.stream_offset + max(0.0, min(offset_seconds, item.seconds))
+    return None
+
+
+def playlist(items: list[PlaylistItem], url_prefix: str = "/api/vod", start_offset: float | None = None) -> str:
+    """Media playlist for layout() items; start_offset = EXT-X-START (seconds from the playlist start)."""
+    body = []
+    longest = 1.0
+    live = False
+    for item in items:
+        live = live or item.live
+        idx = item.idx
+        if item.discontinuity:
+            body.append("#EXT-X-DISCONTINUITY")
+        if item.map_id == item.rec_id:
+            body.append('#EXT-X-MAP:URI="%s/%d/init.mp4"' % (url_prefix, item.rec_id))
+        if item.started_at is not None:
+            body.append("#EXT-X-PROGRAM-DATE-TIME:%s" % item.started_at.isoformat(timespec="milliseconds"))
+        query = "?base=%d" % item.base if item.base else ""
+        for n, (first, end) in enumerate(item.fragments()):
+            end_t = idx.dts[end] if end < idx.sample_count else idx.duration
+            dur = (end_t - idx.dts[first]) / float(idx.timescale)
+            longest = max(longest, dur)
+            body.append("#EXTINF:%.3f," % dur)
+            body.append("%s/%d/%d.m4s%s" % (url_prefix, item.rec_id, n, query))
+    head = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        "#EXT-X-TARGETDURATION:%d" % math.ceil(longest),
+        "#EXT-X-PLAYLIST-TYPE:%s" % ("EVENT" if live else "VOD"),
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    if start_offset:
+        head.append("#EXT-X-START:TIME-OFFSET=%.3f,PRECISE=YES" % start_offset)
+    return "\n".join(head + body + ([""] if live else ["#EXT-X-ENDLIST", ""]))
@@ -9,13 +9,27 @@ export const playbackApi = {
     })
     return api.get(`/api/segments?${q}`)
   },
+  /** Segment + offset covering a wall-clock instant (next segment when it falls in a gap). */
+  seek(cameraId, atIso) {
+    const q = new URLSearchParams({ camera_id: String(cameraId), at: atIso })
+    return api.get(`/api/seek?${q}`)
+  },
+  /** Timeline sprite sheets (hover previews) for a main-stream camera name. */
+  thumbnails(cameraName, startIso, endIso) {
+    const q = new URLSearchParams({ camera: cameraName, start: startIso, end: endIso })
+    return api.get(`/api/recordings/thumbnails?${q}`)
+  },
 }
 
 /** Relative URL (pass through withOrigin if needed). */
-export function playbackStreamUrl(cameraId, { recordingId, at } = {}) {
+export function playbackStreamUrl(cameraId, { recordingId, at, start, end } = {}) {
   const q = new URLSearchParams()
   if (recordingId != null) q.set('recording_id', String(recordingId))
   if (at) q.set('at', at)
+  if (start && end) {
+    q.set('start', start)
+    q.set('end', end)
+  }
   const qs = q.toString()
   return `/api/stream/${cameraId}/index.m3u8${qs ? `?${qs}` : ''}`
 }
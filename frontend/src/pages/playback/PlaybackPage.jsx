@@ -10,47 +10,36 @@ import { registerPlaybackSeekHandler } from './playbackSeekBridge'
 
 const DAY_MS = 24 * 60 * 60 * 1000
 
-function parseEndMs(seg, windowEndMs) {
-  if (seg.end_time) {
-    const t = Date.parse(seg.end_time)
-    if (!Number.isNaN(t)) return t
+/** Recorded playback plays one continuous range from the seek point (server stitches segments). */
+const RANGE_MS = 6 * 60 * 60 * 1000
+const LIVE = { mode: 'live', start: null, end: null, offsetSec: 0 }
+
+async function resolveSeek(cameraId, tMs) {
+  let data
+  try {
+    data = await playbackApi.seek(cameraId, new Date(tMs).toISOString())
+  } catch {
+    return LIVE
   }
-  const d = Number(seg.duration_seconds)
-  if (Number.isFinite(d) && d > 0) {
-    return Date.parse(seg.start_time) + d * 1000
+  const segStart = Date.parse(data.start_time)
+  const fromMs = data.in_gap ? segStart : tMs
+  if (Number.isNaN(fromMs) || (data.in_gap && fromMs < tMs && tMs > Date.now() - 90_000)) return LIVE
+  return {
+    mode: 'vod',
+    start: new Date(fromMs).toISOString(),
+    end: new Date(Math.min(fromMs + RANGE_MS, Date.now())).toISOString(),
+    offsetSec: data.offset_seconds || 0,
   }
-  return windowEndMs
-}
-
-function pickSegmentAt(segments, tMs, windowEndMs) {
-  if (!segments?.length) return null
-  for (const s of segments) {
-    const a = Date.parse(s.start_time)
-    if (Number.isNaN(a)) continue
-    const b = parseEndMs(s, windowEndMs)
-    if (tMs >= a && tMs < b) return { recordingId: s.id, offsetSec: Math.max(0, (tMs - a) / 1000) }
-  }
-  let best = null
-  let bestDist = Infinity
-  for (const s of segments) {
-    const a = Date.parse(s.start_time)
-    if (Number.isNaN(a)) continue
-    const dist = Math.abs(tMs - a)
-    if (dist < bestDist) {
-      bestDist = dist
-      best = { recordingId: s.id, offsetSec: Math.max(0, (tMs - a) / 1000) }
-    }
-  }
-  return best
 }
 
 export default function PlaybackPage() {
   const [cameras, setCameras] = useState([])
   const [selectedId, setSelectedId] = useState(null)
   const [segments, setSegments] = useState([])
+  const [thumbnails, setThumbnails] = useState(null)
   const [latestById, setLatestById] = useState({})
   const [windowEndMs, setWindowEndMs] = useState(() => Date.now())
-  const [playback, setPlayback] = useState({ mode: 'live', recordingId: null, offsetSec: 0 })
+  const [playback, setPlayback] = useState(LIVE)
   const [loadErr, setLoadErr] = useState(null)
 
   const windowStartMs = windowEndMs - DAY_MS
@@ -118,26 +107,42 @@ export default function PlaybackPage() {
     [cameras, selectedId],
   )
 
+  const selectedName = selectedCam?.name
+
+  useEffect(() => {
+    if (!selectedName || !segments.length) {
+      setThumbnails(null)
+      return
+    }
+    let cancelled = false
+    playbackApi
+      .thumbnails(selectedName, new Date(windowStartMs).toISOString(), new Date(windowEndMs).toISOString())
+      .then((data) => {
+        if (!cancelled) setThumbnails(data)
+      })
+      .catch(() => {
+        if (!cancelled) setThumbnails(null)
+      })
+    return () => {
+      cancelled = true
+    }
+  }, [selectedName, segments, windowStartMs, windowEndMs])
+
   const streamSrc = useMemo(() => {
     if (!selectedId) return ''
-    if (playback.mode === 'vod' && playback.recordingId != null) {
-      return playbackStreamUrl(selectedId, { recordingId: playback.recordingId })
+    if (playback.mode === 'vod' && playback.start) {
+      return playbackStreamUrl(selectedId, { start: playback.start, end: playback.end })
     }
     return playbackStreamUrl(selectedId, {})
   }, [selectedId, playback])
 
   const handleTimelineSeek = useCallback(
-    (iso) => {
+    async (iso) => {
       const t = Date.parse(iso)
       if (Number.isNaN(t) || !selectedId) return
-      const pick = pickSegmentAt(segments, t, windowEndMs)
-      if (pick) {
-        setPlayback({ mode: 'vod', recordingId: pick.recordingId, offsetSec: pick.offsetSec })
-        return
-      }
-      if (t > Date.now() - 90_000) setPlayback({ mode: 'live', recordingId: null, offsetSec: 0 })
+      setPlayback(await resolveSeek(selectedId, t))
     },
-    [segments, selectedId, windowEndMs],
+    [selectedId],
   )
 
   const handleSeekEvent = useCallback(
@@ -146,17 +151,7 @@ export default function PlaybackPage() {
       if (Number.isNaN(t)) return
       setSelectedId(cameraId)
       setWindowEndMs(Date.now())
-      const startIso = new Date(t - DAY_MS).toISOString()
-      const endIso = new Date(t + DAY_MS).toISOString()
-      try {
-        const data = await playbackApi.segments(cameraId, startIso, endIso)
-        const segs = data.segments || []
-        const pick = pickSegmentAt(segs, t, Date.now())
-        if (pick) setPlayback({ mode: 'vod', recordingId: pick.recordingId, offsetSec: pick.offsetSec })
-        else setPlayback({ mode: 'live', recordingId: null, offsetSec: 0 })
-      } catch {
-        setPlayback({ mode: 'live', recordingId: null, offsetSec: 0 })
-      }
+      setPlayback(await resolveSeek(cameraId, t))
     },
     [],
   )
@@ -168,7 +163,7 @@ export default function PlaybackPage() {
 
   const onSelectCamera = useCallback((id) => {
     setSelectedId(id)
-    setPlayback({ mode: 'live', recordingId: null, offsetSec: 0 })
+    setPlayback(LIVE)
   }, [])
 
   return (
@@ -188,7 +183,7 @@ export default function PlaybackPage() {
           {selectedCam ? (
             <>
               <PlaybackHlsPlayer
-                key={`${streamSrc}-${playback.recordingId ?? 'live'}`}
+                key={streamSrc}
                 src={streamSrc}
                 isLive={playback.mode === 'live'}
                 startOffsetSeconds={playback.mode === 'vod' ? playback.offsetSec : 0}
@@ -198,15 +193,16 @@ export default function PlaybackPage() {
                 windowStartMs={windowStartMs}
                 windowEndMs={windowEndMs}
                 segments={segments}
+                thumbnails={thumbnails}
                 onSeek={handleTimelineSeek}
               />
               <div className="flex flex-wrap gap-2 text-xs text-gray-500">
                 <span>
                   Mode:{' '}
-                  <span className="text-gray-300">{playback.mode === 'live' ? 'Live (go2rtc)' : 'Recorded segment'}</span>
+                  <span className="text-gray-300">{playback.mode === 'live' ? 'Live (go2rtc)' : 'Recorded range'}</span>
                 </span>
                 {playback.mode === 'vod' && (
-                  <span className="text-gray-400">Offset {playback.offsetSec.toFixed(1)}s into segment</span>
+                  <span className="text-gray-400">From {new Date(playback.start).toLocaleString()}</span>
                 )}
               </div>
             </>
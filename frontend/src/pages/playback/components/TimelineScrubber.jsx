@@ -1,4 +1,7 @@
-import { useMemo, useCallback } from 'react'
+import { useMemo, useCallback, useState } from 'react'
+import { withOrigin } from '../../../api/client'
+
+const HOUR_MS = 60 * 60 * 1000
 
 function parseBoundary(iso, fallbackMs) {
   if (!iso) return fallbackMs
@@ -6,17 +9,50 @@ function parseBoundary(iso, fallbackMs) {
   return Number.isNaN(t) ? fallbackMs : t
 }
 
+/** Pointer x as a fraction of the track width (0–1). */
+function pointerFrac(e) {
+  const rect = e.currentTarget.getBoundingClientRect()
+  const x = e.clientX - rect.left
+  return rect.width > 0 ? Math.min(1, Math.max(0, x / rect.width)) : 0
+}
+
+/** Sprite tile for wall-clock tMs: the last filled tile at or before it in that hour's sheet. */
+function tileAt(thumbnails, tMs) {
+  if (!thumbnails?.sheets?.length) return null
+  const stepMs = thumbnails.interval_seconds * 1000
+  for (const sheet of thumbnails.sheets) {
+    const hourMs = Date.parse(sheet.hour)
+    if (Number.isNaN(hourMs) || tMs < hourMs || tMs >= hourMs + HOUR_MS) continue
+    const slot = Math.floor((tMs - hourMs) / stepMs)
+    let tile = -1
+    for (const k of sheet.tiles) {
+      if (k > slot) break
+      tile = k
+    }
+    if (tile < 0) return null
+    return {
+      url: withOrigin(sheet.url),
+      x: (tile % thumbnails.columns) * thumbnails.tile_width,
+      y: Math.floor(tile / thumbnails.columns) * thumbnails.tile_height,
+    }
+  }
+  return null
+}
+
 /**
  * Horizontal availability strip: each segment is a block; click maps x → wall-clock time.
+ * Hovering previews that time from the recorder's thumbnail sprite sheets when available.
  */
 export default function TimelineScrubber({
   windowStartMs,
   windowEndMs,
   segments,
+  thumbnails = null,
   onSeek,
   className = '',
 }) {
   const range = Math.max(1, windowEndMs - windowStartMs)
+  const [hover, setHover] = useState(null)
 
   const blocks = useMemo(() => {
     if (!segments?.length) return []
@@ -41,37 +77,68 @@ export default function TimelineScrubber({
 
   const onClickTrack = useCallback(
     (e) => {
-      const rect = e.currentTarget.getBoundingClientRect()
-      const x = e.clientX - rect.left
-      const frac = rect.width > 0 ? Math.min(1, Math.max(0, x / rect.width)) : 0
-      const t = windowStartMs + frac * range
+      const t = windowStartMs + pointerFrac(e) * range
       onSeek(new Date(t).toISOString())
     },
     [onSeek, range, windowStartMs],
   )
 
+  const onMoveTrack = useCallback(
+    (e) => {
+      const frac = pointerFrac(e)
+      const t = windowStartMs + frac * range
+      setHover({ frac, t, tile: tileAt(thumbnails, t) })
+    },
+    [range, windowStartMs, thumbnails],
+  )
+
   return (
     <div className={`rounded-lg border border-gray-800 bg-gray-900/80 p-2 ${className}`}>
       <div className="flex justify-between text-[10px] uppercase tracking-wide text-gray-500 mb-1">
         <span>{new Date(windowStartMs).toLocaleString()}</span>
         <span>{new Date(windowEndMs).toLocaleString()}</span>
       </div>
-      <button
-        type="button"
-        onClick={onClickTrack}
-        className="relative w-full h-8 rounded bg-gray-950 border border-gray-800 overflow-hidden cursor-pointer"
-        aria-label="Recording timeline — click to seek"
-      >
-        <div className="absolute inset-y-0 left-0 right-0 bg-gray-900/40" />
-        {blocks.map((b) => (
+      <div className="relative">
+        {hover && (
           <div
-            key={b.id}
-            className="absolute top-1 bottom-1 rounded-sm bg-indigo-500/80 border border-indigo-400/40 pointer-events-none"
-            style={{ left: `${b.left}%`, width: `${b.width}%` }}
-            title="Recorded"
-          />
-        ))}
-      </button>
+            className="absolute bottom-full mb-1 -translate-x-1/2 z-10 pointer-events-none rounded border border-gray-700 bg-gray-950 p-1 shadow-lg"
+            style={{ left: `${hover.frac * 100}%` }}
+          >
+            {hover.tile && (
+              <div
+                className="rounded-sm bg-no-repeat"
+                style={{
+                  width: thumbnails.tile_width,
+                  height: thumbnails.tile_height,
+                  backgroundImage: `url(${hover.tile.url})`,
+                  backgroundPosition: `-${hover.tile.x}px -${hover.tile.y}px`,
+                }}
+              />
+            )}
+            <div className="text-[10px] text-gray-400 text-center mt-0.5">
+              {new Date(hover.t).toLocaleTimeString()}
+            </div>
+          </div>
+        )}
+        <button
+          type="button"
+          onClick={onClickTrack}
+          onMouseMove={onMoveTrack}
+          onMouseLeave={() => setHover(null)}
+          className="relative w-full h-8 rounded bg-gray-950 border border-gray-800 overflow-hidden cursor-pointer"
+          aria-label="Recording timeline — click to seek"
+        >
+          <div className="absolute inset-y-0 left-0 right-0 bg-gray-900/40" />
+          {blocks.map((b) => (
+            <div
+              key={b.id}
+              className="absolute top-1 bottom-1 rounded-sm bg-indigo-500/80 border border-indigo-400/40 pointer-events-none"
+              style={{ left: `${b.left}%`, width: `${b.width}%` }}
+              title="Recorded"
+            />
+          ))}
+        </button>
+      </div>
     </div>
   )
 }
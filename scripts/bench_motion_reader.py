@@ -0,0 +1,123 @@
+"""
+Benchmark: decode CPU of the motion frame sources, per camera, in % of one core.
+
+Runs each source over the same input (a recorded segment or an RTSP URL) and reports
+CPU per second of video:
+  probe      — open, read MOTION_SKIP_FRAMES + 2 frames, close; once per poll
+  persistent — OpenCV reader: grab() (decode) every frame, retrieve + resize at the
+               reader rate
+  ffmpeg     — ffmpeg reader command (keyframe-only decode, fps/scale/gray filter);
+               skipped when no ffmpeg binary is installed
+Files are read as fast as possible, so their length in frames / fps is the video time.
+
+Usage (from the repo root):
+  python scripts/bench_motion_reader.py SEGMENT.mp4|rtsp://… [--seconds 20] [--poll 6]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _is_stream(src: str) -> bool:
+    return "://" in src
+
+
+def bench_probe(src: str, seconds: float, poll: float, skip_frames: int) -> float:
+    import cv2
+
+    polls = max(1, int(seconds // poll))
+    t = time.process_time()
+    for _ in range(polls):
+        cap = cv2.VideoCapture(src)
+        for _ in range(skip_frames + 2):
+            if not cap.read()[0]:
+                break
+        cap.release()
+    return (time.process_time() - t) / (polls * poll)
+
+
+def bench_persistent(src: str, seconds: float, reader_fps: float, width: int) -> float:
+    import cv2
+
+    from app.processing.detectors import _resize_for_analysis
+
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 15.0
+    every = max(1, round(fps / reader_fps))
+    n = 0
+    t, w0 = time.process_time(), time.monotonic()
+    while n < seconds * fps and cap.grab():
+        if n % every == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                _resize_for_analysis(frame, width)
+        n += 1
+    cpu = time.process_time() - t
+    cap.release()
+    video = time.monotonic() - w0 if _is_stream(src) else n / fps
+    return cpu / max(video, 1e-6)
+
+
+def bench_ffmpeg(src: str, seconds: float, reader_fps: float, width: int) -> float | None:
+    from app.processing.frame_sources import FFMPEG_KEYFRAMES_ONLY, ffmpeg_gray_frames_cmd
+
+    if not shutil.which("ffmpeg"):
+        return None
+    height = max(2, round(width * 9 / 16) // 2 * 2)
+    cmd = ffmpeg_gray_frames_cmd(src, width, height, reader_fps, FFMPEG_KEYFRAMES_ONLY)
+    if not _is_stream(src):
+        # RTSP input options do not apply to a file.
+        for opt in ("-rtsp_transport", "-timeout"):
+            i = cmd.index(opt)
+            del cmd[i:i + 2]
+    i = cmd.index("-i")
+    cmd[i:i] = ["-t", str(seconds)]
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    w0 = time.monotonic()
+    subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    if _is_stream(src):
+        return cpu / max(time.monotonic() - w0, 1e-6)
+    import cv2
+
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 15.0
+    length = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    cap.release()
+    return cpu / max(min(seconds, length), 1e-6)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("source")
+    ap.add_argument("--seconds", type=float, default=20.0, help="video seconds per source")
+    ap.add_argument("--poll", type=float, default=6.0, help="probe: motion_poll_seconds")
+    ap.add_argument("--skip-frames", type=int, default=8, help="probe: MOTION_SKIP_FRAMES")
+    ap.add_argument("--reader-fps", type=float, default=2.0, help="MOTION_READER_FPS")
+    ap.add_argument("--width", type=int, default=320, help="MOTION_ANALYSIS_MAX_WIDTH")
+    args = ap.parse_args()
+
+    results = {
+        "probe": bench_probe(args.source, args.seconds, args.poll, args.skip_frames),
+        "persistent": bench_persistent(args.source, args.seconds, args.reader_fps, args.width),
+        "ffmpeg": bench_ffmpeg(args.source, args.seconds, args.reader_fps, args.width),
+    }
+    for label, cpu in results.items():
+        if cpu is None:
+            print("%-10s  skipped (no ffmpeg binary)" % label)
+        else:
+            print("%-10s  %6.2f%% of a core per camera" % (label, cpu * 100.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: motion scoring per tick, per-camera detector.score vs batched score_batch.
+
+Builds synthetic 320x180 frame pairs (BGR, as the OpenCV reader delivers them, or gray
+with --gray, as the ffmpeg source does) for N cameras and times one tick of scoring:
+the pre-batching path (each camera scored in a MOTION_MAX_CONCURRENT thread pool) and
+the batched path (one stacked NumPy/OpenCV pass). Also checks both give the same scores.
+
+Usage (from the repo root):
+  python scripts/bench_motion_scoring.py [--cameras 16,64,128] [--ticks 50] [--gray] [--blur 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def make_items(n: int, gray: bool):
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    shape = (180, 320) if gray else (180, 320, 3)
+    items = []
+    for i in range(n):
+        prev = rng.integers(0, 255, shape, dtype=np.uint8)
+        frame = prev.copy()
+        frame[40:80, 60:140] = rng.integers(0, 255, frame[40:80, 60:140].shape, dtype=np.uint8)
+        items.append(("bench-ch%d-main" % i, prev, frame))
+    return items
+
+
+def per_camera(detector, items, workers: int):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda it: detector.score(it[1], it[2], it[0]), items))
+
+
+def batched(detector, items, workers: int):
+    return detector.score_batch(items)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--cameras", default="16,64,128")
+    ap.add_argument("--ticks", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--gray", action="store_true", help="2-D gray frames (ffmpeg frame source)")
+    ap.add_argument("--blur", type=int, default=0, help="MOTION_GAUSSIAN_KSIZE")
+    args = ap.parse_args()
+
+    os.environ["MOTION_GAUSSIAN_KSIZE"] = str(args.blur)
+    from app.processing.detectors import OpenCvMotionDetector
+
+    detector = OpenCvMotionDetector()
+    for n in (int(x) for x in args.cameras.split(",") if x.strip()):
+        items = make_items(n, args.gray)
+        ref = per_camera(detector, items, args.workers)
+        got = batched(detector, items, args.workers)
+        drift = max(abs(a - b) for a, b in zip(ref, got))
+        times = {}
+        for label, fn in (("per-camera", per_camera), ("batched", batched)):
+            t = time.perf_counter()
+            for _ in range(args.ticks):
+                fn(detector, items, args.workers)
+            times[label] = (time.perf_counter() - t) / args.ticks * 1000.0
+        print(
+            "%4d cameras  per-camera %7.2f ms/tick  batched %7.2f ms/tick  x%.1f  (max score diff %.4f)"
+            % (n, times["per-camera"], times["batched"], times["per-camera"] / times["batched"], drift)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: segment registration rows/sec, legacy per-row INSERT vs batched executemany.
+
+Builds a synthetic RECORDINGS_DIR tree (sparse files, no real video) plus a scratch
+SQLite DB, then registers every file twice — once with the pre-batching loop
+(whole-table `known` set + one queued INSERT per file) and once with
+recorder_segments.scan_register_new_segments (executemany, INSERT OR IGNORE).
+
+Usage (from the repo root):
+  python scripts/bench_segment_register.py [--files 100000] [--cameras 64]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def build_tree(root: str, files: int, cameras: int) -> None:
+    per_cam = max(1, files // cameras)
+    t0 = datetime(2024, 1, 1)
+    for c in range(cameras):
+        cam_dir = os.path.join(root, "bench-ch%d-main" % c)
+        os.makedirs(cam_dir, exist_ok=True)
+        for i in range(per_cam):
+            fn = (t0 + timedelta(minutes=5 * i)).strftime("%Y-%m-%d_%H-%M-%S.mp4")
+            with open(os.path.join(cam_dir, fn), "wb") as f:
+                f.truncate(20480)
+
+
+def fresh_db(path: str):
+    from app.database import db, init_database
+    from app.migrate import run_migrations
+
+    if os.path.exists(path):
+        os.remove(path)
+    run_migrations(path)
+    init_database(database_path=path)
+    db.connect(reuse_if_open=True)
+    return db
+
+
+def legacy_register(root: str, segment_minutes: int) -> int:
+    """Pre-batching behaviour: full `known` set, one queued INSERT per new file."""
+    from app.database import db
+    from app.recorder_segments import parse_segment_filename_ts
+
+    known = {(r[0], r[1]) for r in db.execute_sql("SELECT camera_name, filename FROM recording")}
+    added = 0
+    last = None
+    for cam_name in sorted(os.listdir(root)):
+        cam_dir = os.path.join(root, cam_name)
+        files = sorted(f for f in os.listdir(cam_dir) if f.endswith(".mp4"))
+        for idx, fn in enumerate(files):
+            if (cam_name, fn) in known:
+                continue
+            fp = os.path.join(cam_dir, fn)
+            sz = os.path.getsize(fp)
+            sa = parse_segment_filename_ts(fn)
+            dur = segment_minutes * 60
+            if idx + 1 < len(files):
+                dur = (parse_segment_filename_ts(files[idx + 1]) - sa).total_seconds()
+            ea = sa + timedelta(seconds=int(dur))
+            last = db.execute_sql(
+                "INSERT INTO recording"
+                " (camera,camera_name,filename,file_path,file_size,"
+                "  started_at,ended_at,duration_seconds,status)"
+                " VALUES (?,?,?,?,?,?,?,?,?)",
+                (None, cam_name, fn, fp, sz, sa.isoformat(), ea.isoformat(), int(dur), "complete"),
+            )
+            added += 1
+    if last is not None:
+        last.lastrowid  # block until the write queue has drained
+    return added
+
+
+def batched_register(root: str, segment_minutes: int) -> int:
+    from app.recorder_segments import scan_register_new_segments
+
+    return scan_register_new_segments(
+        root, set(), segment_minutes=segment_minutes, probe_segment_durations=False
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--files", type=int, default=100_000)
+    ap.add_argument("--cameras", type=int, default=64)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="opus-bench-")
+    root = os.path.join(work, "recordings")
+    try:
+        t = time.perf_counter()
+        build_tree(root, args.files, args.cameras)
+        print("tree: %d files in %.1fs" % (args.files, time.perf_counter() - t))
+
+        for label, fn in (("legacy per-row", legacy_register), ("batched", batched_register)):
+            db = fresh_db(os.path.join(work, "bench.db"))
+            t = time.perf_counter()
+            n = fn(root, 5)
+            dt = time.perf_counter() - t
+            print("%-15s %7d rows  %6.2fs  %9.0f rows/s" % (label, n, dt, n / dt if dt else 0))
+            db.close()
+            db.obj.stop()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()